@@ -1,3 +1,9 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import TokenRevogado
+
+
+@admin.register(TokenRevogado)
+class TokenRevogadoAdmin(admin.ModelAdmin):
+    list_display = ('jti', 'expira_em')
+    search_fields = ('jti',)
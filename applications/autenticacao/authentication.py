@@ -0,0 +1,31 @@
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from .sessoes import UsuarioDoToken, sessao_valida
+
+
+class AutenticacaoJWT(JWTAuthentication):
+    """
+    JWTAuthentication que confere a revogação e a versão da sessão do token
+    (ver sessoes.py) e, em métodos seguros, usa o usuário das claims do token
+    em vez de buscá-lo no banco. Escritas continuam recebendo o User do banco.
+    """
+
+    def authenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+
+        validated_token = self.get_validated_token(raw_token)
+        if not sessao_valida(validated_token):
+            raise AuthenticationFailed(_('Sessão encerrada. Faça login novamente.'), code='sessao_encerrada')
+
+        # Tokens antigos, sem as claims do usuário, seguem pelo caminho com consulta
+        if request.method in SAFE_METHODS and 'tipo_usuario' in validated_token:
+            return UsuarioDoToken(validated_token), validated_token
+        return self.get_user(validated_token), validated_token
@@ -1,3 +1,18 @@
 from django.db import models
+from django.utils.translation import gettext_lazy as _
 
-# Create your models here.
+
+class TokenRevogado(models.Model):
+    """
+    Token JWT revogado no logout, guardado até expirar. O cache só fica na
+    frente desta tabela (ver sessoes.py); a revogação não depende dele.
+    """
+    jti = models.CharField(max_length=255, unique=True)
+    expira_em = models.DateTimeField(db_index=True)
+
+    class Meta:
+        verbose_name = _('Token Revogado')
+        verbose_name_plural = _('Tokens Revogados')
+
+    def __str__(self):
+        return self.jti
@@ -0,0 +1,135 @@
+"""
+Sessões JWT sem consulta ao banco por requisição.
+
+No login, o token recebe como claims o tipo do usuário, se o e-mail foi
+verificado, as entidades que ele gerencia e a versão da sessão
+(User.versao_sessao). Em leituras, AutenticacaoJWT monta o usuário a partir
+dessas claims (UsuarioDoToken) em vez de buscá-lo no banco.
+
+Um token deixa de valer antes de expirar quando:
+- o seu jti está na lista de revogados (logout): a tabela TokenRevogado,
+  com o cache na frente guardando a resposta (revogado ou não) de cada jti
+  até a expiração do token. Se o cache perder a entrada, a tabela é lida
+  de novo;
+- a versão da sessão do usuário mudou. A versão fica no banco e espelhada no
+  cache, e é incrementada quando a senha, o tipo, o status de ativo ou de
+  e-mail verificado mudam, ou por encerrar_sessoes() (ver signals.py).
+"""
+from datetime import datetime, timezone as dt_timezone
+import time
+
+from django.core.cache import cache
+from django.db import models
+from django.utils import timezone
+from django.utils.functional import cached_property
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+
+from applications.core.models import User
+from .models import TokenRevogado
+
+CLAIM_VERSAO = 'versao_sessao'
+# Campos do usuário que, ao mudar, encerram as sessões abertas
+CAMPOS_SENSIVEIS = ('password', 'is_active', 'tipo_usuario', 'is_email_verified')
+TIMEOUT_VERSAO = 60 * 60 * 24
+
+
+def _chave_revogado(jti):
+    return f'jwt:revogado:{jti}'
+
+
+def _chave_versao(user_id):
+    return f'jwt:versao:{user_id}'
+
+
+def adicionar_claims(token, user):
+    """Guarda no token os dados que as leituras precisam do usuário."""
+    token['tipo_usuario'] = user.tipo_usuario
+    token['is_email_verified'] = user.is_email_verified
+    token['entidades'] = (
+        list(user.entidades_gerenciadas.order_by('pk').values_list('pk', flat=True))
+        if user.tipo_usuario == User.TipoUsuario.GESTOR_PUBLICO else []
+    )
+    token[CLAIM_VERSAO] = user.versao_sessao
+    # Já deixa a versão no cache para a primeira requisição com o token
+    cache.add(_chave_versao(user.pk), user.versao_sessao, timeout=TIMEOUT_VERSAO)
+    return token
+
+
+def publicar_versao(user_id, versao):
+    cache.set(_chave_versao(user_id), versao, timeout=TIMEOUT_VERSAO)
+
+
+def _restante(token):
+    """Segundos até o token expirar."""
+    return int(token.get('exp', 0) - time.time())
+
+
+def sessao_valida(token):
+    """Se o token não foi revogado e é da versão atual da sessão do usuário."""
+    user_id = token.get(api_settings.USER_ID_CLAIM)
+    chave_revogado, chave_versao = _chave_revogado(token.get('jti')), _chave_versao(user_id)
+    valores = cache.get_many([chave_revogado, chave_versao])
+
+    revogado = valores.get(chave_revogado)
+    if revogado is None:
+        revogado = TokenRevogado.objects.filter(jti=token.get('jti')).exists()
+        # add(): não sobrescreve um True gravado por revogar() ao mesmo tempo
+        cache.add(chave_revogado, revogado, timeout=max(_restante(token), 1))
+    if revogado:
+        return False
+
+    versao = valores.get(chave_versao)
+    if versao is None:
+        versao = User.objects.filter(pk=user_id).values_list('versao_sessao', flat=True).first()
+        if versao is None:
+            return False
+        cache.add(chave_versao, versao, timeout=TIMEOUT_VERSAO)
+    # Tokens emitidos antes das claims de sessão contam como versão 0
+    return token.get(CLAIM_VERSAO, 0) == versao
+
+
+def revogar(token):
+    """Coloca o token na lista de revogados até ele expirar."""
+    restante = _restante(token)
+    if restante <= 0:
+        return
+    agora = timezone.now()
+    TokenRevogado.objects.get_or_create(
+        jti=token['jti'],
+        defaults={'expira_em': datetime.fromtimestamp(token['exp'], tz=dt_timezone.utc)},
+    )
+    # Tokens já expirados não precisam mais estar na lista
+    TokenRevogado.objects.filter(expira_em__lt=agora).delete()
+    # Já na hora (e não no commit): uma leitura simultânea que ainda viu a
+    # tabela sem o jti usa add() e não sobrescreve este True
+    cache.set(_chave_revogado(token['jti']), True, timeout=restante)
+
+
+def encerrar_sessoes(user):
+    """Invalida todos os tokens já emitidos para o usuário."""
+    user.versao_sessao += 1
+    user.save(update_fields=['versao_sessao'])
+
+
+class UsuarioDoToken(TokenUser):
+    """
+    Usuário montado a partir das claims do token, sem consulta ao banco.
+    tipo_usuario, is_email_verified e entidades vêm do token (ver TokenUser.__getattr__).
+    """
+
+    @cached_property
+    def id(self):
+        # O Simple JWT guarda o id como texto; aqui ele volta ao tipo da chave de User
+        return User._meta.pk.to_python(self.token[api_settings.USER_ID_CLAIM])
+
+    @cached_property
+    def pk(self):
+        return self.id
+
+    def __eq__(self, other):
+        if isinstance(other, models.Model):
+            return other.pk == self.pk and other._meta.label == User._meta.label
+        return super().__eq__(other)
+
+    __hash__ = TokenUser.__hash__
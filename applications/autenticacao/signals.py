@@ -0,0 +1,35 @@
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_init, post_save
+from django.dispatch import receiver
+
+from applications.core.models import User
+from .sessoes import CAMPOS_SENSIVEIS, publicar_versao
+
+
+def _campos_sensiveis(user):
+    # Lê do __dict__ para não disparar consultas de campos adiados (.only/.defer)
+    return tuple(user.__dict__.get(campo) for campo in CAMPOS_SENSIVEIS)
+
+
+@receiver(post_init, sender=User)
+def guardar_estado_sessao(sender, instance, **kwargs):
+    instance._campos_sessao = _campos_sensiveis(instance)
+    instance._versao_sessao = instance.__dict__.get('versao_sessao')
+
+
+@receiver(post_save, sender=User)
+def atualizar_versao_sessao(sender, instance, created, **kwargs):
+    """
+    Troca de senha, desativação ou mudança de tipo invalidam os tokens já
+    emitidos: a versão da sessão é incrementada e publicada no cache.
+    """
+    campos = _campos_sensiveis(instance)
+    if not created and campos != instance._campos_sessao and instance.versao_sessao == instance._versao_sessao:
+        User.objects.filter(pk=instance.pk).update(versao_sessao=F('versao_sessao') + 1)
+        instance.versao_sessao += 1
+    if not created and instance.versao_sessao != instance._versao_sessao:
+        user_id, versao = instance.pk, instance.versao_sessao
+        transaction.on_commit(lambda: publicar_versao(user_id, versao))
+    instance._campos_sessao = campos
+    instance._versao_sessao = instance.versao_sessao
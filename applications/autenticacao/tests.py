@@ -1,3 +1,99 @@
-from django.test import TestCase
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIRequestFactory, APITestCase
 
-# Create your tests here.
+from applications.core.models import User
+from applications.localidades.models import Estado
+from applications.gestao_publica.models import OfficialEntity
+from .authentication import AutenticacaoJWT
+from .sessoes import UsuarioDoToken
+
+
+class SessaoJWTTests(APITestCase):
+    """
+    Testes do login com claims, da autenticação sem consulta em leituras e do logout.
+    """
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='gestor', email='gestor@example.com', password='password123', first_name='Gestor',
+            tipo_usuario=User.TipoUsuario.GESTOR_PUBLICO, is_email_verified=True,
+        )
+        self.entidade = OfficialEntity.objects.create(nome='Governo', estado=Estado.objects.get(uf='SC'))
+        self.entidade.gestores.add(self.user)
+
+    def login(self, password='password123'):
+        return self.client.post(reverse('auth_login'), {'username': 'gestor', 'password': password})
+
+    def autenticar(self, metodo, token):
+        request = getattr(APIRequestFactory(), metodo)('/', HTTP_AUTHORIZATION=f'Bearer {token}')
+        return AutenticacaoJWT().authenticate(request)
+
+    def test_login_recusa_email_nao_verificado(self):
+        User.objects.filter(pk=self.user.pk).update(is_email_verified=False)
+        response = self.login()
+        self.assertEqual(response.status_code, 400)
+
+    def test_leituras_usam_as_claims_sem_consultar_o_usuario(self):
+        access = self.login().data['access']
+        # A primeira requisição confere a lista de revogados no banco; a resposta fica no cache
+        self.autenticar('get', access)
+
+        with CaptureQueriesContext(connection) as consultas:
+            user, token = self.autenticar('get', access)
+        self.assertEqual(len(consultas), 0)
+        self.assertIsInstance(user, UsuarioDoToken)
+        self.assertEqual(user.pk, self.user.pk)
+        self.assertEqual(user.tipo_usuario, 'GESTOR_PUBLICO')
+        self.assertEqual(user.entidades, [self.entidade.pk])
+        self.assertEqual(user, self.user)
+
+        # Escritas recebem o usuário do banco
+        user, token = self.autenticar('post', access)
+        self.assertIsInstance(user, User)
+
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+        self.assertEqual(self.client.get(reverse('gestao_publica:minhas-denuncias-list')).status_code, 200)
+
+    def test_logout_revoga_os_tokens(self):
+        tokens = self.login().data
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {tokens["access"]}')
+        response = self.client.post(reverse('auth_logout'), {'refresh': tokens['refresh']})
+        self.assertEqual(response.status_code, 200)
+
+        self.assertEqual(self.client.get(reverse('gestao_publica:minhas-denuncias-list')).status_code, 401)
+        self.client.credentials()
+        response = self.client.post(reverse('token_refresh'), {'refresh': tokens['refresh']})
+        self.assertEqual(response.status_code, 401)
+
+    def test_revogacao_sobrevive_a_limpeza_do_cache(self):
+        tokens = self.login().data
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {tokens["access"]}')
+        self.client.post(reverse('auth_logout'))
+
+        cache.clear()
+        self.assertEqual(self.client.get(reverse('gestao_publica:minhas-denuncias-list')).status_code, 401)
+        # Agora vem do cache, sem consultar a tabela
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(reverse('gestao_publica:minhas-denuncias-list')).status_code, 401)
+
+    def test_troca_de_senha_encerra_as_sessoes(self):
+        tokens = self.login().data
+        self.assertEqual(self.client.post(reverse('token_refresh'), {'refresh': tokens['refresh']}).status_code, 200)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.set_password('nova-senha-123')
+            self.user.save()
+        self.assertEqual(User.objects.get(pk=self.user.pk).versao_sessao, 1)
+
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {tokens["access"]}')
+        self.assertEqual(self.client.get(reverse('gestao_publica:minhas-denuncias-list')).status_code, 401)
+        self.client.credentials()
+        self.assertEqual(self.client.post(reverse('token_refresh'), {'refresh': tokens['refresh']}).status_code, 401)
+
+        # Um novo login gera tokens da versão atual
+        access = self.login('nova-senha-123').data['access']
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+        self.assertEqual(self.client.get(reverse('gestao_publica:minhas-denuncias-list')).status_code, 200)
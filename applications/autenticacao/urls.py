@@ -2,18 +2,20 @@ from django.urls import path
 from .views import (
     RegisterView, 
     LoginView, 
+    LogoutView,
+    CustomTokenRefreshView,
     EmailVerificationView,
     PasswordResetRequestView,
     PasswordResetValidateCodeView,
     PasswordResetConfirmView
 )
-from rest_framework_simplejwt.views import TokenRefreshView
 
 urlpatterns = [
     path('register/', RegisterView.as_view(), name='auth_register'),
     path('verify-email/', EmailVerificationView.as_view(), name='auth_verify_email'),
     path('login/', LoginView.as_view(), name='auth_login'),
-    path('login/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    path('login/refresh/', CustomTokenRefreshView.as_view(), name='token_refresh'),
+    path('logout/', LogoutView.as_view(), name='auth_logout'),
 
     # URLs para Redefinição de Senha
     path('password-reset/request/', PasswordResetRequestView.as_view(), name='password_reset_request'),
@@ -1,14 +1,18 @@
-from rest_framework import generics, status
-from rest_framework.permissions import AllowAny
+from rest_framework import generics, serializers, status
+from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from rest_framework_simplejwt.views import TokenObtainPairView
-from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
 from django.utils import timezone
 
 from applications.core.models import User
 from .serializers import UserSerializer
 from .services import send_verification_email
+from .sessoes import adicionar_claims, encerrar_sessoes, revogar, sessao_valida
 
 
 class RegisterView(generics.CreateAPIView):
@@ -31,6 +35,11 @@ class RegisterView(generics.CreateAPIView):
 
 
 class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
+    @classmethod
+    def get_token(cls, user):
+        # As claims são copiadas para os tokens de acesso gerados a partir deste (ver sessoes.py)
+        return adicionar_claims(super().get_token(user), user)
+
     def validate(self, attrs):
         data = super().validate(attrs)
         if not self.user.is_email_verified:
@@ -45,6 +54,52 @@ class LoginView(TokenObtainPairView):
     serializer_class = CustomTokenObtainPairSerializer
 
 
+class CustomTokenRefreshSerializer(TokenRefreshSerializer):
+    def validate(self, attrs):
+        try:
+            refresh = self.token_class(attrs['refresh'])
+        except TokenError as e:
+            raise InvalidToken(e.args[0])
+        if not sessao_valida(refresh):
+            raise InvalidToken('Sessão encerrada. Faça login novamente.')
+        return super().validate(attrs)
+
+
+class CustomTokenRefreshView(TokenRefreshView):
+    """
+    Endpoint para renovar o token de acesso.
+    Recusa tokens de atualização revogados ou de sessões encerradas.
+    """
+    serializer_class = CustomTokenRefreshSerializer
+
+
+class LogoutView(APIView):
+    """
+    Endpoint para logout. Revoga o token de acesso usado na requisição e, se
+    enviado, o token de atualização. Com "todas": true, encerra todas as
+    sessões do usuário, em qualquer dispositivo.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        refresh = request.data.get('refresh')
+        if refresh:
+            try:
+                token = RefreshToken(refresh)
+            except TokenError:
+                return Response({'error': 'Token de atualização inválido.'}, status=status.HTTP_400_BAD_REQUEST)
+            if str(token.get(api_settings.USER_ID_CLAIM)) != str(request.user.pk):
+                return Response({'error': 'Token de atualização inválido.'}, status=status.HTTP_400_BAD_REQUEST)
+            revogar(token)
+
+        if request.auth is not None:
+            revogar(request.auth)
+        if request.data.get('todas') in (True, 'true', '1'):
+            encerrar_sessoes(request.user)
+
+        return Response({'message': 'Logout realizado com sucesso.'}, status=status.HTTP_200_OK)
+
+
 class EmailVerificationView(APIView):
     """
     Endpoint para verificar o e-mail de um usuário com o código enviado.
@@ -0,0 +1,131 @@
+"""
+Camada de cache compartilhada entre processos (backend em settings.CACHES).
+
+As entradas são agrupadas por "grupo" (ex.: "localidades") e a chave de cada
+uma inclui a versão atual do grupo. Invalidar um grupo é só incrementar a
+versão: as entradas antigas deixam de ser lidas e expiram sozinhas. As
+versões são incrementadas pelos signals post_save/post_delete dos modelos
+registrados com invalidar_ao_alterar().
+
+Os acertos e faltas de cada grupo são contados por processo (ver estatisticas()).
+"""
+import hashlib
+import threading
+import time
+from collections import Counter
+
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from rest_framework.response import Response
+
+ALIAS = 'default'
+TIMEOUT_PADRAO = 60 * 60 * 24
+
+_contadores = Counter()
+_contadores_trava = threading.Lock()
+_ausente = object()
+
+
+def _cache():
+    return caches[ALIAS]
+
+
+def _versao_inicial():
+    # Se a versão sumir do cache (clear(), despejo), recomeçar em 1 repetiria uma
+    # versão antiga e os índices em memória dos processos (ver localidades/busca.py)
+    # não perceberiam a troca
+    return time.time_ns() // 1000
+
+
+def versao(grupo):
+    chave = f'versao:{grupo}'
+    atual = _cache().get(chave)
+    if atual is None:
+        # add() não sobrescreve a versão criada por outro processo ao mesmo tempo
+        inicial = _versao_inicial()
+        _cache().add(chave, inicial, timeout=None)
+        atual = _cache().get(chave, inicial)
+    return atual
+
+
+def invalidar(grupo):
+    """Descarta todas as entradas do grupo."""
+    chave = f'versao:{grupo}'
+    try:
+        _cache().incr(chave)
+    except ValueError:
+        # Versão ainda não existia (ou foi removida): qualquer valor novo invalida
+        _cache().add(chave, _versao_inicial(), timeout=None)
+
+
+def _contar(grupo, resultado):
+    with _contadores_trava:
+        _contadores[(grupo, resultado)] += 1
+
+
+def obter_ou_calcular(grupo, chave, calcular, timeout=TIMEOUT_PADRAO):
+    """Retorna o valor em cache para (grupo, chave) ou o calcula e guarda."""
+    # Hash da chave: alguns backends (ex.: Memcached) limitam o tamanho e os caracteres
+    resumo = hashlib.md5(str(chave).encode(), usedforsecurity=False).hexdigest()
+    chave_completa = f'{grupo}:v{versao(grupo)}:{resumo}'
+    valor = _cache().get(chave_completa, _ausente)
+    if valor is not _ausente:
+        _contar(grupo, 'acertos')
+        return valor
+    _contar(grupo, 'faltas')
+    valor = calcular()
+    _cache().set(chave_completa, valor, timeout=timeout)
+    return valor
+
+
+def estatisticas():
+    """Retorna {grupo: {'acertos': n, 'faltas': n}} deste processo."""
+    with _contadores_trava:
+        resultado = {}
+        for (grupo, tipo), total in _contadores.items():
+            resultado.setdefault(grupo, {'acertos': 0, 'faltas': 0})[tipo] = total
+        return resultado
+
+
+def zerar_estatisticas():
+    with _contadores_trava:
+        _contadores.clear()
+
+
+def invalidar_ao_alterar(grupo, *modelos):
+    """Conecta os signals que invalidam o grupo quando algum dos modelos muda."""
+    def receptor(sender, **kwargs):
+        # Depois do commit, senão outro processo recalcularia com os dados antigos na versão nova
+        transaction.on_commit(lambda: invalidar(grupo))
+
+    for modelo in modelos:
+        post_save.connect(receptor, sender=modelo, weak=False, dispatch_uid=f'cache:{grupo}:{modelo._meta.label}:save')
+        post_delete.connect(receptor, sender=modelo, weak=False, dispatch_uid=f'cache:{grupo}:{modelo._meta.label}:delete')
+
+
+class CacheLeituraMixin:
+    """
+    Guarda em cache as respostas de list() e retrieve() de um ViewSet somente leitura.
+    A chave inclui o caminho e a query string, então filtros e paginação são respeitados.
+    """
+    grupo_cache = None
+
+    def list(self, request, *args, **kwargs):
+        return self._resposta_em_cache(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._resposta_em_cache(request, super().retrieve, *args, **kwargs)
+
+    def _resposta_em_cache(self, request, metodo, *args, **kwargs):
+        respostas = {}
+
+        def calcular():
+            response = metodo(request, *args, **kwargs)
+            respostas['original'] = response
+            return (response.status_code, response.data)
+
+        status_code, dados = obter_ou_calcular(self.grupo_cache, request.get_full_path(), calcular)
+        if 'original' in respostas:
+            return respostas['original']
+        return Response(dados, status=status_code)
@@ -0,0 +1,162 @@
+"""
+Cliente HTTP compartilhado para os serviços externos (Nominatim, IBGE).
+
+Cada serviço tem um único ClienteHTTP por processo (ver cliente()), com:
+- uma requests.Session com pool de conexões mantidas abertas (keep-alive),
+  evitando um handshake TCP/TLS por chamada;
+- no máximo `max_conexoes` requisições simultâneas ao serviço;
+- novas tentativas para erros de rede, 429 e 5xx, com espera exponencial
+  aleatória ("full jitter"), só em métodos idempotentes;
+- um disjuntor (circuit breaker): depois de `limite_falhas` falhas seguidas
+  as chamadas falham na hora com CircuitoAberto por `tempo_reabertura`
+  segundos; então uma chamada de teste decide se o circuito fecha de novo.
+
+CircuitoAberto herda de requests.exceptions.ConnectionError, então quem já
+trata RequestException continua funcionando. get_async() é a versão para
+asyncio: roda a chamada em uma thread, reaproveitando o mesmo pool.
+
+A configuração de cada serviço pode ser ajustada em settings.HTTP_CLIENTES.
+"""
+import asyncio
+import random
+import threading
+import time
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+METODOS_IDEMPOTENTES = {'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'}
+STATUS_REPETIVEIS = {429, 500, 502, 503, 504}
+
+FECHADO = 'fechado'
+ABERTO = 'aberto'
+MEIO_ABERTO = 'meio_aberto'
+
+
+class CircuitoAberto(requests.exceptions.ConnectionError):
+    """O serviço falhou seguidamente e as chamadas estão suspensas."""
+
+
+class Disjuntor:
+
+    def __init__(self, limite_falhas=5, tempo_reabertura=30.0):
+        self.limite_falhas = limite_falhas
+        self.tempo_reabertura = tempo_reabertura
+        self.falhas = 0
+        self.aberto_em = None
+        self._testando = False
+        self._trava = threading.Lock()
+
+    @property
+    def estado(self):
+        with self._trava:
+            return self._estado()
+
+    def _estado(self):
+        if self.aberto_em is None:
+            return FECHADO
+        if time.monotonic() - self.aberto_em >= self.tempo_reabertura:
+            return MEIO_ABERTO
+        return ABERTO
+
+    def permitir(self):
+        """Levanta CircuitoAberto se a chamada não deve ser feita agora."""
+        with self._trava:
+            estado = self._estado()
+            if estado == FECHADO:
+                return
+            # Meio aberto: só uma chamada de teste por vez
+            if estado == MEIO_ABERTO and not self._testando:
+                self._testando = True
+                return
+        raise CircuitoAberto('Serviço indisponível no momento; tente novamente mais tarde.')
+
+    def registrar_sucesso(self):
+        with self._trava:
+            self.falhas = 0
+            self.aberto_em = None
+            self._testando = False
+
+    def registrar_falha(self):
+        with self._trava:
+            self.falhas += 1
+            if self._testando or self.falhas >= self.limite_falhas:
+                self.aberto_em = time.monotonic()
+            self._testando = False
+
+
+class ClienteHTTP:
+
+    def __init__(self, timeout=(3.05, 10), tentativas=3, espera_base=0.2, espera_maxima=2.0,
+                 max_conexoes=10, limite_falhas=5, tempo_reabertura=30.0, headers=None):
+        self.timeout = timeout
+        self.tentativas = tentativas
+        self.espera_base = espera_base
+        self.espera_maxima = espera_maxima
+        self.disjuntor = Disjuntor(limite_falhas, tempo_reabertura)
+        self._vagas = threading.BoundedSemaphore(max_conexoes)
+
+        self.sessao = requests.Session()
+        adaptador = HTTPAdapter(pool_connections=4, pool_maxsize=max_conexoes)
+        self.sessao.mount('http://', adaptador)
+        self.sessao.mount('https://', adaptador)
+        if headers:
+            self.sessao.headers.update(headers)
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    async def get_async(self, url, **kwargs):
+        return await asyncio.to_thread(self.request, 'GET', url, **kwargs)
+
+    def request(self, metodo, url, **kwargs):
+        """
+        Faz a requisição com novas tentativas e o disjuntor. Retorna a última
+        resposta (que pode ser um 4xx/5xx) ou levanta a última exceção de rede.
+        """
+        kwargs.setdefault('timeout', self.timeout)
+        tentativas = self.tentativas if metodo.upper() in METODOS_IDEMPOTENTES else 1
+
+        for tentativa in range(tentativas):
+            self.disjuntor.permitir()
+            try:
+                with self._vagas:
+                    response = self.sessao.request(metodo, url, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                self.disjuntor.registrar_falha()
+                if tentativa == tentativas - 1:
+                    raise
+            except Exception:
+                # Erros que não valem uma nova tentativa (URL inválida etc.) também liberam a chamada de teste
+                self.disjuntor.registrar_falha()
+                raise
+            else:
+                if response.status_code not in STATUS_REPETIVEIS:
+                    self.disjuntor.registrar_sucesso()
+                    return response
+                self.disjuntor.registrar_falha()
+                if tentativa == tentativas - 1:
+                    return response
+                response.close()
+            time.sleep(self._espera(tentativa))
+
+    def _espera(self, tentativa):
+        return random.uniform(0, min(self.espera_maxima, self.espera_base * 2 ** tentativa))
+
+    def fechar(self):
+        self.sessao.close()
+
+
+_clientes = {}
+_clientes_trava = threading.Lock()
+
+
+def cliente(nome):
+    """Retorna o cliente compartilhado do serviço `nome`, configurado por settings.HTTP_CLIENTES."""
+    with _clientes_trava:
+        atual = _clientes.get(nome)
+        if atual is None:
+            configuracao = getattr(settings, 'HTTP_CLIENTES', {}).get(nome, {})
+            atual = _clientes[nome] = ClienteHTTP(**configuracao)
+        return atual
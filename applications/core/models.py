@@ -61,6 +61,9 @@ class User(AbstractUser):
     verification_code = models.CharField(max_length=5, blank=True, null=True)
     code_expires_at = models.DateTimeField(null=True, blank=True)
 
+    # Incrementada para invalidar todos os tokens já emitidos (ver autenticacao/sessoes.py)
+    versao_sessao = models.PositiveIntegerField(default=0)
+
     # Torna o primeiro nome um campo obrigatório
     first_name = models.CharField(_('first name'), max_length=150, blank=False)
 
@@ -0,0 +1,140 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param, remove_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Paginação por cursor (keyset) ordenada por (-data_criacao, id).
+
+    Em vez de OFFSET, cada página filtra a partir da posição do último item
+    da página anterior, então qualquer página custa o mesmo que a primeira
+    (desde que exista um índice com a mesma ordenação).
+
+    O cursor é opaco para o cliente e estável (não expira): base64url de
+    {"v": 1, "t": <data_criacao ISO 8601>, "id": <id>, "d": "n" | "p"},
+    onde "d" indica se a página seguinte ("n") ou anterior ("p") é pedida.
+
+    Resposta: {"next": <url|null>, "previous": <url|null>, "results": [...]}
+    """
+    cursor_query_param = 'cursor'
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('-data_criacao', 'id')
+    versao_cursor = 1
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.tamanho_pagina = self.get_page_size(request)
+
+        campo, desempate = self.ordering[0].lstrip('-'), self.ordering[1]
+        decrescente = self.ordering[0].startswith('-')
+
+        cursor = self.decode_cursor(request)
+        para_tras = cursor is not None and cursor['d'] == 'p'
+
+        # Percorrer para trás é percorrer para frente com a ordenação invertida
+        anteriores = decrescente != para_tras
+        if cursor is not None:
+            valor, pk = cursor['t'], cursor['id']
+            lookup_campo = 'lt' if anteriores else 'gt'
+            lookup_desempate = 'lt' if para_tras else 'gt'
+            queryset = queryset.filter(
+                Q(**{f'{campo}__{lookup_campo}': valor}) | Q(**{campo: valor, f'{desempate}__{lookup_desempate}': pk}),
+                # Intervalo na primeira coluna do índice; o OR acima só resolve empates
+                **{f'{campo}__{lookup_campo}e': valor},
+            )
+
+        ordenacao = [f'-{campo}' if anteriores else campo, f'-{desempate}' if para_tras else desempate]
+        resultados = list(queryset.order_by(*ordenacao)[:self.tamanho_pagina + 1])
+
+        tem_mais = len(resultados) > self.tamanho_pagina
+        resultados = resultados[:self.tamanho_pagina]
+        if para_tras:
+            resultados.reverse()
+            self.tem_proxima, self.tem_anterior = True, tem_mais
+        else:
+            self.tem_proxima, self.tem_anterior = tem_mais, cursor is not None
+
+        self.campo, self.desempate = campo, desempate
+        self.resultados = resultados
+        return resultados
+
+    def get_page_size(self, request):
+        try:
+            tamanho = int(request.query_params[self.page_size_query_param])
+            if tamanho > 0:
+                return min(tamanho, self.max_page_size)
+        except (KeyError, ValueError):
+            pass
+        return self.page_size
+
+    def decode_cursor(self, request):
+        codificado = request.query_params.get(self.cursor_query_param)
+        if not codificado:
+            return None
+        try:
+            dados = json.loads(base64.urlsafe_b64decode(codificado.encode('ascii') + b'=' * (-len(codificado) % 4)))
+            if dados['v'] != self.versao_cursor or dados['d'] not in ('n', 'p'):
+                raise ValueError
+            return {'t': datetime.fromisoformat(dados['t']), 'id': int(dados['id']), 'd': dados['d']}
+        except (binascii.Error, UnicodeError, TypeError, KeyError, ValueError):
+            raise NotFound('Cursor inválido.')
+
+    def encode_cursor(self, item, direcao):
+        dados = {
+            'v': self.versao_cursor,
+            't': getattr(item, self.campo).isoformat(),
+            'id': getattr(item, self.desempate),
+            'd': direcao,
+        }
+        codificado = base64.urlsafe_b64encode(json.dumps(dados, separators=(',', ':')).encode()).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, codificado.rstrip('='))
+
+    def get_next_link(self):
+        if not self.tem_proxima or not self.resultados:
+            return None
+        return self.encode_cursor(self.resultados[-1], 'n')
+
+    def get_previous_link(self):
+        if not self.tem_anterior:
+            return None
+        if not self.resultados:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.resultados[0], 'p')
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class KeysetPaginationCrescente(KeysetPagination):
+    """
+    A mesma paginação por cursor, do mais antigo para o mais recente:
+    ordenada por (data_criacao, id). Usada nos comentários, que são lidos em
+    ordem cronológica (Comentario.Meta.ordering).
+    """
+    ordering = ('data_criacao', 'id')
@@ -0,0 +1,36 @@
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+def caches_em_memoria():
+    """
+    settings.CACHES com cada cache trocado por um LocMemCache próprio. O cache
+    em disco das configurações é o mesmo do servidor de desenvolvimento.
+    """
+    return {
+        alias: {
+            **configuracao,
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': f'testes-{alias}',
+        }
+        for alias, configuracao in settings.CACHES.items()
+    }
+
+
+class TestRunner(DiscoverRunner):
+    """
+    Roda os testes (e os benchmarks) com os caches em memória: o cache em disco
+    sobrevive entre execuções, guardaria respostas de um banco de testes que não
+    existe mais e é compartilhado com o servidor de desenvolvimento, que não
+    deve ser apagado nem poluído pelos testes.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._caches_de_teste = override_settings(CACHES=caches_em_memoria())
+        self._caches_de_teste.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._caches_de_teste.disable()
+        super().teardown_test_environment(**kwargs)
@@ -1,3 +1,139 @@
-from django.test import TestCase
+import asyncio
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
-# Create your tests here.
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from .http import ABERTO, FECHADO, CircuitoAberto, ClienteHTTP
+
+
+class ServirMidiaTests(TestCase):
+    """
+    Testes do serviço das fotos: cache, ETag, Range e sendfile.
+    """
+    def setUp(self):
+        self.diretorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.diretorio)
+        configuracao = override_settings(MEDIA_ROOT=self.diretorio)
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+
+        self.conteudo = bytes(range(256)) * 4
+        digest = hashlib.sha256(self.conteudo).hexdigest()
+        self.caminho = f'denuncias_fotos/{digest[:2]}/{digest[2:4]}/{digest}.png'
+        os.makedirs(os.path.join(self.diretorio, os.path.dirname(self.caminho)))
+        with open(os.path.join(self.diretorio, self.caminho), 'wb') as arquivo:
+            arquivo.write(self.conteudo)
+        self.url = reverse('midia', args=[self.caminho])
+
+    def test_arquivo_imutavel_com_etag(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.conteudo)
+        self.assertEqual(response['Content-Type'], 'image/png')
+        self.assertIn('immutable', response['Cache-Control'])
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_range(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), self.conteudo[10:20])
+        self.assertEqual(response['Content-Range'], f'bytes 10-19/{len(self.conteudo)}')
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=-4')
+        self.assertEqual(b''.join(response.streaming_content), self.conteudo[-4:])
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=5000-')
+        self.assertEqual(response.status_code, 416)
+
+    def test_sendfile_nginx(self):
+        with self.settings(MEDIA_SENDFILE='nginx'):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Accel-Redirect'], '/midia-protegida/' + self.caminho)
+        self.assertEqual(response.content, b'')
+
+    def test_somente_diretorios_publicos(self):
+        with open(os.path.join(self.diretorio, 'db.sqlite3'), 'wb') as arquivo:
+            arquivo.write(b'segredo')
+        for caminho in ['db.sqlite3', 'denuncias_fotos/../db.sqlite3', 'denuncias_fotos/inexistente.png']:
+            self.assertEqual(self.client.get(reverse('midia', args=[caminho])).status_code, 404)
+
+
+class _ServidorStub(BaseHTTPRequestHandler):
+    """Responde com os status de `servidor.respostas` (o último se repete) e conta as conexões."""
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        self.server.conexoes += 1
+
+    def do_GET(self):
+        self.server.requisicoes += 1
+        status = self.server.respostas.pop(0) if len(self.server.respostas) > 1 else self.server.respostas[0]
+        corpo = b'{"ok": true}'
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def log_message(self, *args):
+        pass
+
+
+class ClienteHTTPTests(SimpleTestCase):
+    """
+    Testes do cliente HTTP compartilhado contra um servidor local.
+    """
+    def setUp(self):
+        self.servidor = ThreadingHTTPServer(('127.0.0.1', 0), _ServidorStub)
+        self.servidor.respostas = [200]
+        self.servidor.conexoes = self.servidor.requisicoes = 0
+        thread = threading.Thread(target=self.servidor.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(self.servidor.server_close)
+        self.addCleanup(self.servidor.shutdown)
+        self.url = f'http://127.0.0.1:{self.servidor.server_address[1]}/'
+        self.cliente = ClienteHTTP(espera_base=0.001, limite_falhas=3, tempo_reabertura=60)
+        self.addCleanup(self.cliente.fechar)
+
+    def test_reaproveita_a_conexao(self):
+        for _ in range(5):
+            self.assertEqual(self.cliente.get(self.url).json(), {'ok': True})
+        self.assertEqual(self.servidor.requisicoes, 5)
+        self.assertEqual(self.servidor.conexoes, 1)
+
+    def test_repete_erros_temporarios(self):
+        self.servidor.respostas = [503, 502, 200]
+        self.assertEqual(self.cliente.get(self.url).status_code, 200)
+        self.assertEqual(self.servidor.requisicoes, 3)
+        self.assertEqual(self.cliente.disjuntor.estado, FECHADO)
+
+    def test_disjuntor_abre_e_falha_na_hora(self):
+        self.servidor.respostas = [500]
+        self.assertEqual(self.cliente.get(self.url).status_code, 500)
+        self.assertEqual(self.cliente.disjuntor.estado, ABERTO)
+        with self.assertRaises(CircuitoAberto):
+            self.cliente.get(self.url)
+        self.assertEqual(self.servidor.requisicoes, 3)
+
+    def test_disjuntor_fecha_quando_o_servico_volta(self):
+        self.servidor.respostas = [500, 500, 500, 200]
+        self.cliente.get(self.url)
+        self.cliente.disjuntor.tempo_reabertura = 0
+        self.assertEqual(self.cliente.get(self.url).status_code, 200)
+        self.assertEqual(self.cliente.disjuntor.estado, FECHADO)
+
+    def test_get_async(self):
+        async def buscar():
+            return await asyncio.gather(*(self.cliente.get_async(self.url) for _ in range(4)))
+        respostas = asyncio.run(buscar())
+        self.assertEqual([response.status_code for response in respostas], [200] * 4)
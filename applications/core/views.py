@@ -1,3 +1,137 @@
-from django.shortcuts import render
+import os
+import posixpath
+import re
 
-# Create your views here.
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.http import http_date
+from django.views.decorators.http import require_safe
+
+# Arquivos nomeados pelo hash do conteúdo (ver denuncias/armazenamento.py): a URL nunca muda de conteúdo
+NOME_POR_CONTEUDO = re.compile(r'/[0-9a-f]{2}/[0-9a-f]{2}/(?P<hash>[0-9a-f]{64})\.\w+$')
+CACHE_IMUTAVEL = 'public, max-age=31536000, immutable'
+CACHE_LEGADO = 'public, max-age=3600'
+TAMANHO_PEDACO = 64 * 1024
+INTERVALO = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+TIPOS = {
+    '.jpg': 'image/jpeg',
+    '.jpeg': 'image/jpeg',
+    '.png': 'image/png',
+    '.webp': 'image/webp',
+    '.gif': 'image/gif',
+}
+
+
+def _intervalo(cabecalho, tamanho):
+    """
+    Interpreta um cabeçalho Range de um único intervalo.
+    Retorna (inicio, fim) inclusivo, None para servir o arquivo inteiro ou
+    False se o intervalo não puder ser atendido.
+    """
+    correspondencia = INTERVALO.match(cabecalho.strip())
+    if not correspondencia:
+        # Vários intervalos ou unidade desconhecida: o RFC 9110 permite ignorar
+        return None
+    inicio, fim = correspondencia.groups()
+    if not inicio:
+        if not fim:
+            return None
+        # Sufixo: os últimos N bytes
+        inicio, fim = max(tamanho - int(fim), 0), tamanho - 1
+    else:
+        inicio, fim = int(inicio), min(int(fim), tamanho - 1) if fim else tamanho - 1
+    if inicio >= tamanho or inicio > fim:
+        return False
+    return inicio, fim
+
+
+def _ler(caminho, inicio, quantidade):
+    with open(caminho, 'rb') as arquivo:
+        arquivo.seek(inicio)
+        while quantidade > 0:
+            pedaco = arquivo.read(min(TAMANHO_PEDACO, quantidade))
+            if not pedaco:
+                break
+            quantidade -= len(pedaco)
+            yield pedaco
+
+
+def resposta_sendfile(completo, tipo, uri_interna):
+    """
+    Resposta que delega o envio do arquivo ao servidor da frente, conforme
+    settings.MEDIA_SENDFILE: X-Accel-Redirect para `uri_interna` (um location
+    "internal" do nginx) ou X-Sendfile com o caminho `completo` (Apache).
+    Retorna None se o envio não estiver delegado.
+    """
+    sendfile = getattr(settings, 'MEDIA_SENDFILE', None)
+    if sendfile == 'nginx':
+        # O nginx atende Range e envia os bytes
+        response = HttpResponse(content_type=tipo)
+        response['X-Accel-Redirect'] = uri_interna
+        return response
+    if sendfile == 'apache':
+        response = HttpResponse(content_type=tipo)
+        response['X-Sendfile'] = str(completo)
+        return response
+    return None
+
+
+@require_safe
+def servir_midia(request, caminho):
+    """
+    Serve as fotos das denúncias com cabeçalhos de cache, ETag e suporte a Range.
+
+    Com settings.MEDIA_SENDFILE = 'nginx' ou 'apache', a transferência dos bytes
+    é delegada ao servidor da frente (X-Accel-Redirect / X-Sendfile) e o
+    Django só responde os cabeçalhos.
+    """
+    # Normaliza antes de conferir o diretório, senão "denuncias_fotos/../" escaparia dele
+    caminho = posixpath.normpath(caminho.replace('\\', '/')).lstrip('/')
+    if not any(caminho.startswith(diretorio) for diretorio in settings.MEDIA_DIRETORIOS_PUBLICOS):
+        raise Http404('Arquivo não encontrado.')
+    try:
+        completo = safe_join(settings.MEDIA_ROOT, caminho)
+        estado = os.stat(completo)
+    except (ValueError, OSError):
+        raise Http404('Arquivo não encontrado.')
+    if not os.path.isfile(completo):
+        raise Http404('Arquivo não encontrado.')
+
+    conteudo = NOME_POR_CONTEUDO.search(caminho)
+    if conteudo:
+        etag, cache = f'"{conteudo.group("hash")}"', CACHE_IMUTAVEL
+    else:
+        etag, cache = f'"{int(estado.st_mtime):x}-{estado.st_size:x}"', CACHE_LEGADO
+
+    def cabecalhos(response):
+        response['ETag'] = etag
+        response['Cache-Control'] = cache
+        response['Last-Modified'] = http_date(estado.st_mtime)
+        response['Accept-Ranges'] = 'bytes'
+        return response
+
+    if etag in [valor.strip() for valor in request.headers.get('If-None-Match', '').split(',')]:
+        return cabecalhos(HttpResponseNotModified())
+
+    tipo = TIPOS.get(os.path.splitext(caminho)[1].lower(), 'application/octet-stream')
+
+    response = resposta_sendfile(completo, tipo, settings.MEDIA_SENDFILE_PREFIXO + caminho)
+    if response is not None:
+        return cabecalhos(response)
+
+    intervalo = _intervalo(request.headers['Range'], estado.st_size) if 'Range' in request.headers else None
+    if intervalo is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{estado.st_size}'
+        return cabecalhos(response)
+    if intervalo is None:
+        # Arquivo inteiro: o servidor WSGI pode usar sendfile() via wsgi.file_wrapper
+        return cabecalhos(FileResponse(open(completo, 'rb'), content_type=tipo))
+
+    inicio, fim = intervalo
+    response = StreamingHttpResponse(_ler(completo, inicio, fim - inicio + 1), status=206, content_type=tipo)
+    response['Content-Length'] = fim - inicio + 1
+    response['Content-Range'] = f'bytes {inicio}-{fim}/{estado.st_size}'
+    return cabecalhos(response)
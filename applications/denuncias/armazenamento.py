@@ -0,0 +1,167 @@
+"""
+Armazenamento das fotos endereçado pelo conteúdo.
+
+O nome de cada arquivo é o SHA-256 do conteúdo, distribuído em dois níveis
+de diretórios (denuncias_fotos/ab/cd/abcd....png). Envios idênticos viram
+um único arquivo em disco, e ReferenciaArquivo conta quantos campos apontam
+para ele: cada save() soma uma referência e cada delete() subtrai uma; o
+arquivo só é apagado quando a última referência sai. Os signals de Denuncia
+liberam as referências da denúncia apagada e da foto substituída.
+
+O hash é calculado enquanto o upload é copiado para um arquivo temporário
+no mesmo diretório, que depois é renomeado para o nome final, então o
+conteúdo é lido uma única vez.
+"""
+import hashlib
+import os
+import tempfile
+
+from django.apps import apps
+from django.core.files.storage import FileSystemStorage
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils.deconstruct import deconstructible
+
+ALGORITMO = 'sha256'
+
+
+def _referencias():
+    # Importado sob demanda: models.py usa este módulo na definição dos campos
+    return apps.get_model('denuncias', 'ReferenciaArquivo').objects
+
+
+def nome_por_conteudo(diretorio, digest, extensao):
+    return os.path.join(diretorio, digest[:2], digest[2:4], digest + extensao.lower())
+
+
+@deconstructible
+class ArmazenamentoConteudo(FileSystemStorage):
+
+    def get_available_name(self, name, max_length=None):
+        # O nome definitivo depende do conteúdo e é decidido em _save
+        return name
+
+    def _save(self, name, content):
+        diretorio, nome = os.path.split(name)
+        extensao = os.path.splitext(nome)[1]
+
+        os.makedirs(self.path(diretorio), exist_ok=True)
+        descritor, temporario = tempfile.mkstemp(dir=self.path(diretorio), suffix='.upload')
+        try:
+            digest = hashlib.new(ALGORITMO)
+            with os.fdopen(descritor, 'wb') as arquivo:
+                for pedaco in content.chunks():
+                    digest.update(pedaco)
+                    arquivo.write(pedaco)
+
+            final = nome_por_conteudo(diretorio, digest.hexdigest(), extensao)
+            os.makedirs(os.path.dirname(self.path(final)), exist_ok=True)
+            with transaction.atomic():
+                # A referência é registrada antes de o arquivo ir para o lugar; um delete()
+                # concorrente do mesmo conteúdo espera esta transação e não apaga o arquivo
+                self.adicionar_referencia(final)
+                os.replace(temporario, self.path(final))
+        except BaseException:
+            if os.path.exists(temporario):
+                os.remove(temporario)
+            raise
+        return final.replace('\\', '/')
+
+    def delete(self, name):
+        if not name:
+            raise ValueError('The name must be given to delete().')
+        referencias = _referencias()
+        with transaction.atomic():
+            # Sem registro, o arquivo é anterior a este armazenamento e outras linhas
+            # podem apontar para ele: fica em disco (deduplicar_fotos recria as contagens)
+            if not referencias.filter(nome=name, referencias__gt=0).update(referencias=F('referencias') - 1):
+                return
+            if referencias.filter(nome=name, referencias=0).delete()[0]:
+                super().delete(name)
+
+    @staticmethod
+    def adicionar_referencia(nome, quantidade=1):
+        referencias = _referencias()
+        if referencias.filter(nome=nome).update(referencias=F('referencias') + quantidade):
+            return
+        try:
+            with transaction.atomic():
+                referencias.create(nome=nome, referencias=quantidade)
+        except IntegrityError:
+            referencias.filter(nome=nome).update(referencias=F('referencias') + quantidade)
+
+
+armazenamento_fotos = ArmazenamentoConteudo()
+
+
+def obter_armazenamento_fotos():
+    return armazenamento_fotos
+
+
+def _hash_arquivo(caminho):
+    digest = hashlib.new(ALGORITMO)
+    with open(caminho, 'rb') as arquivo:
+        for pedaco in iter(lambda: arquivo.read(1024 * 1024), b''):
+            digest.update(pedaco)
+    return digest.hexdigest()
+
+
+def deduplicar_diretorio(diretorio='denuncias_fotos', dry_run=False):
+    """
+    Converte um diretório de fotos para o armazenamento por conteúdo: cada
+    arquivo é movido para o seu nome por hash (cópias idênticas são apagadas),
+    as denúncias passam a apontar para o novo nome e as referências são
+    recontadas. Retorna (arquivos analisados, duplicatas removidas, bytes liberados).
+    """
+    Denuncia = apps.get_model('denuncias', 'Denuncia')
+    campos = ['foto', 'foto_media', 'foto_miniatura']
+    storage = armazenamento_fotos
+    raiz = storage.path(diretorio)
+
+    analisados = duplicatas = liberados = 0
+    novos_nomes = {}
+    destinos = set()
+    for pasta, _, arquivos in os.walk(raiz):
+        for arquivo in sorted(arquivos):
+            caminho = os.path.join(pasta, arquivo)
+            atual = os.path.relpath(caminho, storage.path('')).replace(os.sep, '/')
+            if arquivo.endswith('.upload'):
+                continue
+            analisados += 1
+
+            final = nome_por_conteudo(diretorio, _hash_arquivo(caminho), os.path.splitext(arquivo)[1]).replace(os.sep, '/')
+            if final == atual:
+                continue
+            # No dry-run nada é movido, então a cópia anterior só está em novos_nomes
+            duplicata = os.path.exists(storage.path(final)) or (dry_run and final in destinos)
+            novos_nomes[atual] = final
+            destinos.add(final)
+            if duplicata:
+                duplicatas += 1
+                liberados += os.path.getsize(caminho)
+                if not dry_run:
+                    os.remove(caminho)
+            elif not dry_run:
+                os.makedirs(os.path.dirname(storage.path(final)), exist_ok=True)
+                os.replace(caminho, storage.path(final))
+
+    if dry_run:
+        return analisados, duplicatas, liberados
+
+    with transaction.atomic():
+        for atual, final in novos_nomes.items():
+            for campo in campos:
+                Denuncia.objects.filter(**{campo: atual}).update(**{campo: final})
+
+        # Recontagem das referências a partir das denúncias
+        contagem = {}
+        for nomes in Denuncia.objects.values_list(*campos).iterator():
+            for nome in nomes:
+                if nome and nome.startswith(diretorio + '/'):
+                    contagem[nome] = contagem.get(nome, 0) + 1
+        referencias = _referencias()
+        referencias.filter(nome__startswith=diretorio + '/').exclude(nome__in=contagem).delete()
+        for nome, total in contagem.items():
+            referencias.update_or_create(nome=nome, defaults={'referencias': total})
+
+    return analisados, duplicatas, liberados
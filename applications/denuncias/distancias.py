@@ -0,0 +1,116 @@
+"""
+Cálculo de distâncias em lote entre um ponto e um conjunto de candidatos.
+
+As coordenadas dos candidatos são convertidas uma única vez para vetores
+contíguos de float. Com NumPy instalado os cálculos são vetorizados; sem ele,
+usa-se uma implementação em Python puro com a mesma interface.
+"""
+from array import array
+from math import radians, sin, cos, sqrt, atan2, asin
+
+try:
+    import numpy as np
+except ImportError:  # NumPy é opcional
+    np = None
+
+EARTH_RADIUS_KM = 6371.0
+EARTH_RADIUS_M = EARTH_RADIUS_KM * 1000
+
+# Margem relativa do pré-filtro equiretangular. Para raios de poucos
+# quilômetros o erro da aproximação é muito menor que 1%.
+MARGEM_PREFILTRO = 1.01
+
+
+def haversine_distance(lat1, lon1, lat2, lon2):
+    """
+    Calcula a distância em metros entre duas coordenadas de lat/lon.
+    """
+    # As coordenadas do modelo são Decimal, convertemos para float para o math
+    lat1, lon1, lat2, lon2 = map(radians, [float(lat1), float(lon1), float(lat2), float(lon2)])
+
+    dlon = lon2 - lon1
+    dlat = lat2 - lat1
+
+    a = sin(dlat / 2)**2 + cos(lat1) * cos(lat2) * sin(dlon / 2)**2
+    c = 2 * atan2(sqrt(a), sqrt(1 - a))
+
+    distance_km = EARTH_RADIUS_KM * c
+    return distance_km * 1000  # Converte para metros
+
+
+def vetor_coordenadas(valores):
+    """Converte uma sequência de coordenadas (Decimal, float ou str) em um vetor contíguo de float."""
+    if np is not None:
+        return np.fromiter((float(v) for v in valores), dtype=np.float64)
+    return array('d', (float(v) for v in valores))
+
+
+def distancias_haversine(lat, lon, latitudes, longitudes):
+    """
+    Retorna a distância em metros do ponto (lat, lon) a cada candidato.
+    `latitudes` e `longitudes` devem ter sido criados por `vetor_coordenadas`.
+    """
+    lat, lon = radians(float(lat)), radians(float(lon))
+    cos_lat = cos(lat)
+
+    if np is not None:
+        lats = np.radians(latitudes)
+        lons = np.radians(longitudes)
+        a = np.sin((lats - lat) / 2) ** 2 + cos_lat * np.cos(lats) * np.sin((lons - lon) / 2) ** 2
+        return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+    resultado = array('d', bytes(8 * len(latitudes)))
+    for k, (lat2, lon2) in enumerate(zip(latitudes, longitudes)):
+        lat2, lon2 = radians(lat2), radians(lon2)
+        a = sin((lat2 - lat) / 2) ** 2 + cos_lat * cos(lat2) * sin((lon2 - lon) / 2) ** 2
+        resultado[k] = 2 * EARTH_RADIUS_M * asin(sqrt(min(a, 1.0)))
+    return resultado
+
+
+def prefiltro_equiretangular(lat, lon, latitudes, longitudes, raio_metros):
+    """
+    Retorna os índices dos candidatos que podem estar dentro do raio, usando a
+    projeção equiretangular (sem funções trigonométricas por candidato).
+    Nunca descarta um candidato que esteja de fato dentro do raio.
+    """
+    lat, lon = float(lat), float(lon)
+    escala_lon = cos(radians(lat))
+    # Compara em graus ao quadrado para evitar sqrt
+    limite = (raio_metros * MARGEM_PREFILTRO / EARTH_RADIUS_M * 180 / 3.141592653589793) ** 2
+
+    if np is not None:
+        dy = latitudes - lat
+        dx = (longitudes - lon) * escala_lon
+        return np.flatnonzero(dx * dx + dy * dy <= limite)
+
+    indices = []
+    for k, (lat2, lon2) in enumerate(zip(latitudes, longitudes)):
+        dy = lat2 - lat
+        dx = (lon2 - lon) * escala_lon
+        if dx * dx + dy * dy <= limite:
+            indices.append(k)
+    return indices
+
+
+def indices_dentro_do_raio(lat, lon, latitudes, longitudes, raio_metros):
+    """
+    Retorna, na ordem original, os índices dos candidatos a até `raio_metros`
+    do ponto e as respectivas distâncias. O pré-filtro equiretangular descarta
+    os candidatos distantes antes do cálculo exato por haversine.
+    """
+    indices = prefiltro_equiretangular(lat, lon, latitudes, longitudes, raio_metros)
+    if len(indices) == 0:
+        return [], []
+
+    if np is not None:
+        distancias = distancias_haversine(lat, lon, latitudes[indices], longitudes[indices])
+        dentro = distancias <= raio_metros
+        return indices[dentro].tolist(), distancias[dentro].tolist()
+
+    distancias = distancias_haversine(
+        lat, lon,
+        array('d', (latitudes[k] for k in indices)),
+        array('d', (longitudes[k] for k in indices)),
+    )
+    pares = [(k, d) for k, d in zip(indices, distancias) if d <= raio_metros]
+    return [k for k, _ in pares], [d for _, d in pares]
@@ -0,0 +1,141 @@
+"""
+Processamento das fotos das denúncias.
+
+Cada foto enviada vira três imagens WebP sem metadados EXIF:
+- principal: no máximo LADO_MAXIMO['principal'] px no maior lado, substitui o original
+- media e miniatura: versões menores para telas de detalhe e listagens
+
+O processamento roda fora da thread da requisição, em um pool de threads
+(o Pillow libera o GIL ao decodificar, redimensionar e codificar), depois do
+commit da transação que salvou a denúncia. Fotos que ficaram sem processar
+podem ser processadas pelo comando `processar_fotos`.
+"""
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from PIL import Image, ImageOps
+
+from .models import Denuncia
+
+logger = logging.getLogger(__name__)
+
+LADO_MAXIMO = {
+    'principal': 1920,
+    'media': 800,
+    'miniatura': 240,
+}
+FORMATO = 'WEBP'
+EXTENSAO = '.webp'
+QUALIDADE = 80
+
+_executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, 'PROCESSAMENTO_FOTOS_THREADS', 2),
+    thread_name_prefix='fotos',
+)
+
+
+def abrir_imagem(arquivo, lado_maximo=None, largura=None):
+    """
+    Decodifica a imagem já na orientação correta, em RGB ou RGBA.
+    Para JPEG, a decodificação já reduz a imagem o quanto puder sem ficar
+    abaixo de lado_maximo (no maior lado) ou da largura pedida.
+    """
+    with Image.open(arquivo) as imagem:
+        # Para JPEG, decodifica direto em escala reduzida (muito mais rápido em fotos de celular)
+        if lado_maximo is not None:
+            escala = lado_maximo / max(imagem.size)
+            if escala < 1:
+                imagem.draft('RGB', (round(imagem.width * escala), round(imagem.height * escala)))
+        elif largura is not None:
+            # A orientação do EXIF ainda não foi aplicada: os dois lados precisam caber
+            imagem.draft('RGB', (largura, largura))
+        # Aplica a rotação do EXIF antes de descartá-lo
+        imagem = ImageOps.exif_transpose(imagem)
+        transparente = imagem.mode in ('RGBA', 'LA') or 'transparency' in imagem.info
+        return imagem.convert('RGBA' if transparente else 'RGB')
+
+
+def processar_imagem(arquivo):
+    """
+    Gera as variantes de uma imagem.
+    Retorna ({variante: bytes}, (largura, altura) da principal).
+    """
+    imagem = abrir_imagem(arquivo, LADO_MAXIMO['principal'])
+
+    variantes = {}
+    dimensoes = None
+    # Do maior para o menor: cada variante é reduzida a partir da anterior
+    for nome, lado in LADO_MAXIMO.items():
+        imagem.thumbnail((lado, lado), Image.Resampling.LANCZOS, reducing_gap=3.0)
+        saida = BytesIO()
+        imagem.save(saida, FORMATO, quality=QUALIDADE, method=4)
+        variantes[nome] = saida.getvalue()
+        if dimensoes is None:
+            dimensoes = imagem.size
+    return variantes, dimensoes
+
+
+def processar_foto_denuncia(denuncia_id):
+    """Processa a foto da denúncia e grava as variantes. Retorna False se não foi possível."""
+    denuncia = Denuncia.objects.filter(pk=denuncia_id).only('id', 'foto', 'foto_media', 'foto_miniatura').first()
+    if denuncia is None or not denuncia.foto:
+        return False
+
+    original = denuncia.foto.name
+    variantes_antigas = [nome for nome in (denuncia.foto_media.name, denuncia.foto_miniatura.name) if nome]
+    storage = denuncia.foto.storage
+    try:
+        with storage.open(original, 'rb') as arquivo:
+            variantes, (largura, altura) = processar_imagem(arquivo)
+    except (OSError, Image.DecompressionBombError, ValueError) as e:
+        logger.warning(f"⚠️ Não foi possível processar a foto da denúncia {denuncia_id} ({original}): {e}")
+        return False
+
+    pasta, nome = os.path.split(original)
+    base = os.path.join(pasta, os.path.splitext(nome)[0])
+    nomes = {
+        variante: storage.save(
+            base + EXTENSAO if variante == 'principal' else f'{base}_{variante}{EXTENSAO}',
+            ContentFile(conteudo),
+        )
+        for variante, conteudo in variantes.items()
+    }
+
+    # update() em vez de save(): só os campos da foto, sem disparar os signals do mapa.
+    # O filtro pela foto original descarta o resultado se a foto foi trocada enquanto isso.
+    atualizadas = Denuncia.objects.filter(pk=denuncia_id, foto=original).update(
+        foto=nomes['principal'],
+        foto_media=nomes['media'],
+        foto_miniatura=nomes['miniatura'],
+        foto_largura=largura,
+        foto_altura=altura,
+        foto_processada=True,
+    )
+    if not atualizadas:
+        for nome in nomes.values():
+            storage.delete(nome)
+        return False
+    # Cada save() acima é uma referência nova; as antigas são liberadas
+    for nome in [original, *variantes_antigas]:
+        storage.delete(nome)
+    return True
+
+
+def _executar(denuncia_id):
+    close_old_connections()
+    try:
+        processar_foto_denuncia(denuncia_id)
+    except Exception:
+        logger.exception(f"❌ Erro ao processar a foto da denúncia {denuncia_id}")
+    finally:
+        close_old_connections()
+
+
+def agendar_processamento(denuncia_id):
+    """Processa a foto em segundo plano depois do commit da transação atual."""
+    transaction.on_commit(lambda: _executor.submit(_executar, denuncia_id))
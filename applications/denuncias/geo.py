@@ -0,0 +1,74 @@
+from decimal import Decimal, ROUND_FLOOR, ROUND_CEILING
+from math import cos, radians, ceil, pi
+
+# Tamanho da célula da grade espacial, em graus.
+# 0.002° equivalem a ~222m de latitude e a mais de 100m de longitude até ~63° de latitude,
+# então a vizinhança 3x3 de uma célula sempre cobre o raio de agrupamento no Brasil.
+TAMANHO_CELULA_GRAUS = Decimal('0.002')
+# Mesmo raio terrestre usado no cálculo das distâncias (haversine)
+METROS_POR_GRAU = 6371000.0 * pi / 180
+# Folga relativa da caixa envolvente, para não perder pontos na borda do raio
+MARGEM_CAIXA = 1.01
+
+
+def _indice(valor):
+    """Converte uma coordenada (Decimal, float ou str) no índice inteiro da grade."""
+    valor = valor if isinstance(valor, Decimal) else Decimal(str(valor))
+    return int((valor / TAMANHO_CELULA_GRAUS).to_integral_value(rounding=ROUND_FLOOR))
+
+
+def _chave(i, j):
+    return f'{i}:{j}'
+
+
+def celula_para(latitude, longitude):
+    """
+    Retorna a chave da célula da grade que contém a coordenada.
+    Formato: "<indice_lat>:<indice_lon>".
+    """
+    return _chave(_indice(latitude), _indice(longitude))
+
+
+def celulas_vizinhas(latitude, longitude, raio_metros):
+    """
+    Retorna as chaves das células que cobrem um círculo de `raio_metros`
+    em torno da coordenada. Com o raio de agrupamento atual é a vizinhança 3x3.
+    """
+    i, j = _indice(latitude), _indice(longitude)
+    tamanho = float(TAMANHO_CELULA_GRAUS)
+
+    altura_celula = tamanho * METROS_POR_GRAU
+    # A largura da célula diminui com a latitude; usa a borda mais próxima do polo
+    lat_borda = max(abs(i * tamanho), abs((i + 1) * tamanho)) + tamanho
+    largura_celula = tamanho * METROS_POR_GRAU * max(cos(radians(min(lat_borda, 89.9))), 1e-6)
+
+    passos_lat = max(1, ceil(raio_metros / altura_celula))
+    passos_lon = max(1, ceil(raio_metros / largura_celula))
+
+    return [
+        _chave(i + di, j + dj)
+        for di in range(-passos_lat, passos_lat + 1)
+        for dj in range(-passos_lon, passos_lon + 1)
+    ]
+
+
+def caixa_envolvente(latitude, longitude, raio_metros):
+    """
+    Retorna (lat_min, lat_max, lon_min, lon_max) de uma caixa que contém o
+    círculo de `raio_metros` em torno da coordenada. Os limites são Decimal
+    com 8 casas (a precisão dos campos do modelo), arredondados para fora.
+    """
+    latitude = float(latitude)
+    longitude = float(longitude)
+
+    raio_metros = raio_metros * MARGEM_CAIXA
+    delta_lat = raio_metros / METROS_POR_GRAU
+    delta_lon = raio_metros / (METROS_POR_GRAU * max(cos(radians(min(abs(latitude) + delta_lat, 89.9))), 1e-6))
+
+    quantum = Decimal('0.00000001')
+    return (
+        Decimal(repr(latitude - delta_lat)).quantize(quantum, rounding=ROUND_FLOOR),
+        Decimal(repr(latitude + delta_lat)).quantize(quantum, rounding=ROUND_CEILING),
+        Decimal(repr(longitude - delta_lon)).quantize(quantum, rounding=ROUND_FLOOR),
+        Decimal(repr(longitude + delta_lon)).quantize(quantum, rounding=ROUND_CEILING),
+    )
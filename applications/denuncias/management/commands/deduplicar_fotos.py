@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from applications.denuncias.armazenamento import deduplicar_diretorio
+
+class Command(BaseCommand):
+    help = 'Move as fotos existentes para o armazenamento por conteúdo, removendo as cópias idênticas.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Apenas informa quantas cópias seriam removidas.',
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        self.stdout.write(self.style.SUCCESS('Analisando denuncias_fotos/...'))
+
+        analisados, duplicatas, liberados = deduplicar_diretorio(dry_run=dry_run)
+
+        mensagem = f'{analisados} arquivo(s) analisado(s), {duplicatas} cópia(s) idêntica(s) ({liberados / 1024:.1f} KB)'
+        if dry_run:
+            self.stdout.write(self.style.WARNING(f'{mensagem} seriam removidas.'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'{mensagem} removida(s).'))
@@ -0,0 +1,9 @@
+from django.core.management.base import BaseCommand
+from applications.denuncias.uploads import limpar_uploads_expirados
+
+class Command(BaseCommand):
+    help = 'Remove os uploads em pedaços abandonados há mais de 24 horas.'
+
+    def handle(self, *args, **options):
+        removidos = limpar_uploads_expirados()
+        self.stdout.write(self.style.SUCCESS(f'{removidos} upload(s) expirado(s) removido(s).'))
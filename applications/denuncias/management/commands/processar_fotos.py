@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from applications.denuncias.fotos import processar_foto_denuncia
+from applications.denuncias.models import Denuncia
+
+class Command(BaseCommand):
+    help = 'Gera a foto principal e as miniaturas das denúncias que ainda não foram processadas.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--todas',
+            action='store_true',
+            help='Reprocessa também as fotos já processadas.',
+        )
+
+    def handle(self, *args, **options):
+        denuncias = Denuncia.objects.all()
+        if not options['todas']:
+            denuncias = denuncias.filter(foto_processada=False)
+        ids = list(denuncias.order_by('id').values_list('id', flat=True))
+
+        self.stdout.write(self.style.SUCCESS(f'Processando {len(ids)} foto(s)...'))
+
+        falhas = 0
+        for denuncia_id in ids:
+            if not processar_foto_denuncia(denuncia_id):
+                falhas += 1
+                self.stdout.write(self.style.WARNING(f'Não foi possível processar a foto da denúncia {denuncia_id}.'))
+
+        self.stdout.write(self.style.SUCCESS(f'{len(ids) - falhas} foto(s) processada(s).'))
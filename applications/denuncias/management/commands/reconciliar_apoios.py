@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from applications.denuncias.services import reconciliar_total_apoios
+
+class Command(BaseCommand):
+    help = 'Corrige o contador total_apoios das denúncias a partir da contagem real de apoios.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Apenas informa quantas denúncias estão com o contador divergente.',
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        self.stdout.write(self.style.SUCCESS('Verificando contadores de apoios...'))
+
+        divergentes = reconciliar_total_apoios(dry_run=dry_run)
+
+        if not divergentes:
+            self.stdout.write(self.style.SUCCESS('Todos os contadores estão corretos.'))
+        elif dry_run:
+            self.stdout.write(self.style.WARNING(f'{divergentes} denúncia(s) com o contador divergente.'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'{divergentes} denúncia(s) corrigida(s).'))
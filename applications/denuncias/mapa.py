@@ -0,0 +1,206 @@
+"""
+Índice de clusters do mapa de denúncias.
+
+As denúncias são projetadas em Web Mercator e agrupadas em uma grade
+hierárquica (quadtree): no zoom z o mundo tem CELULAS_POR_EIXO_ZOOM_0 * 2^z
+células por eixo, e cada célula do zoom z - 1 é a união de 4 células do
+zoom z. Os clusters de todos os zooms são calculados uma única vez, de baixo
+para cima, e ficam em memória ordenados pela coluna da célula; uma consulta
+por viewport é só uma busca binária seguida de um filtro pela linha.
+
+O índice é reconstruído sob demanda, na primeira consulta depois que a
+versão do grupo "mapa" do cache compartilhado muda. Os signals de Denuncia e
+ApoioDenuncia a incrementam depois do commit (ver signals.py), o que também
+alcança os outros processos do servidor.
+
+Cada filtro (categoria, status) tem o seu índice e a sua trava. Enquanto um
+índice é reconstruído, as outras consultas usam o anterior em vez de esperar,
+e um mesmo índice é reconstruído no máximo uma vez a cada
+INTERVALO_MINIMO_RECONSTRUCAO segundos: uma rajada de apoios gera uma
+reconstrução, não uma por escrita.
+"""
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from math import floor, log, pi, radians, tan, cos
+
+from applications.core import cache as cache_compartilhado
+from .models import Denuncia
+
+ZOOM_MAXIMO_CLUSTER = 16
+# A partir deste zoom o endpoint retorna as denúncias individualmente
+ZOOM_PONTOS = ZOOM_MAXIMO_CLUSTER + 1
+# Células de 64px em tiles de 256px
+CELULAS_POR_EIXO_ZOOM_0 = 4
+LATITUDE_MAXIMA = 85.05112878
+GRUPO_CACHE = 'mapa'
+INTERVALO_MINIMO_RECONSTRUCAO = 2.0
+
+
+def projetar(latitude, longitude):
+    """Converte lat/lon em coordenadas Web Mercator normalizadas em [0, 1)."""
+    latitude = max(min(float(latitude), LATITUDE_MAXIMA), -LATITUDE_MAXIMA)
+    x = (float(longitude) + 180.0) / 360.0
+    y = (1.0 - log(tan(radians(latitude)) + 1.0 / cos(radians(latitude))) / pi) / 2.0
+    return min(max(x, 0.0), 1.0 - 1e-12), min(max(y, 0.0), 1.0 - 1e-12)
+
+
+def celulas_por_eixo(zoom):
+    return CELULAS_POR_EIXO_ZOOM_0 << zoom
+
+
+class Cluster:
+    __slots__ = ('cx', 'cy', 'total', 'soma_lat', 'soma_lon', 'total_apoios', 'categorias')
+
+    def __init__(self, cx, cy):
+        self.cx, self.cy = cx, cy
+        self.total = 0
+        self.soma_lat = self.soma_lon = 0.0
+        self.total_apoios = 0
+        self.categorias = Counter()
+
+    def absorver(self, outro):
+        self.total += outro.total
+        self.soma_lat += outro.soma_lat
+        self.soma_lon += outro.soma_lon
+        self.total_apoios += outro.total_apoios
+        self.categorias.update(outro.categorias)
+
+    def como_dict(self):
+        return {
+            'latitude': round(self.soma_lat / self.total, 6),
+            'longitude': round(self.soma_lon / self.total, 6),
+            'total': self.total,
+            'categoria_dominante': self.categorias.most_common(1)[0][0],
+            'total_apoios': self.total_apoios,
+        }
+
+
+class IndiceMapa:
+    """Clusters pré-calculados de um conjunto de denúncias para todos os zooms."""
+
+    def __init__(self, denuncias):
+        # denuncias: iterável de (id, latitude, longitude, categoria_id, status, total_apoios)
+        pontos = []
+        for pk, latitude, longitude, categoria_id, status, total_apoios in denuncias:
+            x, y = projetar(latitude, longitude)
+            pontos.append((x, y, pk, float(latitude), float(longitude), categoria_id, status, total_apoios))
+        pontos.sort()
+        self.pontos = pontos
+        self.pontos_x = [ponto[0] for ponto in pontos]
+
+        # Nível mais detalhado a partir dos pontos
+        n = celulas_por_eixo(ZOOM_MAXIMO_CLUSTER)
+        nivel = {}
+        for x, y, _, latitude, longitude, categoria_id, _, total_apoios in pontos:
+            chave = (int(x * n), int(y * n))
+            cluster = nivel.get(chave)
+            if cluster is None:
+                cluster = nivel[chave] = Cluster(*chave)
+            cluster.total += 1
+            cluster.soma_lat += latitude
+            cluster.soma_lon += longitude
+            cluster.total_apoios += total_apoios
+            cluster.categorias[categoria_id] += 1
+
+        # Cada nível é a fusão dos quatro filhos no nível abaixo
+        self.niveis = {}
+        for zoom in range(ZOOM_MAXIMO_CLUSTER, -1, -1):
+            clusters = sorted(nivel.values(), key=lambda c: (c.cx, c.cy))
+            self.niveis[zoom] = ([c.cx for c in clusters], clusters)
+            if zoom == 0:
+                break
+            pai = {}
+            for cluster in clusters:
+                chave = (cluster.cx >> 1, cluster.cy >> 1)
+                agregado = pai.get(chave)
+                if agregado is None:
+                    agregado = pai[chave] = Cluster(*chave)
+                agregado.absorver(cluster)
+            nivel = pai
+
+    def clusters(self, zoom, caixa):
+        """Clusters do zoom cujas células intersectam a caixa (lon_min, lat_min, lon_max, lat_max)."""
+        zoom = max(0, min(zoom, ZOOM_MAXIMO_CLUSTER))
+        n = celulas_por_eixo(zoom)
+        (x0, y0), (x1, y1) = self._caixa_projetada(caixa)
+        cx0, cx1, cy0, cy1 = floor(x0 * n), floor(x1 * n), floor(y0 * n), floor(y1 * n)
+
+        colunas, clusters = self.niveis[zoom]
+        return [
+            cluster.como_dict()
+            for cluster in clusters[bisect_left(colunas, cx0):bisect_right(colunas, cx1)]
+            if cy0 <= cluster.cy <= cy1
+        ]
+
+    def pontos_na_caixa(self, caixa):
+        (x0, y0), (x1, y1) = self._caixa_projetada(caixa)
+        return [
+            {
+                'id': pk,
+                'latitude': latitude,
+                'longitude': longitude,
+                'categoria': categoria_id,
+                'status': status,
+                'total_apoios': total_apoios,
+            }
+            for x, y, pk, latitude, longitude, categoria_id, status, total_apoios
+            in self.pontos[bisect_left(self.pontos_x, x0):bisect_right(self.pontos_x, x1)]
+            if y0 <= y <= y1
+        ]
+
+    @staticmethod
+    def _caixa_projetada(caixa):
+        lon_min, lat_min, lon_max, lat_max = caixa
+        # Em Web Mercator o y cresce para o sul
+        return projetar(lat_max, lon_min), projetar(lat_min, lon_max)
+
+
+_travas = {}
+_travas_trava = threading.Lock()
+# (categoria_id, status) -> (versão, momento da construção, índice)
+_indices = {}
+
+
+def _trava_do_filtro(chave):
+    with _travas_trava:
+        return _travas.setdefault(chave, threading.Lock())
+
+
+def _construir(categoria_id, status):
+    queryset = Denuncia.objects.all()
+    if categoria_id is not None:
+        queryset = queryset.filter(categoria_id=categoria_id)
+    if status is not None:
+        queryset = queryset.filter(status=status)
+    return IndiceMapa(
+        queryset.values_list('id', 'latitude', 'longitude', 'categoria_id', 'status', 'total_apoios').iterator()
+    )
+
+
+def obter_indice(categoria_id=None, status=None):
+    """Retorna o índice do mapa para o filtro informado, reconstruindo-o se necessário."""
+    chave = (categoria_id, status)
+    # Lida antes de consultar o banco: uma escrita durante a reconstrução muda a versão de novo
+    versao = cache_compartilhado.versao(GRUPO_CACHE)
+    atual = _indices.get(chave)
+    if atual is not None and atual[0] == versao:
+        return atual[2]
+
+    trava = _trava_do_filtro(chave)
+    if atual is not None:
+        recente = time.monotonic() - atual[1] < INTERVALO_MINIMO_RECONSTRUCAO
+        if recente or not trava.acquire(blocking=False):
+            return atual[2]
+    else:
+        trava.acquire()
+    try:
+        atual = _indices.get(chave)
+        if atual is not None and atual[0] == versao:
+            return atual[2]
+        indice = _construir(categoria_id, status)
+        _indices[chave] = (versao, time.monotonic(), indice)
+        return indice
+    finally:
+        trava.release()
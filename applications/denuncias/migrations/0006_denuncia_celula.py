@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:21
+
+from decimal import Decimal, ROUND_FLOOR
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def celula_para(latitude, longitude):
+    # Cópia de denuncias/geo.py na época desta migração, para o histórico não depender do código atual
+    def indice(valor):
+        valor = valor if isinstance(valor, Decimal) else Decimal(str(valor))
+        return int((valor / Decimal('0.002')).to_integral_value(rounding=ROUND_FLOOR))
+    return f'{indice(latitude)}:{indice(longitude)}'
+
+
+def preencher_celulas(apps, schema_editor):
+    """Calcula a célula da grade para as denúncias já existentes."""
+    Denuncia = apps.get_model('denuncias', 'Denuncia')
+    denuncias = list(Denuncia.objects.only('id', 'latitude', 'longitude'))
+    for denuncia in denuncias:
+        denuncia.celula = celula_para(denuncia.latitude, denuncia.longitude)
+    Denuncia.objects.bulk_update(denuncias, ['celula'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('denuncias', '0005_comentario_autor_convidado_alter_comentario_autor'),
+        ('localidades', '0002_popular_estados'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='denuncia',
+            name='celula',
+            field=models.CharField(blank=True, default='', editable=False, max_length=32),
+        ),
+        migrations.RunPython(preencher_celulas, reverse_code=migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='denuncia',
+            index=models.Index(fields=['categoria', 'status', 'celula'], name='denuncia_cat_status_celula_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='denuncia',
+            index=models.Index(fields=['categoria', 'status', 'latitude', 'longitude'], name='denuncia_cat_status_latlon_idx'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('denuncias', '0006_denuncia_celula'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TravaAgrupamento',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('chave', models.CharField(max_length=64, unique=True)),
+                ('token', models.CharField(blank=True, default='', max_length=32)),
+                ('criada_em', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Trava de Agrupamento',
+                'verbose_name_plural': 'Travas de Agrupamento',
+            },
+        ),
+    ]
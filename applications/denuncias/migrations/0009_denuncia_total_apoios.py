@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:27
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def preencher_total_apoios(apps, schema_editor):
+    """Preenche o contador de apoios das denúncias já existentes."""
+    Denuncia = apps.get_model('denuncias', 'Denuncia')
+    ApoioDenuncia = apps.get_model('denuncias', 'ApoioDenuncia')
+    contagem = (
+        ApoioDenuncia.objects.filter(denuncia=OuterRef('pk'))
+        .values('denuncia')
+        .annotate(total=Count('id'))
+        .values('total')
+    )
+    Denuncia.objects.update(total_apoios=Coalesce(Subquery(contagem), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('denuncias', '0008_travaagrupamento'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='denuncia',
+            name='total_apoios',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(preencher_total_apoios, reverse_code=migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:29
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('denuncias', '0009_denuncia_total_apoios'),
+        ('localidades', '0002_popular_estados'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comentario',
+            index=models.Index(fields=['denuncia', 'data_criacao', 'id'], name='comentario_denuncia_data_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='denuncia',
+            index=models.Index(fields=['-data_criacao', 'id'], name='denuncia_data_id_idx'),
+        ),
+    ]
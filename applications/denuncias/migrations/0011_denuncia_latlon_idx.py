@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:35
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('denuncias', '0010_indices_paginacao'),
+        ('localidades', '0002_popular_estados'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='denuncia',
+            index=models.Index(fields=['latitude', 'longitude'], name='denuncia_latlon_idx'),
+        ),
+    ]
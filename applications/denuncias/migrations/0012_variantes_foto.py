@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('denuncias', '0011_denuncia_latlon_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='denuncia',
+            name='foto_altura',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='denuncia',
+            name='foto_largura',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='denuncia',
+            name='foto_media',
+            field=models.ImageField(blank=True, editable=False, upload_to='denuncias_fotos/'),
+        ),
+        migrations.AddField(
+            model_name='denuncia',
+            name='foto_miniatura',
+            field=models.ImageField(blank=True, editable=False, upload_to='denuncias_fotos/'),
+        ),
+        migrations.AddField(
+            model_name='denuncia',
+            name='foto_processada',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:47
+
+import applications.denuncias.armazenamento
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('denuncias', '0012_variantes_foto'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReferenciaArquivo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nome', models.CharField(max_length=255, unique=True)),
+                ('referencias', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Referência de Arquivo',
+                'verbose_name_plural': 'Referências de Arquivos',
+            },
+        ),
+        migrations.AlterField(
+            model_name='denuncia',
+            name='foto',
+            field=models.ImageField(storage=applications.denuncias.armazenamento.obter_armazenamento_fotos, upload_to='denuncias_fotos/'),
+        ),
+        migrations.AlterField(
+            model_name='denuncia',
+            name='foto_media',
+            field=models.ImageField(blank=True, editable=False, storage=applications.denuncias.armazenamento.obter_armazenamento_fotos, upload_to='denuncias_fotos/'),
+        ),
+        migrations.AlterField(
+            model_name='denuncia',
+            name='foto_miniatura',
+            field=models.ImageField(blank=True, editable=False, storage=applications.denuncias.armazenamento.obter_armazenamento_fotos, upload_to='denuncias_fotos/'),
+        ),
+    ]
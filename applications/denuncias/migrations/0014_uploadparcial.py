@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:53
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('denuncias', '0013_armazenamento_por_conteudo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UploadParcial',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('nome_arquivo', models.CharField(max_length=100)),
+                ('tamanho', models.PositiveIntegerField()),
+                ('foto', models.CharField(blank=True, default='', max_length=255)),
+                ('criado_em', models.DateTimeField(auto_now_add=True)),
+                ('atualizado_em', models.DateTimeField(auto_now=True)),
+                ('denuncia', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='denuncias.denuncia')),
+            ],
+            options={
+                'verbose_name': 'Upload Parcial',
+                'verbose_name_plural': 'Uploads Parciais',
+            },
+        ),
+    ]
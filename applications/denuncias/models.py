@@ -1,8 +1,13 @@
+import uuid
+
 from django.db import models
 from django.conf import settings
 from django.utils.translation import gettext_lazy as _
 from applications.localidades.models import Cidade, Estado
 
+from .armazenamento import obter_armazenamento_fotos
+from .geo import celula_para
+
 class Categoria(models.Model):
     """Modelo para as categorias de denúncias (ex: Iluminação, Saneamento)."""
     nome = models.CharField(max_length=100, unique=True)
@@ -42,8 +47,15 @@ class Denuncia(models.Model):
     cidade = models.ForeignKey(Cidade, on_delete=models.PROTECT, related_name='denuncias')
     estado = models.ForeignKey(Estado, on_delete=models.PROTECT, related_name='denuncias')
     
-    # A foto é obrigatória
-    foto = models.ImageField(upload_to='denuncias_fotos/', blank=False, null=False)
+    # A foto é obrigatória. Os arquivos são nomeados pelo conteúdo (ver armazenamento.py)
+    foto = models.ImageField(upload_to='denuncias_fotos/', storage=obter_armazenamento_fotos, blank=False, null=False)
+
+    # Variantes e dimensões geradas a partir da foto (ver fotos.py)
+    foto_media = models.ImageField(upload_to='denuncias_fotos/', storage=obter_armazenamento_fotos, blank=True, editable=False)
+    foto_miniatura = models.ImageField(upload_to='denuncias_fotos/', storage=obter_armazenamento_fotos, blank=True, editable=False)
+    foto_largura = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    foto_altura = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    foto_processada = models.BooleanField(default=False, editable=False)
     
     # Usar DecimalField para precisão de coordenadas
     latitude = models.DecimalField(max_digits=10, decimal_places=8)
@@ -54,14 +66,90 @@ class Denuncia(models.Model):
     
     data_criacao = models.DateTimeField(auto_now_add=True)
 
+    # Contador de apoios, mantido pelos signals de ApoioDenuncia (ver signals.py)
+    total_apoios = models.PositiveIntegerField(default=0, editable=False)
+
+    # Chave da célula da grade espacial, preenchida ao salvar (ver geo.py)
+    celula = models.CharField(max_length=32, editable=False, blank=True, default='')
+
     class Meta:
         verbose_name = _('Denúncia')
         verbose_name_plural = _('Denúncias')
         ordering = ['-data_criacao']
+        indexes = [
+            # Busca de denúncias próximas no agrupamento: células vizinhas e caixa envolvente em lat/lon
+            models.Index(fields=['categoria', 'status', 'celula'], name='denuncia_cat_status_celula_idx'),
+            models.Index(fields=['categoria', 'status', 'latitude', 'longitude'], name='denuncia_cat_status_latlon_idx'),
+            # Consulta dos tiles do mapa (ver tiles.py)
+            models.Index(fields=['latitude', 'longitude'], name='denuncia_latlon_idx'),
+            # Paginação por cursor das listagens (ver core/pagination.py)
+            models.Index(fields=['-data_criacao', 'id'], name='denuncia_data_id_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        # Mantém a célula sincronizada com as coordenadas
+        self.celula = celula_para(self.latitude, self.longitude)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'latitude', 'longitude'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'celula'}
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return self.titulo
 
+class TravaAgrupamento(models.Model):
+    """
+    Trava do agrupamento de denúncias para uma categoria em uma célula da grade.
+    Serializa o "busca ou cria" de submissões próximas (ver travas.py).
+    """
+    chave = models.CharField(max_length=64, unique=True)
+    token = models.CharField(max_length=32, blank=True, default='')
+    criada_em = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = _('Trava de Agrupamento')
+        verbose_name_plural = _('Travas de Agrupamento')
+
+    def __str__(self):
+        return self.chave
+
+class ReferenciaArquivo(models.Model):
+    """
+    Quantas vezes um arquivo do armazenamento de fotos está em uso.
+    Envios idênticos compartilham o mesmo arquivo (ver armazenamento.py).
+    """
+    nome = models.CharField(max_length=255, unique=True)
+    referencias = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = _('Referência de Arquivo')
+        verbose_name_plural = _('Referências de Arquivos')
+
+    def __str__(self):
+        return f'{self.nome} ({self.referencias})'
+
+class UploadParcial(models.Model):
+    """
+    Upload retomável de uma foto, enviado em pedaços (ver uploads.py).
+    Depois de finalizado, o id é usado no lugar da foto ao criar a denúncia.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    nome_arquivo = models.CharField(max_length=100)
+    tamanho = models.PositiveIntegerField()
+    # Nome no armazenamento de fotos, preenchido na finalização
+    foto = models.CharField(max_length=255, blank=True, default='')
+    # Denúncia criada (ou apoiada) com este upload; torna a criação idempotente
+    denuncia = models.ForeignKey(Denuncia, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    criado_em = models.DateTimeField(auto_now_add=True)
+    atualizado_em = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = _('Upload Parcial')
+        verbose_name_plural = _('Uploads Parciais')
+
+    def __str__(self):
+        return f'{self.nome_arquivo} ({self.id})'
+
 class ApoioDenuncia(models.Model):
     """Representa o apoio (reclamação agrupada) de um usuário a uma denúncia existente."""
     denuncia = models.ForeignKey(Denuncia, on_delete=models.CASCADE, related_name='apoios')
@@ -97,6 +185,10 @@ class Comentario(models.Model):
         verbose_name = _('Comentário')
         verbose_name_plural = _('Comentários')
         ordering = ['data_criacao']
+        indexes = [
+            # Paginação por cursor dos comentários de uma denúncia (ver core/pagination.py)
+            models.Index(fields=['denuncia', 'data_criacao', 'id'], name='comentario_denuncia_data_idx'),
+        ]
 
     def __str__(self):
         return f'Comentário de {self.autor} em "{self.denuncia.titulo}"'
\ No newline at end of file
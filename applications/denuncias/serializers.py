@@ -1,5 +1,7 @@
+from django.conf import settings
 from rest_framework import serializers
-from .models import Categoria, Denuncia, ApoioDenuncia, Comentario
+from .models import Categoria, Denuncia, ApoioDenuncia, Comentario, UploadParcial
+from .uploads import offset_atual
 from applications.autenticacao.serializers import UserSerializer
 
 class CategoriaSerializer(serializers.ModelSerializer):
@@ -9,25 +11,49 @@ class CategoriaSerializer(serializers.ModelSerializer):
 
 class DenunciaSerializer(serializers.ModelSerializer):
     autor = UserSerializer(read_only=True, required=False)
-    total_apoios = serializers.SerializerMethodField()
     autor_convidado = serializers.CharField(max_length=150, required=False, allow_blank=True)
+    # A foto pode vir no próprio POST ou de um upload em pedaços já finalizado (ver uploads.py)
+    foto = serializers.ImageField(required=False)
+    upload = serializers.PrimaryKeyRelatedField(
+        queryset=UploadParcial.objects.exclude(foto=''), required=False, write_only=True
+    )
 
     class Meta:
         model = Denuncia
         fields = [
             'id', 'titulo', 'descricao', 'autor', 'autor_convidado', 'categoria', 'cidade', 'estado',
-            'foto', 'latitude', 'longitude', 'jurisdicao', 'status',
+            'foto', 'upload', 'foto_media', 'foto_miniatura', 'foto_largura', 'foto_altura',
+            'latitude', 'longitude', 'jurisdicao', 'status',
             'data_criacao', 'total_apoios'
         ]
-        read_only_fields = ('autor', 'data_criacao')
+        read_only_fields = (
+            'autor', 'data_criacao', 'total_apoios',
+            'foto_media', 'foto_miniatura', 'foto_largura', 'foto_altura',
+        )
 
-    def get_total_apoios(self, obj):
-        return obj.apoios.count()
+    @staticmethod
+    def preparar_queryset(queryset):
+        """
+        Carrega só as colunas que este serializer usa, com o autor no mesmo SELECT.
+        Categoria, cidade e estado saem como ids, então não precisam de JOIN.
+        """
+        campos_autor = [f'autor__{campo}' for campo in UserSerializer.Meta.fields if campo != 'password']
+        colunas = {campo.name for campo in Denuncia._meta.concrete_fields}
+        campos = [campo for campo in DenunciaSerializer.Meta.fields if campo != 'autor' and campo in colunas]
+        return queryset.select_related('autor').only(*campos, *campos_autor)
 
     def validate(self, data):
         user = self.context['request'].user
         autor_convidado = data.get('autor_convidado')
 
+        if self.instance is None:
+            if data.get('foto') and data.get('upload'):
+                raise serializers.ValidationError('Envie a foto ou o id do upload, não os dois.')
+            if not data.get('foto') and not data.get('upload'):
+                raise serializers.ValidationError({'foto': 'É necessário enviar a foto ou o id de um upload finalizado.'})
+        else:
+            data.pop('upload', None)
+
         if user.is_authenticated:
             if autor_convidado:
                 # Não faz sentido ter um autor convidado se o usuário está logado
@@ -39,6 +65,26 @@ class DenunciaSerializer(serializers.ModelSerializer):
             
         return data
 
+class UploadParcialSerializer(serializers.ModelSerializer):
+    offset = serializers.SerializerMethodField()
+    finalizado = serializers.SerializerMethodField()
+
+    class Meta:
+        model = UploadParcial
+        fields = ['id', 'nome_arquivo', 'tamanho', 'offset', 'finalizado']
+        read_only_fields = ('id',)
+
+    def get_offset(self, obj):
+        return obj.tamanho if obj.foto else offset_atual(obj)
+
+    def get_finalizado(self, obj):
+        return bool(obj.foto)
+
+    def validate_tamanho(self, value):
+        if not 0 < value <= settings.UPLOAD_FOTO_MAX_BYTES:
+            raise serializers.ValidationError(f'O tamanho deve estar entre 1 e {settings.UPLOAD_FOTO_MAX_BYTES} bytes.')
+        return value
+
 class ApoioDenunciaSerializer(serializers.ModelSerializer):
     apoiador = UserSerializer(read_only=True)
 
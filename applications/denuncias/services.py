@@ -1,32 +1,35 @@
-from math import radians, sin, cos, sqrt, atan2
-from django.db import transaction
 import logging
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 
 from .models import Denuncia, ApoioDenuncia
+from .geo import caixa_envolvente, celulas_vizinhas
+from .distancias import vetor_coordenadas, indices_dentro_do_raio
+from .travas import trava_agrupamento
+from .uploads import consumir_upload
 
 # ✅ CORREÇÃO 1: Raio de agrupamento reduzido para 100 metros
 SEARCH_RADIUS_METERS = 100  # Alterado de 150m para 100m
-EARTH_RADIUS_KM = 6371.0
 
 logger = logging.getLogger(__name__)
 
-def haversine_distance(lat1, lon1, lat2, lon2):
+def buscar_candidatas(categoria, latitude, longitude):
     """
-    Calcula a distância em metros entre duas coordenadas de lat/lon.
+    Retorna as denúncias que podem ser agrupadas com uma nova denúncia no ponto
+    informado: mesma categoria, não resolvidas, nas células da grade em volta do
+    ponto e dentro da caixa envolvente do raio de agrupamento. O filtro usa os
+    índices (categoria, status, celula) e (categoria, status, latitude, longitude).
     """
-    # As coordenadas do modelo são Decimal, convertemos para float para o math
-    lat1, lon1, lat2, lon2 = map(radians, [float(lat1), float(lon1), float(lat2), float(lon2)])
-
-    dlon = lon2 - lon1
-    dlat = lat2 - lat1
-
-    a = sin(dlat / 2)**2 + cos(lat1) * cos(lat2) * sin(dlon / 2)**2
-    c = 2 * atan2(sqrt(a), sqrt(1 - a))
-
-    distance_km = EARTH_RADIUS_KM * c
-    return distance_km * 1000  # Converte para metros
-
-def criar_ou_apoiar_denuncia(validated_data, user=None, autor_convidado=None):
+    lat_min, lat_max, lon_min, lon_max = caixa_envolvente(latitude, longitude, SEARCH_RADIUS_METERS)
+    return Denuncia.objects.filter(
+        categoria=categoria,
+        status__in=[Denuncia.Status.ABERTA, Denuncia.Status.EM_ANALISE],  # Não agrupa com resolvidas
+        celula__in=celulas_vizinhas(latitude, longitude, SEARCH_RADIUS_METERS),
+        latitude__range=(lat_min, lat_max),
+        longitude__range=(lon_min, lon_max),
+    )
+
+def criar_ou_apoiar_denuncia(validated_data, user=None, autor_convidado=None, upload=None):
     """
     Cria uma nova denúncia ou adiciona um apoio a uma denúncia existente.
 
@@ -36,6 +39,12 @@ def criar_ou_apoiar_denuncia(validated_data, user=None, autor_convidado=None):
     - ✅ Status não resolvido
     - ✅ Permite apoio de usuários autenticados E convidados
 
+    Com `upload` (UploadParcial já finalizado), o upload é marcado como usado
+    na mesma transação (ver uploads.consumir_upload).
+
+    Lança TravaOcupada se a trava do local não for obtida a tempo, e
+    UploadJaConsumido se outra requisição já criou a denúncia deste upload.
+
     Retorna:
         tuple: (denuncia, created_denuncia, created_apoio)
             - denuncia: objeto Denuncia (nova ou existente)
@@ -51,78 +60,119 @@ def criar_ou_apoiar_denuncia(validated_data, user=None, autor_convidado=None):
     logger.info(f"   Coordenadas: {new_lat}, {new_lon}")
     logger.info(f"   Usuário: {user.username if user else autor_convidado}")
 
-    with transaction.atomic():
-        # ✅ CORREÇÃO 2: Buscar denúncias da MESMA CATEGORIA e não resolvidas
-        denuncias_candidatas = Denuncia.objects.filter(
-            categoria=categoria,
-            status__in=[Denuncia.Status.ABERTA, Denuncia.Status.EM_ANALISE]  # Não agrupa com resolvidas
-        ).order_by('-data_criacao')
+    # Submissões simultâneas no mesmo local esperam umas pelas outras (ver travas.py)
+    with trava_agrupamento(categoria, new_lat, new_lon, SEARCH_RADIUS_METERS):
+        denuncia, created_denuncia, created_apoio = _buscar_ou_criar(validated_data, user, autor_convidado)
+        if upload is not None:
+            # Na mesma transação: se outra requisição já usou o upload, tudo acima é desfeito
+            consumir_upload(upload, denuncia, created_denuncia)
+        return denuncia, created_denuncia, created_apoio
 
-        logger.info(f"🔍 Buscando denúncias similares:")
-        logger.info(f"   Raio: {SEARCH_RADIUS_METERS}m")
-        logger.info(f"   Categoria: {categoria.nome}")
-        logger.info(f"   Candidatas encontradas: {denuncias_candidatas.count()}")
 
-        denuncia_proxima = None
-        distancia_encontrada = None
-        
-        # Buscar denúncia próxima (tanto para usuários quanto convidados)
-        for denuncia in denuncias_candidatas:
-            distancia = haversine_distance(
-                new_lat, new_lon,
-                denuncia.latitude, denuncia.longitude
-            )
-            logger.debug(f"   Denúncia #{denuncia.id}: {distancia:.2f}m")
-            
-            if distancia <= SEARCH_RADIUS_METERS:
-                denuncia_proxima = denuncia
-                distancia_encontrada = distancia
-                break
-
-        # ✅ CORREÇÃO 3: Se encontrou denúncia próxima, criar apoio
-        if denuncia_proxima:
-            logger.info(f"✅ Denúncia similar encontrada (ID #{denuncia_proxima.id})")
-            logger.info(f"   Distância: {distancia_encontrada:.2f} metros")
-            logger.info(f"   Adicionando apoio...")
-
-            # Verificar se já existe apoio deste usuário/convidado
-            if user:
-                # Usuário autenticado - verificar por apoiador
-                apoio_existente = ApoioDenuncia.objects.filter(
-                    denuncia=denuncia_proxima,
-                    apoiador=user
-                ).exists()
-            else:
-                # Convidado - não verificar duplicata (pode apoiar múltiplas vezes)
-                # Isso permite que diferentes convidados apoiem, mesmo que usem o mesmo nome
-                apoio_existente = False
-
-            if apoio_existente:
-                logger.info(f"⚠️  Usuário {user.username} já apoiou esta denúncia")
-                return denuncia_proxima, False, False
-
-            # Criar apoio
-            ApoioDenuncia.objects.create(
+def _buscar_ou_criar(validated_data, user, autor_convidado):
+    """O "busca ou cria" do agrupamento; roda com a trava do local (ver criar_ou_apoiar_denuncia)."""
+    new_lat = validated_data.get('latitude')
+    new_lon = validated_data.get('longitude')
+    categoria = validated_data.get('categoria')
+
+    # ✅ CORREÇÃO 2: Buscar denúncias da MESMA CATEGORIA e não resolvidas
+    # Só as coordenadas das candidatas são lidas; a denúncia encontrada é carregada depois
+    candidatas = list(
+        buscar_candidatas(categoria, new_lat, new_lon)
+        .order_by('-data_criacao')
+        .values_list('id', 'latitude', 'longitude')
+    )
+
+    logger.info(f"🔍 Buscando denúncias similares:")
+    logger.info(f"   Raio: {SEARCH_RADIUS_METERS}m")
+    logger.info(f"   Categoria: {categoria.nome}")
+    logger.info(f"   Candidatas encontradas: {len(candidatas)}")
+
+    denuncia_proxima = None
+    distancia_encontrada = None
+
+    # Buscar denúncia próxima (tanto para usuários quanto convidados)
+    # As distâncias de todas as candidatas são calculadas de uma só vez
+    if candidatas:
+        indices, distancias = indices_dentro_do_raio(
+            new_lat, new_lon,
+            vetor_coordenadas(latitude for _, latitude, _ in candidatas),
+            vetor_coordenadas(longitude for _, _, longitude in candidatas),
+            SEARCH_RADIUS_METERS,
+        )
+        if indices:
+            # A ordem é preservada: a primeira é a mais recente dentro do raio
+            denuncia_proxima = Denuncia.objects.get(pk=candidatas[indices[0]][0])
+            distancia_encontrada = distancias[0]
+
+    # ✅ CORREÇÃO 3: Se encontrou denúncia próxima, criar apoio
+    if denuncia_proxima:
+        logger.info(f"✅ Denúncia similar encontrada (ID #{denuncia_proxima.id})")
+        logger.info(f"   Distância: {distancia_encontrada:.2f} metros")
+        logger.info(f"   Adicionando apoio...")
+
+        # Verificar se já existe apoio deste usuário/convidado
+        if user:
+            # Usuário autenticado - verificar por apoiador
+            apoio_existente = ApoioDenuncia.objects.filter(
                 denuncia=denuncia_proxima,
-                apoiador=user if user else None
-            )
-            
-            logger.info(f"✅ Apoio registrado com sucesso!")
-            logger.info(f"   Total de apoios: {denuncia_proxima.apoios.count()}")
-            
-            return denuncia_proxima, False, True
-
-        # Não encontrou denúncia similar - criar nova
-        logger.info(f"✅ Nenhuma denúncia similar encontrada em {SEARCH_RADIUS_METERS}m")
-        logger.info(f"   Criando nova denúncia...")
-        
-        denuncia_data = {
-            'autor': user if user else None,
-            'autor_convidado': autor_convidado if not user else None,
-            **validated_data
-        }
-        nova_denuncia = Denuncia.objects.create(**denuncia_data)
+                apoiador=user
+            ).exists()
+        else:
+            # Convidado - não verificar duplicata (pode apoiar múltiplas vezes)
+            # Isso permite que diferentes convidados apoiem, mesmo que usem o mesmo nome
+            apoio_existente = False
+
+        if apoio_existente:
+            logger.info(f"⚠️  Usuário {user.username} já apoiou esta denúncia")
+            return denuncia_proxima, False, False
+
+        # Criar apoio
+        # O contador total_apoios é incrementado pelo signal de ApoioDenuncia
+        ApoioDenuncia.objects.create(
+            denuncia=denuncia_proxima,
+            apoiador=user if user else None
+        )
+        denuncia_proxima.refresh_from_db(fields=['total_apoios'])
         
-        logger.info(f"✅ Nova denúncia criada (ID #{nova_denuncia.id})")
+        logger.info(f"✅ Apoio registrado com sucesso!")
+        logger.info(f"   Total de apoios: {denuncia_proxima.total_apoios}")
         
-        return nova_denuncia, True, False
+        return denuncia_proxima, False, True
+
+    # Não encontrou denúncia similar - criar nova
+    logger.info(f"✅ Nenhuma denúncia similar encontrada em {SEARCH_RADIUS_METERS}m")
+    logger.info(f"   Criando nova denúncia...")
+    
+    denuncia_data = {
+        'autor': user if user else None,
+        'autor_convidado': autor_convidado if not user else None,
+        **validated_data
+    }
+    nova_denuncia = Denuncia.objects.create(**denuncia_data)
+    
+    logger.info(f"✅ Nova denúncia criada (ID #{nova_denuncia.id})")
+    
+    return nova_denuncia, True, False
+
+
+def reconciliar_total_apoios(dry_run=False):
+    """
+    Corrige o contador total_apoios das denúncias cujo valor diverge da
+    contagem real de ApoioDenuncia. Retorna a quantidade de denúncias corrigidas.
+    """
+    divergentes = list(
+        Denuncia.objects
+        .annotate(contagem_real=Count('apoios'))
+        .exclude(total_apoios=F('contagem_real'))
+        .values_list('id', flat=True)
+    )
+    if divergentes and not dry_run:
+        contagem = (
+            ApoioDenuncia.objects.filter(denuncia=OuterRef('pk'))
+            .values('denuncia')
+            .annotate(total=Count('id'))
+            .values('total')
+        )
+        Denuncia.objects.filter(pk__in=divergentes).update(total_apoios=Coalesce(Subquery(contagem), 0))
+    return len(divergentes)
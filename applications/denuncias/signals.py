@@ -0,0 +1,132 @@
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_init, pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from applications.core.cache import invalidar_ao_alterar
+from . import fotos, mapa, tiles
+from .models import Categoria, Denuncia, ApoioDenuncia
+
+CAMPOS_FOTO = ('foto', 'foto_media', 'foto_miniatura')
+
+invalidar_ao_alterar('categorias', Categoria)
+# Os clusters do mapa são recalculados na próxima consulta depois do commit
+invalidar_ao_alterar(mapa.GRUPO_CACHE, Denuncia, ApoioDenuncia)
+
+
+@receiver(post_save, sender=ApoioDenuncia)
+def incrementar_total_apoios(sender, instance, created, **kwargs):
+    """Incrementa o contador da denúncia quando um apoio é criado."""
+    if created:
+        Denuncia.objects.filter(pk=instance.denuncia_id).update(total_apoios=F('total_apoios') + 1)
+        _invalidar_tiles_da_denuncia(instance.denuncia_id)
+
+
+@receiver(post_delete, sender=ApoioDenuncia)
+def decrementar_total_apoios(sender, instance, **kwargs):
+    """Decrementa o contador da denúncia quando um apoio é removido (inclusive em cascata)."""
+    Denuncia.objects.filter(pk=instance.denuncia_id, total_apoios__gt=0).update(total_apoios=F('total_apoios') - 1)
+    _invalidar_tiles_da_denuncia(instance.denuncia_id)
+
+
+def _estado_tile(denuncia):
+    # Lê do __dict__ para não disparar consultas de campos adiados (.only/.defer)
+    return tuple(denuncia.__dict__.get(campo) for campo in ('latitude', 'longitude', 'status'))
+
+
+def _invalidar_tiles(*pontos):
+    def invalidar():
+        for latitude, longitude in set(pontos):
+            tiles.invalidar_ponto(latitude, longitude)
+    # Só depois do commit, senão um tile gerado entre a invalidação e o commit voltaria ao cache com os dados antigos
+    transaction.on_commit(invalidar)
+
+
+def _invalidar_tiles_da_denuncia(denuncia_id):
+    ponto = Denuncia.objects.filter(pk=denuncia_id).values_list('latitude', 'longitude').first()
+    if ponto is not None:
+        _invalidar_tiles(ponto)
+
+
+@receiver(post_init, sender=Denuncia)
+def guardar_estado_tile(sender, instance, **kwargs):
+    instance._estado_tile = _estado_tile(instance)
+
+
+@receiver(post_save, sender=Denuncia)
+def invalidar_tiles_denuncia_salva(sender, instance, created, **kwargs):
+    """Apaga os tiles em cache quando a denúncia é criada, muda de lugar ou de status."""
+    anterior, atual = instance._estado_tile, _estado_tile(instance)
+    if created or anterior != atual:
+        _invalidar_tiles(anterior[:2], atual[:2])
+    instance._estado_tile = atual
+
+
+@receiver(post_delete, sender=Denuncia)
+def invalidar_tiles_denuncia_removida(sender, instance, **kwargs):
+    _invalidar_tiles(_estado_tile(instance)[:2])
+
+
+def _nome_foto(denuncia):
+    # Lê do __dict__ para não disparar consultas de campos adiados (.only/.defer)
+    valor = denuncia.__dict__.get('foto')
+    return getattr(valor, 'name', valor) or ''
+
+
+def _liberar_fotos(nomes):
+    """Libera as referências das fotos no armazenamento depois do commit (ver armazenamento.py)."""
+    nomes = [nome for nome in nomes if nome]
+    if not nomes:
+        return
+    storage = Denuncia._meta.get_field('foto').storage
+
+    def liberar():
+        for nome in nomes:
+            storage.delete(nome)
+    # Se a transação for desfeita, a denúncia continua apontando para os arquivos
+    transaction.on_commit(liberar)
+
+
+@receiver(post_init, sender=Denuncia)
+def guardar_foto_salva(sender, instance, **kwargs):
+    instance._foto_salva = _nome_foto(instance)
+
+
+@receiver(pre_save, sender=Denuncia)
+def detectar_foto_enviada(sender, instance, update_fields=None, raw=False, **kwargs):
+    # Arquivo ainda não gravado no storage = foto recém-enviada neste save()
+    instance._foto_enviada = bool(instance.foto) and not instance.foto._committed
+
+    instance._foto_substituida = ''
+    if raw or instance._state.adding or (update_fields is not None and 'foto' not in update_fields):
+        return
+    if instance._foto_enviada or _nome_foto(instance) != instance._foto_salva:
+        # O nome guardado pode estar desatualizado (fotos.py troca a foto com update())
+        anterior = Denuncia.objects.filter(pk=instance.pk).values_list('foto', flat=True).first()
+        if anterior and anterior != _nome_foto(instance):
+            instance._foto_substituida = anterior
+
+
+@receiver(post_save, sender=Denuncia)
+def liberar_foto_substituida(sender, instance, **kwargs):
+    """Libera a referência da foto anterior quando a foto da denúncia é trocada."""
+    _liberar_fotos([getattr(instance, '_foto_substituida', '')])
+    instance._foto_substituida = ''
+    instance._foto_salva = _nome_foto(instance)
+
+
+@receiver(post_delete, sender=Denuncia)
+def liberar_fotos_denuncia_removida(sender, instance, **kwargs):
+    """Libera as referências da foto e das variantes da denúncia apagada."""
+    # Uma referência por campo, mesmo que dois campos apontem para o mesmo arquivo
+    _liberar_fotos([getattr(instance, campo).name for campo in CAMPOS_FOTO if campo in instance.__dict__])
+
+
+@receiver(post_save, sender=Denuncia)
+def processar_foto_enviada(sender, instance, **kwargs):
+    """Gera a foto principal e as miniaturas em segundo plano (ver fotos.py)."""
+    if getattr(instance, '_foto_enviada', False):
+        if instance.foto_processada:
+            Denuncia.objects.filter(pk=instance.pk).update(foto_processada=False)
+            instance.foto_processada = False
+        fotos.agendar_processamento(instance.pk)
@@ -1,9 +1,30 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import tracemalloc
+from decimal import Decimal
+from io import StringIO
+from unittest import mock, skipUnless
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
+from applications.core import cache as cache_compartilhado
 from applications.core.models import User
-from .models import Denuncia, Categoria, Comentario
+from .models import Denuncia, Categoria, Comentario, ApoioDenuncia, ReferenciaArquivo, TravaAgrupamento, UploadParcial
+from . import distancias, fotos, mapa, tiles, travas, variantes
+from .armazenamento import armazenamento_fotos
+from .geo import celula_para
+from .services import buscar_candidatas, criar_ou_apoiar_denuncia
+from .travas import TravaOcupada, chaves_trava, trava_agrupamento
+from .uploads import UploadJaConsumido
 from applications.localidades.models import Estado, Cidade
+from django.core.files.storage import FileSystemStorage
 from django.core.files.uploadedfile import SimpleUploadedFile
 from io import BytesIO
 from PIL import Image
@@ -91,6 +112,25 @@ class ComentarioAPITests(APITestCase):
         )
         self.client.login(username='testuser', password='password123')
 
+    def test_listagem_em_ordem_cronologica(self):
+        for i in range(5):
+            Comentario.objects.create(denuncia=self.denuncia, autor=self.user, texto=f'Comentário {i}')
+        # Empates na data de criação são desempatados pelo id
+        Comentario.objects.filter(texto__in=['Comentário 1', 'Comentário 2']).update(
+            data_criacao=Comentario.objects.get(texto='Comentário 1').data_criacao
+        )
+        esperado = list(Comentario.objects.order_by('data_criacao', 'id').values_list('id', flat=True))
+
+        ids, url = [], reverse('comentario-list') + f'?denuncia_id={self.denuncia.id}&page_size=2'
+        while url:
+            response = self.client.get(url)
+            ids += [item['id'] for item in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(ids, esperado)
+
+        response = self.client.get(response.data['previous'])
+        self.assertEqual([item['id'] for item in response.data['results']], esperado[2:4])
+
     def test_create_comentario_as_guest(self):
         self.client.logout()
         url = reverse('comentario-list')
@@ -117,4 +157,847 @@ class ComentarioAPITests(APITestCase):
         self.assertEqual(Comentario.objects.count(), 1)
         comentario = Comentario.objects.get()
         self.assertEqual(comentario.autor, self.user)
-        self.assertIsNone(comentario.autor_convidado)
\ No newline at end of file
+        self.assertIsNone(comentario.autor_convidado)
+
+class AgrupamentoDenunciaTests(TestCase):
+    """
+    Testes do agrupamento de denúncias próximas (criar_ou_apoiar_denuncia).
+    """
+    def setUp(self):
+        self.estado = Estado.objects.create(nome='Test Estado', uf='TE')
+        self.cidade = Cidade.objects.create(nome='Test Cidade', estado=self.estado)
+        self.categoria = Categoria.objects.create(nome='Test Categoria')
+        self.autor = User.objects.create_user(username='autor', email='autor@example.com', password='password123', first_name='Autor')
+        self.apoiador = User.objects.create_user(username='apoiador', email='apoiador@example.com', password='password123', first_name='Apoiador')
+
+    def dados_denuncia(self, latitude, longitude):
+        return {
+            'titulo': 'Buraco',
+            'descricao': 'Buraco na via.',
+            'categoria': self.categoria,
+            'cidade': self.cidade,
+            'estado': self.estado,
+            'latitude': Decimal(latitude),
+            'longitude': Decimal(longitude),
+            'jurisdicao': 'MUNICIPAL',
+            'foto': 'denuncias_fotos/test.png',
+        }
+
+    def test_celula_preenchida_ao_salvar(self):
+        denuncia, _, _ = criar_ou_apoiar_denuncia(self.dados_denuncia('-23.550520', '-46.633308'), user=self.autor)
+        self.assertEqual(denuncia.celula, celula_para(denuncia.latitude, denuncia.longitude))
+
+        denuncia.latitude = Decimal('-23.560520')
+        denuncia.save(update_fields=['latitude'])
+        denuncia.refresh_from_db()
+        self.assertEqual(denuncia.celula, celula_para(Decimal('-23.560520'), denuncia.longitude))
+
+    def test_agrupa_entre_celulas_vizinhas(self):
+        # Os dois pontos estão a ~49m, mas em lados opostos de uma borda da grade
+        original, _, _ = criar_ou_apoiar_denuncia(self.dados_denuncia('-23.54978', '-46.633308'), user=self.autor)
+        denuncia, created_denuncia, created_apoio = criar_ou_apoiar_denuncia(
+            self.dados_denuncia('-23.55022', '-46.633308'), user=self.apoiador
+        )
+        self.assertNotEqual(original.celula, celula_para(Decimal('-23.55022'), Decimal('-46.633308')))
+        self.assertEqual(denuncia, original)
+        self.assertFalse(created_denuncia)
+        self.assertTrue(created_apoio)
+
+    def test_nao_agrupa_fora_do_raio(self):
+        criar_ou_apoiar_denuncia(self.dados_denuncia('-26.3045', '-48.8487'), user=self.autor)
+        _, created_denuncia, _ = criar_ou_apoiar_denuncia(self.dados_denuncia('-26.3063', '-48.8487'), user=self.apoiador)
+        self.assertTrue(created_denuncia)
+        self.assertEqual(Denuncia.objects.count(), 2)
+
+
+class DistanciasTests(SimpleTestCase):
+    """
+    Testes do cálculo de distâncias em lote (com e sem NumPy).
+    """
+    LAT, LON = Decimal('-26.3045'), Decimal('-48.8487')
+    LATITUDES = ['-26.3045', '-26.30495', '-26.3063', '-26.3040', '-25.0']
+    LONGITUDES = ['-48.8487', '-48.8487', '-48.8487', '-48.8496', '-48.0']
+
+    def verificar_motor(self):
+        lats = distancias.vetor_coordenadas(self.LATITUDES)
+        lons = distancias.vetor_coordenadas(self.LONGITUDES)
+        esperadas = [
+            distancias.haversine_distance(self.LAT, self.LON, lat, lon)
+            for lat, lon in zip(self.LATITUDES, self.LONGITUDES)
+        ]
+
+        for calculada, esperada in zip(distancias.distancias_haversine(self.LAT, self.LON, lats, lons), esperadas):
+            self.assertAlmostEqual(calculada, esperada, places=6)
+
+        indices, dists = distancias.indices_dentro_do_raio(self.LAT, self.LON, lats, lons, 100)
+        self.assertEqual(indices, [k for k, d in enumerate(esperadas) if d <= 100])
+        self.assertEqual(len(dists), len(indices))
+
+    def test_motor_padrao(self):
+        self.verificar_motor()
+
+    def test_motor_python_puro(self):
+        with mock.patch.object(distancias, 'np', None):
+            self.verificar_motor()
+
+
+class BuscaCandidatasTests(TestCase):
+    """
+    Garante que a busca de candidatas ao agrupamento usa o índice composto.
+    """
+    def setUp(self):
+        self.categoria = Categoria.objects.create(nome='Test Categoria')
+
+    @skipUnless(connection.vendor == 'sqlite', 'Formato do plano de consulta específico do SQLite')
+    def test_plano_usa_indice_composto(self):
+        queryset = buscar_candidatas(self.categoria, Decimal('-26.3045'), Decimal('-48.8487'))
+        plano = queryset.order_by('-data_criacao').values_list('id', 'latitude', 'longitude').explain()
+        self.assertRegex(plano, r'denuncia_cat_status_(celula|latlon)_idx')
+        self.assertNotIn('SCAN denuncias_denuncia', plano)
+
+
+class AgrupamentoConcorrenteTests(TransactionTestCase):
+    """
+    Submissões simultâneas no mesmo local não podem criar denúncias duplicadas.
+    """
+    THREADS = 8
+    LOCAIS = [('-26.30450', '-48.84870'), ('-23.55052', '-46.63330')]
+
+    def setUp(self):
+        self.estado = Estado.objects.create(nome='Test Estado', uf='TE')
+        self.cidade = Cidade.objects.create(nome='Test Cidade', estado=self.estado)
+        self.categoria = Categoria.objects.create(nome='Test Categoria')
+        self.usuarios = [
+            User.objects.create_user(username=f'user{i}', email=f'user{i}@example.com', password='password123', first_name='User')
+            for i in range(self.THREADS)
+        ]
+
+    def submeter(self, usuario, barreira, erros):
+        try:
+            barreira.wait()
+            for k, (latitude, longitude) in enumerate(self.LOCAIS):
+                # Pontos a poucos metros uns dos outros
+                deslocamento = Decimal(k + self.usuarios.index(usuario)) / Decimal('100000')
+                criar_ou_apoiar_denuncia({
+                    'titulo': 'Buraco',
+                    'descricao': 'Buraco na via.',
+                    'categoria': self.categoria,
+                    'cidade': self.cidade,
+                    'estado': self.estado,
+                    'latitude': Decimal(latitude) + deslocamento,
+                    'longitude': Decimal(longitude),
+                    'jurisdicao': 'MUNICIPAL',
+                    'foto': 'denuncias_fotos/test.png',
+                }, user=usuario)
+        except Exception as e:  # pragma: no cover - reportado no assert abaixo
+            erros.append(e)
+        finally:
+            connection.close()
+
+    def test_sem_duplicatas(self):
+        barreira = threading.Barrier(self.THREADS)
+        erros = []
+        threads = [
+            threading.Thread(target=self.submeter, args=(usuario, barreira, erros))
+            for usuario in self.usuarios
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(erros, [])
+        self.assertEqual(Denuncia.objects.count(), len(self.LOCAIS))
+        self.assertEqual(ApoioDenuncia.objects.count(), len(self.LOCAIS) * (self.THREADS - 1))
+        self.assertFalse(TravaAgrupamento.objects.exists())
+
+    def test_reivindicacao_exclusiva_por_celula(self):
+        perto = chaves_trava(self.categoria, Decimal('-26.30450'), Decimal('-48.84870'), 100)
+        ao_lado = chaves_trava(self.categoria, Decimal('-26.30480'), Decimal('-48.84870'), 100)
+        longe = chaves_trava(self.categoria, Decimal('-23.55052'), Decimal('-46.63330'), 100)
+
+        token = travas._reivindicar(perto)
+        with mock.patch.object(travas, 'TEMPO_ESPERA_SEGUNDOS', 0.05):
+            # Um ponto a ~33m compartilha células e precisa esperar
+            with self.assertRaises(TravaOcupada):
+                travas._reivindicar(ao_lado)
+            # Um ponto distante não é bloqueado
+            travas._liberar(longe, travas._reivindicar(longe))
+
+        travas._liberar(perto, token)
+        travas._liberar(ao_lado, travas._reivindicar(ao_lado))
+        self.assertFalse(TravaAgrupamento.objects.exists())
+
+    def test_begin_immediate_so_no_agrupamento(self):
+        with CaptureQueriesContext(connection) as consultas:
+            with trava_agrupamento(self.categoria, Decimal('-26.30450'), Decimal('-48.84870'), 100):
+                Denuncia.objects.exists()
+            with transaction.atomic():
+                Denuncia.objects.exists()
+        inicios = [consulta['sql'] for consulta in consultas if consulta['sql'].startswith('BEGIN')]
+        self.assertEqual(inicios.count('BEGIN IMMEDIATE'), 1)
+        self.assertEqual(inicios[-1], 'BEGIN')
+
+    def test_linhas_apagadas_no_caminho_select_for_update(self):
+        # O SQLite não aceita FOR UPDATE; aqui só importa o ciclo de vida das linhas
+        with mock.patch.object(connection.features, 'has_select_for_update', True), \
+                mock.patch('django.db.models.query.QuerySet.select_for_update', lambda queryset: queryset):
+            with trava_agrupamento(self.categoria, Decimal('-26.30450'), Decimal('-48.84870'), 100):
+                self.assertTrue(TravaAgrupamento.objects.exists())
+        self.assertFalse(TravaAgrupamento.objects.exists())
+
+
+class TotalApoiosTests(APITestCase):
+    """
+    Testes do contador denormalizado total_apoios.
+    """
+    def setUp(self):
+        self.estado = Estado.objects.create(nome='Test Estado', uf='TE')
+        self.cidade = Cidade.objects.create(nome='Test Cidade', estado=self.estado)
+        self.categoria = Categoria.objects.create(nome='Test Categoria')
+        self.autor = User.objects.create_user(username='autor', email='autor@example.com', password='password123', first_name='Autor')
+        self.apoiador = User.objects.create_user(username='apoiador', email='apoiador@example.com', password='password123', first_name='Apoiador')
+        self.dados = {
+            'titulo': 'Buraco',
+            'descricao': 'Buraco na via.',
+            'categoria': self.categoria,
+            'cidade': self.cidade,
+            'estado': self.estado,
+            'latitude': Decimal('-26.3045'),
+            'longitude': Decimal('-48.8487'),
+            'jurisdicao': 'MUNICIPAL',
+            'foto': 'denuncias_fotos/test.png',
+        }
+        self.denuncia, _, _ = criar_ou_apoiar_denuncia(dict(self.dados), user=self.autor)
+
+    def test_apoio_pelo_agrupamento_incrementa(self):
+        denuncia, _, created_apoio = criar_ou_apoiar_denuncia(dict(self.dados), user=self.apoiador)
+        self.assertTrue(created_apoio)
+        self.assertEqual(denuncia.total_apoios, 1)
+
+    def test_apoio_pela_api_incrementa_e_decrementa(self):
+        self.client.force_authenticate(self.apoiador)
+        response = self.client.post(reverse('apoio-list'), {'denuncia': self.denuncia.id}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.denuncia.refresh_from_db()
+        self.assertEqual(self.denuncia.total_apoios, 1)
+
+        response = self.client.delete(reverse('apoio-detail', args=[response.data['id']]))
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.denuncia.refresh_from_db()
+        self.assertEqual(self.denuncia.total_apoios, 0)
+
+    def test_reconciliacao_corrige_divergencia(self):
+        ApoioDenuncia.objects.create(denuncia=self.denuncia, apoiador=self.apoiador)
+        Denuncia.objects.filter(pk=self.denuncia.pk).update(total_apoios=7)
+
+        call_command('reconciliar_apoios', stdout=StringIO())
+
+        self.denuncia.refresh_from_db()
+        self.assertEqual(self.denuncia.total_apoios, 1)
+
+
+class PaginacaoDenunciasTests(APITestCase):
+    """
+    Testes da paginação por cursor da listagem de denúncias.
+    """
+    def setUp(self):
+        estado = Estado.objects.create(nome='Test Estado', uf='TE')
+        cidade = Cidade.objects.create(nome='Test Cidade', estado=estado)
+        categoria = Categoria.objects.create(nome='Test Categoria')
+        for i in range(7):
+            Denuncia.objects.create(
+                titulo=f'Denúncia {i}', descricao='Descrição.', autor_convidado='Convidado',
+                categoria=categoria, cidade=cidade, estado=estado,
+                latitude=-23.55 - i, longitude=-46.63, jurisdicao='MUNICIPAL', foto='denuncias_fotos/test.png',
+            )
+        # Empates na data de criação são desempatados pelo id
+        Denuncia.objects.filter(titulo__in=['Denúncia 2', 'Denúncia 3', 'Denúncia 4']).update(
+            data_criacao=Denuncia.objects.get(titulo='Denúncia 2').data_criacao
+        )
+        self.esperado = list(Denuncia.objects.order_by('-data_criacao', 'id').values_list('id', flat=True))
+
+    def percorrer(self, url, link):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertLessEqual(len(response.data['results']), 2)
+            ids.append([item['id'] for item in response.data['results']])
+            url = response.data[link]
+        return ids
+
+    def test_percorre_todas_as_paginas_nos_dois_sentidos(self):
+        paginas = self.percorrer(reverse('denuncia-list') + '?page_size=2', 'next')
+        self.assertEqual([pk for pagina in paginas for pk in pagina], self.esperado)
+
+        response = self.client.get(reverse('denuncia-list') + '?page_size=2')
+        while response.data['next']:
+            response = self.client.get(response.data['next'])
+        anteriores = self.percorrer(response.data['previous'], 'previous')
+        self.assertEqual(list(reversed(anteriores)), paginas[:-1])
+
+    def test_cursor_invalido(self):
+        response = self.client.get(reverse('denuncia-list') + '?cursor=invalido')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class ListagemEnxutaTests(APITestCase):
+    """
+    A listagem de denúncias usa um número fixo de consultas e não carrega comentários.
+    """
+    TOTAL = 100
+    LIMITE_MEMORIA_BYTES = 2 * 1024 * 1024
+
+    @classmethod
+    def setUpTestData(cls):
+        estado = Estado.objects.create(nome='Test Estado', uf='TE')
+        cidade = Cidade.objects.create(nome='Test Cidade', estado=estado)
+        categoria = Categoria.objects.create(nome='Test Categoria')
+        autor = User.objects.create_user(username='autor', email='autor@example.com', password='password123', first_name='Autor')
+        denuncias = Denuncia.objects.bulk_create([
+            Denuncia(
+                titulo=f'Denúncia {i}', descricao='Descrição.', autor=autor,
+                categoria=categoria, cidade=cidade, estado=estado,
+                latitude=-23.55, longitude=-46.63, jurisdicao='MUNICIPAL', foto='denuncias_fotos/test.png',
+            )
+            for i in range(cls.TOTAL)
+        ])
+        # ~4MB de comentários que a listagem não deve ler
+        Comentario.objects.bulk_create([
+            Comentario(denuncia=denuncia, autor=autor, texto='x' * 2000)
+            for denuncia in denuncias for _ in range(20)
+        ])
+
+    def test_consultas_e_memoria_por_pagina(self):
+        url = reverse('denuncia-list') + f'?page_size={self.TOTAL}'
+        tracemalloc.start()
+        try:
+            with self.assertNumQueries(1):
+                response = self.client.get(url)
+            _, pico = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), self.TOTAL)
+        self.assertEqual(response.data['results'][0]['autor']['username'], 'autor')
+        self.assertLess(pico, self.LIMITE_MEMORIA_BYTES)
+
+    def test_detalhe_uma_consulta(self):
+        denuncia = Denuncia.objects.first()
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('denuncia-detail', args=[denuncia.id]))
+        self.assertEqual(response.data['total_apoios'], 0)
+
+
+class MapaDenunciasTests(APITestCase):
+    """
+    Testes do endpoint de clusters do mapa.
+    """
+    def setUp(self):
+        # Índices em memória de outros testes
+        mapa._indices.clear()
+        estado = Estado.objects.create(nome='Test Estado', uf='TE')
+        cidade = Cidade.objects.create(nome='Test Cidade', estado=estado)
+        self.buraco = Categoria.objects.create(nome='Buraco')
+        self.lixo = Categoria.objects.create(nome='Lixo')
+
+        def criar(categoria, latitude, longitude, total_apoios=0):
+            return Denuncia.objects.create(
+                titulo='Denúncia', descricao='Descrição.', autor_convidado='Convidado',
+                categoria=categoria, cidade=cidade, estado=estado, total_apoios=total_apoios,
+                latitude=latitude, longitude=longitude, jurisdicao='MUNICIPAL', foto='denuncias_fotos/test.png',
+            )
+
+        # Três denúncias a poucos metros em Joinville e uma em São Paulo
+        criar(self.buraco, Decimal('-26.3045'), Decimal('-48.8487'), total_apoios=2)
+        criar(self.buraco, Decimal('-26.3046'), Decimal('-48.8488'), total_apoios=1)
+        criar(self.lixo, Decimal('-26.3047'), Decimal('-48.8486'))
+        criar(self.lixo, Decimal('-23.5505'), Decimal('-46.6333'))
+        self.url = reverse('denuncia-mapa')
+
+    def test_clusters_em_zoom_baixo(self):
+        response = self.client.get(self.url, {'bbox': '-50,-27,-46,-23', 'zoom': 5})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['pontos'], [])
+
+        clusters = sorted(response.data['clusters'], key=lambda cluster: cluster['total'])
+        self.assertEqual([cluster['total'] for cluster in clusters], [1, 3])
+        joinville = clusters[1]
+        self.assertEqual(joinville['categoria_dominante'], self.buraco.id)
+        self.assertEqual(joinville['total_apoios'], 3)
+        self.assertAlmostEqual(joinville['latitude'], -26.3046, places=4)
+
+    def test_caixa_e_filtros(self):
+        response = self.client.get(self.url, {'bbox': '-49,-27,-48,-26', 'zoom': 5})
+        self.assertEqual([cluster['total'] for cluster in response.data['clusters']], [3])
+
+        response = self.client.get(self.url, {'bbox': '-50,-27,-46,-23', 'zoom': 5, 'categoria': self.lixo.id})
+        self.assertEqual(sorted(cluster['total'] for cluster in response.data['clusters']), [1, 1])
+
+    def test_pontos_em_zoom_alto(self):
+        response = self.client.get(self.url, {'bbox': '-48.85,-26.31,-48.84,-26.30', 'zoom': mapa.ZOOM_PONTOS})
+        self.assertEqual(response.data['clusters'], [])
+        self.assertEqual(len(response.data['pontos']), 3)
+
+    @mock.patch.object(mapa, 'INTERVALO_MINIMO_RECONSTRUCAO', 0)
+    def test_indice_atualizado_apos_nova_denuncia(self):
+        parametros = {'bbox': '-50,-27,-46,-23', 'zoom': 0}
+        self.assertEqual(self.client.get(self.url, parametros).data['clusters'][0]['total'], 4)
+        with self.captureOnCommitCallbacks(execute=True):
+            Denuncia.objects.filter(categoria=self.lixo).first().delete()
+        self.assertEqual(self.client.get(self.url, parametros).data['clusters'][0]['total'], 3)
+
+    def test_invalidado_so_depois_do_commit(self):
+        versao = cache_compartilhado.versao(mapa.GRUPO_CACHE)
+        with self.captureOnCommitCallbacks() as callbacks:
+            Denuncia.objects.filter(categoria=self.lixo).first().delete()
+            # Antes do commit outra consulta reconstruiria o índice com dados ainda não confirmados
+            self.assertEqual(cache_compartilhado.versao(mapa.GRUPO_CACHE), versao)
+        for callback in callbacks:
+            callback()
+        self.assertNotEqual(cache_compartilhado.versao(mapa.GRUPO_CACHE), versao)
+
+    def test_reconstrucoes_espacadas(self):
+        parametros = {'bbox': '-50,-27,-46,-23', 'zoom': 0}
+        self.client.get(self.url, parametros)
+        with self.captureOnCommitCallbacks(execute=True):
+            Denuncia.objects.filter(categoria=self.lixo).first().delete()
+        # Reconstruído há menos de INTERVALO_MINIMO_RECONSTRUCAO: ainda serve o índice anterior
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(self.url, parametros).data['clusters'][0]['total'], 4)
+
+    def test_parametros_invalidos(self):
+        for parametros in [
+            {'zoom': 5}, {'bbox': '1,2,3', 'zoom': 5}, {'bbox': '-50,-27,-46,-23', 'zoom': 'x'},
+            {'bbox': 'nan,-27,-46,-23', 'zoom': 5}, {'bbox': '-50,-inf,-46,-23', 'zoom': 5},
+        ]:
+            response = self.client.get(self.url, parametros)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class TilesDenunciasTests(APITestCase):
+    """
+    Testes dos tiles binários do mapa e do seu cache em disco.
+    """
+    ZOOM = 14
+
+    def setUp(self):
+        self.diretorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.diretorio)
+        configuracao = override_settings(TILES_CACHE_DIR=self.diretorio)
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+
+        estado = Estado.objects.create(nome='Test Estado', uf='TE')
+        cidade = Cidade.objects.create(nome='Test Cidade', estado=estado)
+        self.categoria = Categoria.objects.create(nome='Buraco')
+        self.denuncia = Denuncia.objects.create(
+            titulo='Denúncia', descricao='Descrição.', autor_convidado='Convidado',
+            categoria=self.categoria, cidade=cidade, estado=estado, total_apoios=3,
+            latitude=Decimal('-26.30450000'), longitude=Decimal('-48.84870000'),
+            jurisdicao='MUNICIPAL', foto='denuncias_fotos/test.png',
+        )
+        self.x, self.y = tiles.tile_para(self.denuncia.latitude, self.denuncia.longitude, self.ZOOM)
+        self.url = reverse('denuncia-tile', args=[self.ZOOM, self.x, self.y])
+
+    def decodificar(self, response):
+        return tiles.decodificar_tile(self.ZOOM, self.x, self.y, response.content)
+
+    def test_tile_com_a_denuncia(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.content), tiles.CABECALHO.size + tiles.REGISTRO.size)
+
+        [ponto] = self.decodificar(response)
+        self.assertEqual(ponto['id'], self.denuncia.id)
+        self.assertEqual(ponto['categoria'], self.categoria.id)
+        self.assertEqual(ponto['status'], 'ABERTA')
+        self.assertEqual(ponto['total_apoios'], 3)
+        # Quantização no zoom 14: ~2cm
+        self.assertAlmostEqual(ponto['latitude'], -26.3045, places=6)
+        self.assertAlmostEqual(ponto['longitude'], -48.8487, places=6)
+
+        vizinho = self.client.get(reverse('denuncia-tile', args=[self.ZOOM, self.x + 1, self.y]))
+        self.assertEqual(len(vizinho.content), tiles.CABECALHO.size)
+
+    def test_cache_e_invalidacao_por_status(self):
+        self.client.get(self.url)
+        caminho = tiles.caminho_cache(self.ZOOM, self.x, self.y)
+        self.assertTrue(caminho.exists())
+
+        # Servido do cache, sem consultar o banco
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.denuncia.status = Denuncia.Status.RESOLVIDA
+            self.denuncia.save()
+        self.assertFalse(caminho.exists())
+        self.assertEqual(self.decodificar(self.client.get(self.url))[0]['status'], 'RESOLVIDA')
+
+    def test_tile_inexistente(self):
+        response = self.client.get(reverse('denuncia-tile', args=[2, 4, 0]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class ProcessamentoFotosTests(APITestCase):
+    """
+    Testes da geração da foto principal e das miniaturas.
+    """
+    def setUp(self):
+        self.diretorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.diretorio)
+        configuracao = override_settings(MEDIA_ROOT=self.diretorio)
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+
+        self.estado = Estado.objects.create(nome='Test Estado', uf='TE')
+        self.cidade = Cidade.objects.create(nome='Test Cidade', estado=self.estado)
+        self.categoria = Categoria.objects.create(nome='Test Categoria')
+        self.user = User.objects.create_user(username='testuser', email='test@example.com', password='password123', first_name='Test')
+
+    def foto_de_celular(self):
+        """JPEG 4000x3000 com orientação EXIF de 90 graus."""
+        imagem = Image.new('RGB', (4000, 3000), 'red')
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        arquivo = BytesIO()
+        imagem.save(arquivo, 'JPEG', exif=exif)
+        return SimpleUploadedFile('celular.jpg', arquivo.getvalue(), content_type='image/jpeg')
+
+    def test_variantes_limitadas_e_sem_exif(self):
+        variantes, dimensoes = fotos.processar_imagem(self.foto_de_celular())
+        # A rotação do EXIF é aplicada: a foto fica em pé
+        self.assertEqual(dimensoes, (1440, 1920))
+        for nome, conteudo in variantes.items():
+            with Image.open(BytesIO(conteudo)) as imagem:
+                self.assertEqual(imagem.format, 'WEBP')
+                self.assertLessEqual(max(imagem.size), fotos.LADO_MAXIMO[nome])
+                self.assertFalse(imagem.getexif())
+        self.assertLess(len(variantes['miniatura']), 5 * 1024)
+
+    def test_upload_processado_apos_o_commit(self):
+        self.client.force_authenticate(self.user)
+        dados = {
+            'titulo': 'Buraco', 'descricao': 'Buraco na via.',
+            'categoria': self.categoria.id, 'cidade': self.cidade.id, 'estado': self.estado.id,
+            'latitude': -23.550520, 'longitude': -46.633308, 'jurisdicao': 'MUNICIPAL',
+            'foto': self.foto_de_celular(),
+        }
+        with mock.patch.object(fotos._executor, 'submit', side_effect=lambda funcao, pk: fotos.processar_foto_denuncia(pk)):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(reverse('denuncia-list'), dados, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        response = self.client.get(reverse('denuncia-detail', args=[response.data['id']]))
+        self.assertTrue(response.data['foto'].endswith('.webp'))
+        self.assertTrue(response.data['foto_miniatura'].endswith('.webp'))
+        self.assertEqual((response.data['foto_largura'], response.data['foto_altura']), (1440, 1920))
+        # O original foi substituído pela versão processada
+        arquivos = [nome for _, _, nomes in os.walk(self.diretorio) for nome in nomes]
+        self.assertEqual(len(arquivos), 3)
+        self.assertTrue(all(nome.endswith('.webp') for nome in arquivos))
+
+
+class ArmazenamentoConteudoTests(TestCase):
+    """
+    Testes do armazenamento de fotos endereçado pelo conteúdo.
+    """
+    def setUp(self):
+        self.diretorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.diretorio)
+        configuracao = override_settings(MEDIA_ROOT=self.diretorio)
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+
+    def test_envios_identicos_compartilham_o_arquivo(self):
+        primeiro = armazenamento_fotos.save('denuncias_fotos/foto.png', create_dummy_image())
+        segundo = armazenamento_fotos.save('denuncias_fotos/outra.PNG', create_dummy_image())
+        self.assertEqual(primeiro, segundo)
+        self.assertRegex(primeiro, r'^denuncias_fotos/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.png$')
+        self.assertEqual(ReferenciaArquivo.objects.get(nome=primeiro).referencias, 2)
+
+        armazenamento_fotos.delete(primeiro)
+        self.assertTrue(armazenamento_fotos.exists(primeiro))
+        armazenamento_fotos.delete(primeiro)
+        self.assertFalse(armazenamento_fotos.exists(primeiro))
+        self.assertFalse(ReferenciaArquivo.objects.filter(nome=primeiro).exists())
+
+    def criar_denuncia(self, foto):
+        estado = Estado.objects.create(nome='Test Estado', uf='TE')
+        cidade = Cidade.objects.create(nome='Test Cidade', estado=estado)
+        categoria = Categoria.objects.create(nome='Test Categoria')
+        return Denuncia.objects.create(
+            titulo='Denúncia', descricao='Descrição.', autor_convidado='Convidado',
+            categoria=categoria, cidade=cidade, estado=estado,
+            latitude=-23.55, longitude=-46.63, jurisdicao='MUNICIPAL', foto=foto,
+        )
+
+    def test_apagar_denuncia_libera_as_fotos(self):
+        nome = armazenamento_fotos.save('denuncias_fotos/foto.png', create_dummy_image())
+        denuncia = self.criar_denuncia(nome)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            denuncia.delete()
+        self.assertFalse(ReferenciaArquivo.objects.filter(nome=nome).exists())
+        self.assertFalse(armazenamento_fotos.exists(nome))
+
+    def test_trocar_foto_libera_a_anterior(self):
+        anterior = armazenamento_fotos.save('denuncias_fotos/foto.png', create_dummy_image())
+        denuncia = self.criar_denuncia(anterior)
+        arquivo = BytesIO()
+        Image.new('RGB', (2, 2), 'white').save(arquivo, 'png')
+
+        with self.captureOnCommitCallbacks(execute=True), mock.patch.object(fotos, 'agendar_processamento'):
+            denuncia.foto = SimpleUploadedFile('nova.png', arquivo.getvalue(), content_type='image/png')
+            denuncia.save()
+        self.assertFalse(armazenamento_fotos.exists(anterior))
+        self.assertTrue(armazenamento_fotos.exists(denuncia.foto.name))
+        self.assertEqual(ReferenciaArquivo.objects.get(nome=denuncia.foto.name).referencias, 1)
+
+        # Salvar sem trocar a foto não libera nada
+        with self.captureOnCommitCallbacks(execute=True):
+            denuncia.titulo = 'Outro título'
+            denuncia.save()
+        self.assertTrue(armazenamento_fotos.exists(denuncia.foto.name))
+
+    def test_arquivo_sem_referencia_nao_e_apagado(self):
+        # Arquivo anterior ao armazenamento por conteúdo, que outras denúncias ainda podem usar
+        os.makedirs(os.path.join(self.diretorio, 'denuncias_fotos'))
+        with open(os.path.join(self.diretorio, 'denuncias_fotos', 'antiga.png'), 'wb') as arquivo:
+            arquivo.write(create_dummy_image().read())
+        armazenamento_fotos.delete('denuncias_fotos/antiga.png')
+        self.assertTrue(armazenamento_fotos.exists('denuncias_fotos/antiga.png'))
+
+    def test_deduplicar_diretorio_existente(self):
+        estado = Estado.objects.create(nome='Test Estado', uf='TE')
+        cidade = Cidade.objects.create(nome='Test Cidade', estado=estado)
+        categoria = Categoria.objects.create(nome='Test Categoria')
+        conteudo = create_dummy_image().read()
+        os.makedirs(os.path.join(self.diretorio, 'denuncias_fotos'))
+        for nome in ['test.png', 'test_03ccqPO.png', 'test_1vhOdIH.png']:
+            with open(os.path.join(self.diretorio, 'denuncias_fotos', nome), 'wb') as arquivo:
+                arquivo.write(conteudo)
+            Denuncia.objects.create(
+                titulo='Denúncia', descricao='Descrição.', autor_convidado='Convidado',
+                categoria=categoria, cidade=cidade, estado=estado,
+                latitude=-23.55, longitude=-46.63, jurisdicao='MUNICIPAL', foto=f'denuncias_fotos/{nome}',
+            )
+
+        call_command('deduplicar_fotos', stdout=StringIO())
+
+        arquivos = [nome for _, _, nomes in os.walk(self.diretorio) for nome in nomes]
+        self.assertEqual(len(arquivos), 1)
+        [nome] = set(Denuncia.objects.values_list('foto', flat=True))
+        self.assertTrue(armazenamento_fotos.exists(nome))
+        self.assertEqual(ReferenciaArquivo.objects.get(nome=nome).referencias, 3)
+
+
+class VariantesFotoTests(APITestCase):
+    """
+    Testes das variantes de foto geradas sob demanda.
+    """
+    def setUp(self):
+        self.diretorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.diretorio)
+        configuracao = override_settings(
+            MEDIA_ROOT=os.path.join(self.diretorio, 'media'),
+            VARIANTES_CACHE_DIR=os.path.join(self.diretorio, 'variantes'),
+        )
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+
+        arquivo = BytesIO()
+        Image.new('RGB', (800, 600), 'blue').save(arquivo, 'JPEG')
+        self.conteudo = arquivo.getvalue()
+        self.nome_foto = armazenamento_fotos.save('denuncias_fotos/foto.jpg', SimpleUploadedFile('foto.jpg', self.conteudo))
+
+        estado = Estado.objects.create(nome='Test Estado', uf='TE')
+        cidade = Cidade.objects.create(nome='Test Cidade', estado=estado)
+        categoria = Categoria.objects.create(nome='Test Categoria')
+        self.denuncia = Denuncia.objects.create(
+            titulo='Denúncia', descricao='Descrição.', autor_convidado='Convidado',
+            categoria=categoria, cidade=cidade, estado=estado,
+            latitude=-23.55, longitude=-46.63, jurisdicao='MUNICIPAL', foto=self.nome_foto,
+        )
+        self.url = reverse('denuncia-foto', args=[self.denuncia.id])
+
+    def test_gera_no_primeiro_acesso_e_depois_serve_do_disco(self):
+        response = self.client.get(self.url, {'w': 320, 'fmt': 'webp'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'image/webp')
+        with Image.open(BytesIO(b''.join(response.streaming_content))) as imagem:
+            self.assertEqual(imagem.size, (320, 240))
+
+        with mock.patch.object(variantes, 'gerar_variante') as gerar:
+            response = self.client.get(self.url, {'w': 320, 'fmt': 'webp'})
+            b''.join(response.streaming_content)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        gerar.assert_not_called()
+
+        response = self.client.get(self.url, {'w': 321})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_sendfile(self):
+        with self.settings(MEDIA_SENDFILE='nginx'):
+            response = self.client.get(self.url, {'w': 320, 'fmt': 'webp'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'image/webp')
+        caminho = variantes.caminho_variante(self.nome_foto, 320, 'webp')
+        self.assertEqual(
+            response['X-Accel-Redirect'],
+            '/variantes-protegidas/' + caminho.relative_to(os.path.join(self.diretorio, 'variantes')).as_posix(),
+        )
+        self.assertEqual(response.content, b'')
+
+        with self.settings(MEDIA_SENDFILE='apache'):
+            response = self.client.get(self.url, {'w': 320, 'fmt': 'webp'})
+        self.assertEqual(response['X-Sendfile'], str(caminho))
+
+    def test_original_grande_demais(self):
+        with mock.patch.object(variantes, 'gerar_variante', side_effect=Image.DecompressionBombError('grande')):
+            response = self.client.get(self.url, {'w': 320, 'fmt': 'webp'})
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+    def test_pedidos_simultaneos_geram_uma_vez(self):
+        storage = FileSystemStorage(location=os.path.join(self.diretorio, 'media'))
+        original = variantes.gerar_variante
+        chamadas = []
+
+        def gerar_devagar(*args):
+            chamadas.append(1)
+            time.sleep(0.2)
+            return original(*args)
+
+        barreira = threading.Barrier(8)
+
+        def pedir():
+            barreira.wait()
+            variantes.obter_variante(storage, self.nome_foto, 640, 'jpeg')
+
+        with mock.patch.object(variantes, 'gerar_variante', side_effect=gerar_devagar):
+            threads = [threading.Thread(target=pedir) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(len(chamadas), 1)
+
+    def test_limpeza_remove_as_menos_usadas(self):
+        caminhos = []
+        for i, largura in enumerate(variantes.LARGURAS[:3]):
+            caminho = variantes.obter_variante(armazenamento_fotos, self.nome_foto, largura, 'webp')
+            os.utime(caminho, (1000 + i, 1000 + i))
+            caminhos.append(caminho)
+        tamanho = sum(caminho.stat().st_size for caminho in caminhos)
+
+        variantes.limpar_cache(tamanho - 1)
+        self.assertFalse(caminhos[0].exists())
+        self.assertTrue(caminhos[2].exists())
+
+
+class UploadRetomavelTests(APITestCase):
+    """
+    Testes do upload de fotos em pedaços.
+    """
+    def setUp(self):
+        self.diretorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.diretorio)
+        configuracao = override_settings(
+            MEDIA_ROOT=os.path.join(self.diretorio, 'media'),
+            UPLOADS_PARCIAIS_DIR=os.path.join(self.diretorio, 'parciais'),
+        )
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+
+        self.estado = Estado.objects.create(nome='Test Estado', uf='TE')
+        self.cidade = Cidade.objects.create(nome='Test Cidade', estado=self.estado)
+        self.categoria = Categoria.objects.create(nome='Test Categoria')
+        arquivo = BytesIO()
+        Image.new('RGB', (300, 200), 'green').save(arquivo, 'JPEG')
+        self.conteudo = arquivo.getvalue()
+
+    def enviar(self, upload_id, offset, pedaco):
+        return self.client.generic(
+            'PATCH', reverse('upload-detail', args=[upload_id]), pedaco,
+            content_type='application/offset+octet-stream', HTTP_UPLOAD_OFFSET=str(offset),
+        )
+
+    def dados_denuncia(self, **extra):
+        return {
+            'titulo': 'Buraco', 'descricao': 'Buraco na via.', 'autor_convidado': 'Convidado',
+            'categoria': self.categoria.id, 'cidade': self.cidade.id, 'estado': self.estado.id,
+            'latitude': -23.550520, 'longitude': -46.633308, 'jurisdicao': 'MUNICIPAL', **extra,
+        }
+
+    def test_upload_retomado_e_usado_na_denuncia(self):
+        response = self.client.post(reverse('upload-list'), {'nome_arquivo': 'foto.jpg', 'tamanho': len(self.conteudo)}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        upload_id = response.data['id']
+
+        metade = len(self.conteudo) // 2
+        self.assertEqual(self.enviar(upload_id, 0, self.conteudo[:metade]).data['offset'], metade)
+        # Pedaço repetido após uma queda: o servidor informa onde continuar
+        response = self.enviar(upload_id, 0, self.conteudo[:metade])
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.data['offset'], metade)
+        self.assertEqual(self.client.get(reverse('upload-detail', args=[upload_id])).data['offset'], metade)
+        self.enviar(upload_id, metade, self.conteudo[metade:])
+
+        response = self.client.post(reverse('upload-finalizar', args=[upload_id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.data['finalizado'])
+
+        with mock.patch('applications.denuncias.views.agendar_processamento') as agendar:
+            response = self.client.post(reverse('denuncia-list'), self.dados_denuncia(upload=upload_id), format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        agendar.assert_called_once_with(response.data['id'])
+        denuncia = Denuncia.objects.get(pk=response.data['id'])
+        self.assertEqual(denuncia.foto.read(), self.conteudo)
+
+        # Reenviar a mesma criação não cria outra denúncia nem refaz o agrupamento
+        response = self.client.post(reverse('denuncia-list'), self.dados_denuncia(upload=upload_id), format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['denuncia']['id'], denuncia.id)
+        self.assertEqual(Denuncia.objects.count(), 1)
+
+    def test_criacoes_simultaneas_com_o_mesmo_upload(self):
+        upload_id = self.client.post(
+            reverse('upload-list'), {'nome_arquivo': 'foto.jpg', 'tamanho': len(self.conteudo)}, format='json'
+        ).data['id']
+        self.enviar(upload_id, 0, self.conteudo)
+        self.client.post(reverse('upload-finalizar', args=[upload_id]))
+        # Lido antes de a outra requisição consumir o upload, como numa criação simultânea
+        upload = UploadParcial.objects.get(pk=upload_id)
+
+        with mock.patch('applications.denuncias.views.agendar_processamento'):
+            response = self.client.post(reverse('denuncia-list'), self.dados_denuncia(upload=upload_id), format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        dados = {
+            'titulo': 'Buraco', 'descricao': 'Buraco na via.', 'categoria': self.categoria,
+            'cidade': self.cidade, 'estado': self.estado, 'jurisdicao': 'MUNICIPAL', 'foto': upload.foto,
+            # Em outro local, para que o agrupamento criasse uma segunda denúncia
+            'latitude': Decimal('-26.3045'), 'longitude': Decimal('-48.8487'),
+        }
+        with self.assertRaises(UploadJaConsumido):
+            criar_ou_apoiar_denuncia(dados, autor_convidado='Convidado', upload=upload)
+        self.assertEqual(Denuncia.objects.count(), 1)
+        self.assertEqual(UploadParcial.objects.get(pk=upload_id).denuncia_id, response.data['id'])
+
+    def test_finalizar_incompleto_ou_invalido(self):
+        upload = UploadParcial.objects.create(nome_arquivo='foto.jpg', tamanho=10)
+        self.enviar(upload.id, 0, b'12345')
+        response = self.client.post(reverse('upload-finalizar', args=[upload.id]))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        self.enviar(upload.id, 5, b'67890')
+        response = self.client.post(reverse('upload-finalizar', args=[upload.id]))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.post(reverse('denuncia-list'), self.dados_denuncia(upload=upload.id), format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
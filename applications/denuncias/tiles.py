@@ -0,0 +1,148 @@
+"""
+Tiles binários das denúncias para o mapa (/api/denuncias/tiles/{z}/{x}/{y}/).
+
+Os tiles seguem o esquema XYZ do OpenStreetMap (Web Mercator, y crescendo
+para o sul) e trazem as denúncias do tile em um formato empacotado, todos
+os inteiros little-endian:
+
+    Cabeçalho (8 bytes): "VDP" | versão (u8) | total de denúncias (u32)
+    Cada denúncia (15 bytes):
+        id (u32)
+        x, y (u16 cada): posição dentro do tile, de 0 a 65535
+        categoria (u16): id da categoria
+        status (u8): índice em STATUS (0 = ABERTA, 1 = EM_ANALISE, 2 = RESOLVIDA)
+        total_apoios (u32)
+
+Para voltar a lat/lon: xm = (x_tile + x / 65536) / 2^z e
+ym = (y_tile + y / 65536) / 2^z, e então lon = xm * 360 - 180 e
+lat = degrees(atan(sinh(pi * (1 - 2 * ym)))). Do zoom 10 em diante o erro
+da quantização fica abaixo de 1 metro.
+
+Os tiles gerados ficam em disco (settings.TILES_CACHE_DIR) e são apagados
+pelos signals quando uma denúncia do tile é criada, removida, muda de lugar,
+de status ou de número de apoios (ver signals.py).
+"""
+import os
+import struct
+import tempfile
+from math import atan, degrees, pi, sinh
+from pathlib import Path
+
+from django.conf import settings
+
+from .mapa import projetar
+from .models import Denuncia
+
+ZOOM_MAXIMO_TILE = 22
+VERSAO_FORMATO = 1
+CABECALHO = struct.Struct('<3sBI')
+REGISTRO = struct.Struct('<IHHHBI')
+RESOLUCAO = 1 << 16
+STATUS = list(Denuncia.Status.values)
+# Folga em graus na consulta, para não perder pontos na borda do tile
+MARGEM_GRAUS = 1e-6
+
+
+def tile_valido(z, x, y):
+    return 0 <= z <= ZOOM_MAXIMO_TILE and 0 <= x < (1 << z) and 0 <= y < (1 << z)
+
+
+def tile_para(latitude, longitude, z):
+    """Retorna (x, y) do tile que contém o ponto no zoom z."""
+    x, y = projetar(latitude, longitude)
+    n = 1 << z
+    return int(x * n), int(y * n)
+
+
+def limites_tile(z, x, y):
+    """Retorna (lat_min, lat_max, lon_min, lon_max) do tile."""
+    n = 1 << z
+
+    def latitude(ym):
+        return degrees(atan(sinh(pi * (1 - 2 * ym / n))))
+
+    return latitude(y + 1), latitude(y), x / n * 360.0 - 180.0, (x + 1) / n * 360.0 - 180.0
+
+
+def codificar_tile(z, x, y, denuncias):
+    """
+    Empacota as denúncias que caem no tile.
+    denuncias: iterável de (id, latitude, longitude, categoria_id, status, total_apoios)
+    """
+    n = 1 << z
+    registros = []
+    for pk, latitude, longitude, categoria_id, status, total_apoios in denuncias:
+        xm, ym = projetar(latitude, longitude)
+        if int(xm * n) != x or int(ym * n) != y:
+            continue
+        registros.append(REGISTRO.pack(
+            pk,
+            min(int((xm * n - x) * RESOLUCAO), RESOLUCAO - 1),
+            min(int((ym * n - y) * RESOLUCAO), RESOLUCAO - 1),
+            categoria_id,
+            STATUS.index(status),
+            min(total_apoios, 0xFFFFFFFF),
+        ))
+    return CABECALHO.pack(b'VDP', VERSAO_FORMATO, len(registros)) + b''.join(registros)
+
+
+def decodificar_tile(z, x, y, dados):
+    """Inverso de codificar_tile; retorna uma lista de dicionários."""
+    assinatura, versao, total = CABECALHO.unpack_from(dados)
+    if assinatura != b'VDP' or versao != VERSAO_FORMATO:
+        raise ValueError('Tile em formato desconhecido.')
+
+    n = 1 << z
+    denuncias = []
+    for pk, qx, qy, categoria_id, status, total_apoios in REGISTRO.iter_unpack(dados[CABECALHO.size:]):
+        ym = (y + qy / RESOLUCAO) / n
+        denuncias.append({
+            'id': pk,
+            'latitude': degrees(atan(sinh(pi * (1 - 2 * ym)))),
+            'longitude': (x + qx / RESOLUCAO) / n * 360.0 - 180.0,
+            'categoria': categoria_id,
+            'status': STATUS[status],
+            'total_apoios': total_apoios,
+        })
+    if len(denuncias) != total:
+        raise ValueError('Tile truncado.')
+    return denuncias
+
+
+def gerar_tile(z, x, y):
+    lat_min, lat_max, lon_min, lon_max = limites_tile(z, x, y)
+    denuncias = Denuncia.objects.filter(
+        latitude__gte=lat_min - MARGEM_GRAUS, latitude__lte=lat_max + MARGEM_GRAUS,
+        longitude__gte=lon_min - MARGEM_GRAUS, longitude__lte=lon_max + MARGEM_GRAUS,
+    ).order_by('id').values_list('id', 'latitude', 'longitude', 'categoria_id', 'status', 'total_apoios')
+    return codificar_tile(z, x, y, denuncias.iterator())
+
+
+def caminho_cache(z, x, y):
+    return Path(settings.TILES_CACHE_DIR) / str(z) / str(x) / f'{y}.bin'
+
+
+def obter_tile(z, x, y):
+    """Retorna o tile do cache em disco, gerando-o se necessário."""
+    caminho = caminho_cache(z, x, y)
+    try:
+        return caminho.read_bytes()
+    except FileNotFoundError:
+        pass
+
+    dados = gerar_tile(z, x, y)
+    caminho.parent.mkdir(parents=True, exist_ok=True)
+    # Grava em um arquivo temporário e renomeia, para ninguém ler um tile pela metade
+    descritor, temporario = tempfile.mkstemp(dir=caminho.parent, suffix='.tmp')
+    with os.fdopen(descritor, 'wb') as arquivo:
+        arquivo.write(dados)
+    os.replace(temporario, caminho)
+    return dados
+
+
+def invalidar_ponto(latitude, longitude):
+    """Apaga do cache os tiles de todos os zooms que contêm o ponto."""
+    if latitude is None or longitude is None:
+        return
+    for z in range(ZOOM_MAXIMO_TILE + 1):
+        caminho_cache(z, *tile_para(latitude, longitude, z)).unlink(missing_ok=True)
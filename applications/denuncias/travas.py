@@ -0,0 +1,166 @@
+"""
+Travas por (categoria, célula da grade) para o agrupamento de denúncias.
+
+Duas submissões próximas da mesma categoria não podem executar o "busca ou
+cria" de `criar_ou_apoiar_denuncia` ao mesmo tempo, senão nenhuma enxerga a
+outra e as duas criam uma denúncia nova. Travar a tabela inteira serializaria
+todas as submissões; aqui só são travadas as células em volta do ponto.
+
+- Bancos com SELECT ... FOR UPDATE (PostgreSQL, MySQL): as linhas de
+  TravaAgrupamento das células são criadas e travadas dentro da transação e
+  apagadas no commit, então a tabela não cresce com cada célula já usada.
+  Quem esperava por uma linha apagada cria de novo e tenta outra vez.
+- SQLite: as células são reivindicadas inserindo as linhas (chave única) em
+  uma transação própria antes do "busca ou cria", e apagadas ao final.
+  Reivindicações abandonadas expiram após TEMPO_EXPIRACAO_SEGUNDOS. A
+  transação do "busca ou cria" começa com BEGIN IMMEDIATE: ela lê e depois
+  escreve, e uma transação adiada que tenta passar de leitura a escrita
+  enquanto outra escreve falha na hora com "database is locked".
+"""
+import random
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.db import IntegrityError, OperationalError, connection, transaction
+from django.utils import timezone
+
+from .geo import celulas_vizinhas
+from .models import TravaAgrupamento
+
+TEMPO_ESPERA_SEGUNDOS = 10
+TEMPO_EXPIRACAO_SEGUNDOS = 30
+INTERVALO_INICIAL_SEGUNDOS = 0.005
+INTERVALO_MAXIMO_SEGUNDOS = 0.1
+
+
+class TravaOcupada(Exception):
+    """A trava do agrupamento não foi obtida dentro do tempo de espera."""
+
+
+def chaves_trava(categoria, latitude, longitude, raio_metros):
+    """
+    Retorna, ordenadas, as chaves das células que cobrem o raio em torno do ponto.
+    Duas submissões a menos de `raio_metros` uma da outra sempre compartilham
+    ao menos uma chave. A ordem fixa evita deadlocks.
+    """
+    return sorted(f'{categoria.pk}|{celula}' for celula in celulas_vizinhas(latitude, longitude, raio_metros))
+
+
+@contextmanager
+def trava_agrupamento(categoria, latitude, longitude, raio_metros):
+    """
+    Abre uma transação com as células em volta do ponto travadas para a categoria.
+    Lança TravaOcupada se a trava não for obtida a tempo.
+    """
+    chaves = chaves_trava(categoria, latitude, longitude, raio_metros)
+
+    if connection.features.has_select_for_update:
+        with transaction.atomic():
+            _travar_linhas(chaves)
+            yield
+            TravaAgrupamento.objects.filter(chave__in=chaves).delete()
+        return
+
+    token = _reivindicar(chaves)
+    try:
+        with _transacao_imediata():
+            yield
+    finally:
+        _liberar(chaves, token)
+
+
+class _TravaIncompleta(Exception):
+    """Alguma linha foi apagada por quem segurava a trava antes de ser travada aqui."""
+
+
+def _travar_linhas(chaves):
+    limite = time.monotonic() + TEMPO_ESPERA_SEGUNDOS
+    while True:
+        try:
+            # Savepoint: numa tentativa incompleta, as linhas já travadas são soltas antes de tentar de novo
+            with transaction.atomic():
+                TravaAgrupamento.objects.bulk_create(
+                    [TravaAgrupamento(chave=chave) for chave in chaves],
+                    ignore_conflicts=True,
+                )
+                travadas = list(
+                    TravaAgrupamento.objects.select_for_update()
+                    .filter(chave__in=chaves).order_by('chave').values_list('chave', flat=True)
+                )
+                if len(travadas) < len(chaves):
+                    raise _TravaIncompleta
+            return
+        except _TravaIncompleta:
+            if time.monotonic() >= limite:
+                raise TravaOcupada('Não foi possível obter a trava do agrupamento.')
+
+
+@contextmanager
+def _transacao_imediata():
+    """
+    transaction.atomic() que, no SQLite e fora de outra transação, começa com
+    BEGIN IMMEDIATE. O modo vale só para esta transação; as demais do projeto
+    continuam adiadas.
+    """
+    if connection.vendor != 'sqlite' or connection.in_atomic_block:
+        with transaction.atomic():
+            yield
+        return
+
+    # O modo é lido das configurações a cada conexão; conecta antes de trocá-lo
+    connection.ensure_connection()
+    anterior = connection.transaction_mode
+    connection.transaction_mode = 'IMMEDIATE'
+    try:
+        with transaction.atomic():
+            connection.transaction_mode = anterior
+            yield
+    finally:
+        connection.transaction_mode = anterior
+
+
+def _reivindicar(chaves):
+    token = uuid.uuid4().hex
+    limite = time.monotonic() + TEMPO_ESPERA_SEGUNDOS
+    intervalo = INTERVALO_INICIAL_SEGUNDOS
+
+    while True:
+        try:
+            # Tudo ou nada: se alguma célula já estiver reivindicada, nenhuma linha é inserida
+            with transaction.atomic():
+                TravaAgrupamento.objects.bulk_create(
+                    [TravaAgrupamento(chave=chave, token=token) for chave in chaves]
+                )
+            return token
+        except (IntegrityError, OperationalError):
+            pass
+
+        try:
+            # Remove reivindicações de processos que morreram segurando a trava
+            TravaAgrupamento.objects.filter(
+                chave__in=chaves,
+                criada_em__lt=timezone.now() - timedelta(seconds=TEMPO_EXPIRACAO_SEGUNDOS),
+            ).delete()
+        except OperationalError:
+            pass
+
+        if time.monotonic() >= limite:
+            raise TravaOcupada('Não foi possível obter a trava do agrupamento.')
+
+        time.sleep(intervalo * random.uniform(0.5, 1.5))
+        intervalo = min(intervalo * 2, INTERVALO_MAXIMO_SEGUNDOS)
+
+
+def _liberar(chaves, token):
+    limite = time.monotonic() + TEMPO_ESPERA_SEGUNDOS
+    while True:
+        try:
+            TravaAgrupamento.objects.filter(chave__in=chaves, token=token).delete()
+            return
+        except OperationalError:
+            # Banco ocupado; a reivindicação expira sozinha se não der para apagar
+            if time.monotonic() >= limite:
+                return
+            time.sleep(INTERVALO_INICIAL_SEGUNDOS)
@@ -0,0 +1,148 @@
+"""
+Upload de fotos em pedaços, retomável após quedas de conexão.
+
+1. POST /api/denuncias/uploads/ {"nome_arquivo", "tamanho"} cria o upload.
+2. PATCH /api/denuncias/uploads/{id}/ com o cabeçalho Upload-Offset e os bytes
+   no corpo acrescenta um pedaço. Se a conexão cair, GET no upload informa o
+   offset já recebido e o envio continua dali.
+3. POST /api/denuncias/uploads/{id}/finalizar/ valida a imagem e a move para
+   o armazenamento de fotos.
+4. A criação da denúncia recebe "upload" (o id) no lugar de "foto".
+
+Os pedaços são acrescentados a um arquivo em settings.UPLOADS_PARCIAIS_DIR,
+lendo o corpo da requisição aos poucos; o tamanho do arquivo é o offset.
+"""
+import os
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.files import File, locks
+from django.db import transaction
+from django.utils import timezone
+from PIL import Image
+
+from .models import Denuncia, UploadParcial
+
+TAMANHO_LEITURA = 64 * 1024
+VALIDADE = timedelta(hours=24)
+
+
+class OffsetInvalido(Exception):
+    """O offset do pedaço não é o offset atual do upload."""
+
+    def __init__(self, atual):
+        super().__init__(f'Offset esperado: {atual}.')
+        self.atual = atual
+
+
+class ArquivoInvalido(Exception):
+    """O upload não está completo ou não é uma imagem."""
+
+
+class UploadJaConsumido(Exception):
+    """Outra requisição já criou a denúncia deste upload."""
+
+
+def caminho_parcial(upload):
+    return Path(settings.UPLOADS_PARCIAIS_DIR) / f'{upload.pk}.part'
+
+
+def offset_atual(upload):
+    try:
+        return caminho_parcial(upload).stat().st_size
+    except FileNotFoundError:
+        return 0
+
+
+def escrever_pedaco(upload, offset, corpo, tamanho_pedaco):
+    """
+    Acrescenta ao upload os bytes lidos de `corpo` a partir de `offset`.
+    Retorna o novo offset; se a conexão cair no meio, o que chegou fica gravado.
+    """
+    caminho = caminho_parcial(upload)
+    caminho.parent.mkdir(parents=True, exist_ok=True)
+    with open(caminho, 'ab') as arquivo:
+        # Dois PATCH simultâneos no mesmo upload não podem intercalar bytes
+        locks.lock(arquivo, locks.LOCK_EX)
+        try:
+            atual = arquivo.seek(0, os.SEEK_END)
+            if offset != atual:
+                raise OffsetInvalido(atual)
+            if atual + tamanho_pedaco > upload.tamanho:
+                raise ArquivoInvalido('O pedaço ultrapassa o tamanho declarado do upload.')
+
+            restante = tamanho_pedaco
+            try:
+                while restante > 0:
+                    pedaco = corpo.read(min(TAMANHO_LEITURA, restante))
+                    if not pedaco:
+                        break
+                    arquivo.write(pedaco)
+                    restante -= len(pedaco)
+            finally:
+                arquivo.flush()
+            novo = arquivo.tell()
+        finally:
+            locks.unlock(arquivo)
+
+    UploadParcial.objects.filter(pk=upload.pk).update(atualizado_em=timezone.now())
+    return novo
+
+
+def finalizar_upload(upload):
+    """Valida a imagem recebida e a grava no armazenamento de fotos."""
+    if upload.foto:
+        return upload.foto
+    caminho = caminho_parcial(upload)
+    if offset_atual(upload) != upload.tamanho:
+        raise ArquivoInvalido('O upload ainda não recebeu todos os bytes.')
+
+    try:
+        with Image.open(caminho) as imagem:
+            imagem.verify()
+    except Exception:
+        raise ArquivoInvalido('O arquivo enviado não é uma imagem válida.')
+
+    storage = Denuncia._meta.get_field('foto').storage
+    with open(caminho, 'rb') as arquivo:
+        nome = storage.save(f'denuncias_fotos/{os.path.basename(upload.nome_arquivo)}', File(arquivo))
+    # Outra requisição de finalização pode ter chegado antes
+    if not UploadParcial.objects.filter(pk=upload.pk, foto='').update(foto=nome):
+        storage.delete(nome)
+        upload.refresh_from_db(fields=['foto'])
+        return upload.foto
+    caminho.unlink(missing_ok=True)
+    upload.foto = nome
+    return nome
+
+
+def consumir_upload(upload, denuncia, created_denuncia):
+    """
+    Associa o upload à denúncia criada, dentro da transação do agrupamento.
+    A atualização condicional (denuncia ainda vazia) deixa só uma de duas
+    criações simultâneas com o mesmo upload passar; a outra recebe
+    UploadJaConsumido e a sua transação é desfeita.
+
+    Se a submissão virou apoio, a foto não é usada e a referência criada na
+    finalização é liberada depois do commit.
+    """
+    if not UploadParcial.objects.filter(pk=upload.pk, denuncia__isnull=True).update(denuncia=denuncia):
+        raise UploadJaConsumido('Este envio já foi processado.')
+    upload.denuncia = denuncia
+    if not created_denuncia:
+        storage, nome = Denuncia._meta.get_field('foto').storage, upload.foto
+        transaction.on_commit(lambda: storage.delete(nome))
+
+
+def limpar_uploads_expirados(agora=None):
+    """Remove uploads não usados em uma denúncia há mais de VALIDADE. Retorna quantos."""
+    limite = (agora or timezone.now()) - VALIDADE
+    storage = Denuncia._meta.get_field('foto').storage
+    expirados = list(UploadParcial.objects.filter(atualizado_em__lt=limite, denuncia__isnull=True))
+    for upload in expirados:
+        caminho_parcial(upload).unlink(missing_ok=True)
+        if upload.foto:
+            storage.delete(upload.foto)
+    UploadParcial.objects.filter(pk__in=[upload.pk for upload in expirados]).delete()
+    return len(expirados)
@@ -1,6 +1,8 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import CategoriaViewSet, DenunciaViewSet, ApoioDenunciaViewSet, ComentarioViewSet
+from .views import (
+    CategoriaViewSet, DenunciaViewSet, ApoioDenunciaViewSet, ComentarioViewSet, TileDenunciasView, UploadParcialViewSet,
+)
 
 # Cria um router e registra nossas viewsets com ele.
 router = DefaultRouter()
@@ -8,8 +10,10 @@ router.register(r'categorias', CategoriaViewSet, basename='categoria')
 router.register(r'denuncias', DenunciaViewSet, basename='denuncia')
 router.register(r'apoios', ApoioDenunciaViewSet, basename='apoio')
 router.register(r'comentarios', ComentarioViewSet, basename='comentario')
+router.register(r'uploads', UploadParcialViewSet, basename='upload')
 
 # As URLs da API são determinadas automaticamente pelo router.
 urlpatterns = [
     path('', include(router.urls)),
+    path('tiles/<int:z>/<int:x>/<int:y>/', TileDenunciasView.as_view(), name='denuncia-tile'),
 ]
\ No newline at end of file
@@ -0,0 +1,162 @@
+"""
+Variantes das fotos geradas sob demanda (/api/denuncias/denuncias/{id}/foto/?w=320&fmt=webp).
+
+Cada variante é gerada no primeiro acesso e guardada em um cache em disco
+(settings.VARIANTES_CACHE_DIR) limitado a settings.VARIANTES_CACHE_MAX_BYTES.
+O mtime dos arquivos marca o último acesso; quando o limite é ultrapassado,
+as menos usadas recentemente são apagadas.
+
+Pedidos simultâneos da mesma variante ainda não gerada esperam por uma única
+geração: um Lock por variante entre as threads do processo e uma trava de
+arquivo (flock) entre processos.
+"""
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from io import BytesIO
+from pathlib import Path
+
+from django.conf import settings
+from django.core.files import locks
+from PIL import Image
+
+from .fotos import abrir_imagem
+
+LARGURAS = (160, 320, 640, 1024, 1920)
+FORMATOS = {
+    'webp': ('WEBP', 'image/webp'),
+    'jpeg': ('JPEG', 'image/jpeg'),
+}
+QUALIDADE = 80
+# Só renova o mtime de um arquivo lido se o último acesso tiver mais de um minuto
+INTERVALO_TOQUE_SEGUNDOS = 60
+# Fração do limite que pode ser gravada antes de uma nova varredura do cache
+FRACAO_VARREDURA = 0.05
+# Ao limpar, deixa o cache nesta fração do limite
+FRACAO_ALVO = 0.9
+
+_travas = {}
+_travas_trava = threading.Lock()
+_bytes_desde_varredura = 0
+
+
+def caminho_variante(nome_foto, largura, formato):
+    chave = hashlib.sha256(f'{nome_foto}|{largura}|{formato}'.encode()).hexdigest()
+    return Path(settings.VARIANTES_CACHE_DIR) / chave[:2] / f'{chave}.{formato}'
+
+
+def gerar_variante(arquivo, largura, formato):
+    imagem = abrir_imagem(arquivo, largura=largura)
+    if imagem.width > largura:
+        imagem = imagem.resize((largura, max(1, round(imagem.height * largura / imagem.width))), Image.Resampling.LANCZOS, reducing_gap=3.0)
+    formato_pil, _ = FORMATOS[formato]
+    if formato_pil == 'JPEG' and imagem.mode != 'RGB':
+        imagem = imagem.convert('RGB')
+    saida = BytesIO()
+    imagem.save(saida, formato_pil, quality=QUALIDADE)
+    return saida.getvalue()
+
+
+def _trava_da_variante(caminho):
+    with _travas_trava:
+        trava = _travas.get(caminho)
+        if trava is None:
+            trava = _travas[caminho] = [threading.Lock(), 0]
+        trava[1] += 1
+    return trava
+
+
+def _soltar_trava_da_variante(caminho, trava):
+    with _travas_trava:
+        trava[1] -= 1
+        if not trava[1]:
+            del _travas[caminho]
+
+
+def obter_variante(storage, nome_foto, largura, formato):
+    """Retorna o caminho da variante no cache, gerando-a se ainda não existir."""
+    caminho = caminho_variante(nome_foto, largura, formato)
+    if _tocar(caminho):
+        return caminho
+
+    trava = _trava_da_variante(caminho)
+    try:
+        with trava[0]:
+            caminho.parent.mkdir(parents=True, exist_ok=True)
+            with open(caminho.with_suffix('.lock'), 'wb') as arquivo_trava:
+                locks.lock(arquivo_trava, locks.LOCK_EX)
+                try:
+                    # Outra thread ou processo pode ter gerado enquanto esperávamos
+                    if _tocar(caminho):
+                        return caminho
+                    with storage.open(nome_foto, 'rb') as original:
+                        dados = gerar_variante(original, largura, formato)
+                    descritor, temporario = tempfile.mkstemp(dir=caminho.parent, suffix='.tmp')
+                    with os.fdopen(descritor, 'wb') as arquivo:
+                        arquivo.write(dados)
+                    os.replace(temporario, caminho)
+                finally:
+                    locks.unlock(arquivo_trava)
+    finally:
+        _soltar_trava_da_variante(caminho, trava)
+
+    _registrar_gravacao(len(dados))
+    return caminho
+
+
+def _tocar(caminho):
+    """Marca o acesso à variante; retorna False se ela não existe."""
+    try:
+        if time.time() - caminho.stat().st_mtime > INTERVALO_TOQUE_SEGUNDOS:
+            os.utime(caminho)
+        return True
+    except FileNotFoundError:
+        return False
+
+
+def _registrar_gravacao(tamanho):
+    global _bytes_desde_varredura
+    limite = settings.VARIANTES_CACHE_MAX_BYTES
+    with _travas_trava:
+        _bytes_desde_varredura += tamanho
+        if _bytes_desde_varredura < limite * FRACAO_VARREDURA:
+            return
+        _bytes_desde_varredura = 0
+    limpar_cache(limite)
+
+
+def limpar_cache(limite):
+    """Apaga as variantes menos usadas recentemente até o cache caber no limite."""
+    arquivos = []
+    total = 0
+    raiz = Path(settings.VARIANTES_CACHE_DIR)
+    pastas = [pasta for pasta in raiz.iterdir() if pasta.is_dir()] if raiz.is_dir() else []
+    for pasta in pastas:
+        with os.scandir(pasta) as entradas:
+            for entrada in entradas:
+                if entrada.name.endswith(('.lock', '.tmp')):
+                    continue
+                try:
+                    estado = entrada.stat()
+                except FileNotFoundError:
+                    continue
+                arquivos.append((estado.st_mtime, estado.st_size, entrada.path))
+                total += estado.st_size
+    if total <= limite:
+        return 0
+
+    removidos = 0
+    arquivos.sort()
+    for _, tamanho, caminho in arquivos:
+        if total <= limite * FRACAO_ALVO:
+            break
+        try:
+            os.remove(caminho)
+            os.remove(caminho.rsplit('.', 1)[0] + '.lock')
+        except FileNotFoundError:
+            pass
+        total -= tamanho
+        removidos += 1
+    return removidos
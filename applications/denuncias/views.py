@@ -1,12 +1,30 @@
+import hashlib
+from math import isfinite
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified
 from rest_framework import viewsets, permissions, mixins, status
 from rest_framework.decorators import action
+from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.exceptions import ValidationError
+from PIL import Image
 
+from applications.core.cache import CacheLeituraMixin
+from applications.core.pagination import KeysetPagination, KeysetPaginationCrescente
+from applications.core.views import resposta_sendfile
 from applications.gestao_publica.permissions import IsGestorWithJurisdiction
-from .models import Categoria, Denuncia, ApoioDenuncia, Comentario
-from .serializers import CategoriaSerializer, DenunciaSerializer, ApoioDenunciaSerializer, ComentarioSerializer
+from .fotos import agendar_processamento
+from .mapa import ZOOM_PONTOS, obter_indice
+from .models import Categoria, Denuncia, ApoioDenuncia, Comentario, UploadParcial
+from .serializers import (
+    CategoriaSerializer, DenunciaSerializer, ApoioDenunciaSerializer, ComentarioSerializer, UploadParcialSerializer,
+)
 from .services import criar_ou_apoiar_denuncia
+from .tiles import obter_tile, tile_valido
+from .uploads import ArquivoInvalido, OffsetInvalido, UploadJaConsumido, escrever_pedaco, finalizar_upload
+from .variantes import FORMATOS, LARGURAS, obter_variante
+from .travas import TravaOcupada
 
 
 class IsOwnerOrReadOnly(permissions.BasePermission):
@@ -28,21 +46,30 @@ class IsOwnerOrReadOnly(permissions.BasePermission):
         return False
 
 
-class CategoriaViewSet(viewsets.ReadOnlyModelViewSet):
+class CategoriaViewSet(CacheLeituraMixin, viewsets.ReadOnlyModelViewSet):
+    grupo_cache = 'categorias'
     queryset = Categoria.objects.all()
     serializer_class = CategoriaSerializer
     permission_classes = [permissions.AllowAny]  # Permite acesso sem autenticação
 
 
 class DenunciaViewSet(viewsets.ModelViewSet):
-    queryset = Denuncia.objects.all().select_related(
-        'autor', 'categoria', 'cidade', 'estado'
-    ).prefetch_related('apoios', 'comentarios')
+    queryset = Denuncia.objects.all()
     serializer_class = DenunciaSerializer
+    pagination_class = KeysetPagination
+
+    def get_queryset(self):
+        if self.action in ['list', 'retrieve']:
+            # Leitura: só as colunas serializadas, sem carregar apoios ou comentários
+            return DenunciaSerializer.preparar_queryset(self.queryset)
+        return self.queryset.select_related('autor')
 
     def get_permissions(self):
         if self.action in ['update', 'partial_update', 'destroy']:
             permission_classes = [permissions.IsAuthenticated, IsOwnerOrReadOnly]
+        elif self.action in ['resolver', 'change_status']:
+            # Ações com permission_classes próprias no @action
+            return super().get_permissions()
         else:
             permission_classes = [permissions.AllowAny]
         return [permission() for permission in permission_classes]
@@ -60,11 +87,31 @@ class DenunciaViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        denuncia, created_denuncia, created_apoio = criar_ou_apoiar_denuncia(
-            serializer.validated_data,
-            user=user,
-            autor_convidado=autor_convidado
-        )
+        upload = serializer.validated_data.pop('upload', None)
+        if upload is not None:
+            if upload.denuncia_id is not None:
+                return self.upload_ja_processado(upload)
+            serializer.validated_data['foto'] = upload.foto
+
+        try:
+            denuncia, created_denuncia, created_apoio = criar_ou_apoiar_denuncia(
+                serializer.validated_data,
+                user=user,
+                autor_convidado=autor_convidado,
+                upload=upload
+            )
+        except TravaOcupada:
+            return Response(
+                {'detail': 'Muitas denúncias sendo enviadas neste local. Tente novamente em instantes.'},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE
+            )
+        except UploadJaConsumido:
+            # Uma criação simultânea com o mesmo upload chegou antes
+            upload.refresh_from_db(fields=['denuncia'])
+            return self.upload_ja_processado(upload)
+
+        if upload is not None and created_denuncia:
+            agendar_processamento(denuncia.pk)
 
         # Usar o serializer da denúncia retornada para a resposta
         response_serializer = self.get_serializer(denuncia)
@@ -102,6 +149,110 @@ class DenunciaViewSet(viewsets.ModelViewSet):
                 headers=headers
             )
 
+    def upload_ja_processado(self, upload):
+        # Reenvio de uma criação que já foi processada (ex.: a resposta se perdeu na rede)
+        return Response(
+            {
+                'message': 'Este envio já foi processado.',
+                'denuncia': self.get_serializer(upload.denuncia).data
+            },
+            status=status.HTTP_200_OK
+        )
+
+    @action(detail=False, methods=['get'], url_path='mapa', pagination_class=None)
+    def mapa(self, request):
+        """
+        Clusters das denúncias dentro do viewport do mapa.
+        Parâmetros: bbox=lon_min,lat_min,lon_max,lat_max, zoom e, opcionalmente, categoria e status.
+        """
+        try:
+            caixa = [float(valor) for valor in request.query_params.get('bbox', '').split(',')]
+            # float() aceita 'nan' e 'inf'
+            if len(caixa) != 4 or not all(map(isfinite, caixa)) or caixa[0] > caixa[2] or caixa[1] > caixa[3]:
+                raise ValueError
+        except ValueError:
+            return Response(
+                {'error': 'O parâmetro "bbox" deve ser lon_min,lat_min,lon_max,lat_max.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            zoom = int(request.query_params.get('zoom', ''))
+            if not 0 <= zoom <= 22:
+                raise ValueError
+        except ValueError:
+            return Response(
+                {'error': 'O parâmetro "zoom" deve ser um inteiro entre 0 e 22.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        categoria_id = request.query_params.get('categoria')
+        if categoria_id is not None:
+            if not categoria_id.isdigit():
+                return Response(
+                    {'error': 'O parâmetro "categoria" deve ser o id da categoria.'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            categoria_id = int(categoria_id)
+
+        status_filtro = request.query_params.get('status')
+        status_choices = [choice[0] for choice in Denuncia.Status.choices]
+        if status_filtro is not None and status_filtro not in status_choices:
+            return Response(
+                {'error': f'Status inválido. Opções válidas: {status_choices}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        indice = obter_indice(categoria_id=categoria_id, status=status_filtro)
+        if zoom >= ZOOM_PONTOS:
+            return Response({'zoom': zoom, 'clusters': [], 'pontos': indice.pontos_na_caixa(caixa)})
+        return Response({'zoom': zoom, 'clusters': indice.clusters(zoom, caixa), 'pontos': []})
+
+    @action(detail=True, methods=['get'], url_path='foto')
+    def foto(self, request, pk=None):
+        """
+        Variante redimensionada da foto, gerada no primeiro acesso (ver variantes.py).
+        Parâmetros: w (uma das LARGURAS) e fmt (webp ou jpeg).
+        """
+        try:
+            largura = int(request.query_params.get('w', ''))
+        except ValueError:
+            largura = None
+        formato = request.query_params.get('fmt', 'webp')
+        if largura not in LARGURAS or formato not in FORMATOS:
+            return Response(
+                {'error': f'Parâmetros inválidos. Larguras válidas: {list(LARGURAS)}; formatos: {list(FORMATOS)}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        nome_foto = Denuncia.objects.filter(pk=pk).values_list('foto', flat=True).first()
+        if not nome_foto:
+            raise Http404('Denúncia não encontrada.')
+
+        campo_foto = Denuncia._meta.get_field('foto')
+        try:
+            caminho = obter_variante(campo_foto.storage, nome_foto, largura, formato)
+        except Image.DecompressionBombError:
+            return Response(
+                {'error': 'A foto original é grande demais para gerar variantes.'},
+                status=status.HTTP_422_UNPROCESSABLE_ENTITY
+            )
+        except (OSError, ValueError):
+            return Response({'error': 'Não foi possível gerar a variante da foto.'}, status=status.HTTP_404_NOT_FOUND)
+
+        etag = '"%s"' % caminho.stem
+        tipo = FORMATOS[formato][1]
+        if request.headers.get('If-None-Match') == etag:
+            response = HttpResponseNotModified()
+        else:
+            # Como em servir_midia: com MEDIA_SENDFILE os bytes saem pelo servidor da frente
+            uri_interna = settings.VARIANTES_SENDFILE_PREFIXO + caminho.relative_to(settings.VARIANTES_CACHE_DIR).as_posix()
+            response = resposta_sendfile(caminho, tipo, uri_interna) or FileResponse(open(caminho, 'rb'), content_type=tipo)
+        response['ETag'] = etag
+        # A foto da denúncia pode ser trocada, então a URL não é imutável
+        response['Cache-Control'] = 'public, max-age=86400'
+        return response
+
     @action(detail=True, methods=['post'], permission_classes=[permissions.IsAuthenticated])
     def resolver(self, request, pk=None):
         denuncia = self.get_object()
@@ -140,6 +291,75 @@ class DenunciaViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
 
+class TileDenunciasView(APIView):
+    """
+    Tile binário com as denúncias do tile z/x/y (formato descrito em tiles.py).
+    """
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request, z, x, y):
+        if not tile_valido(z, x, y):
+            raise Http404('Tile inexistente.')
+
+        dados = obter_tile(z, x, y)
+        etag = '"%s"' % hashlib.md5(dados, usedforsecurity=False).hexdigest()
+        if request.headers.get('If-None-Match') == etag:
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(dados, content_type='application/vnd.vozdopovo.tile')
+        response['ETag'] = etag
+        # O app revalida a cada uso; com o ETag, tiles que não mudaram não são baixados de novo
+        response['Cache-Control'] = 'public, no-cache'
+        return response
+
+
+class UploadParcialViewSet(mixins.CreateModelMixin,
+                           mixins.RetrieveModelMixin,
+                           viewsets.GenericViewSet):
+    """
+    Upload de fotos em pedaços, retomável (protocolo descrito em uploads.py).
+    """
+    queryset = UploadParcial.objects.all()
+    serializer_class = UploadParcialSerializer
+    permission_classes = [permissions.AllowAny]
+
+    def partial_update(self, request, pk=None):
+        upload = self.get_object()
+        if upload.foto:
+            return Response({'error': 'Upload já finalizado.'}, status=status.HTTP_409_CONFLICT)
+        try:
+            offset = int(request.headers['Upload-Offset'])
+            tamanho_pedaco = int(request.headers.get('Content-Length') or 0)
+        except (KeyError, ValueError):
+            return Response(
+                {'error': 'Os cabeçalhos "Upload-Offset" e "Content-Length" são obrigatórios.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            # Lê o corpo direto do stream, sem carregar o pedaço inteiro na memória
+            novo_offset = escrever_pedaco(upload, offset, request.stream, tamanho_pedaco)
+        except OffsetInvalido as e:
+            response = Response({'error': str(e), 'offset': e.atual}, status=status.HTTP_409_CONFLICT)
+            response['Upload-Offset'] = e.atual
+            return response
+        except ArquivoInvalido as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        response = Response({'offset': novo_offset})
+        response['Upload-Offset'] = novo_offset
+        return response
+
+    @action(detail=True, methods=['post'])
+    def finalizar(self, request, pk=None):
+        upload = self.get_object()
+        try:
+            finalizar_upload(upload)
+        except ArquivoInvalido as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(self.get_serializer(upload).data)
+
+
 class ApoioDenunciaViewSet(mixins.CreateModelMixin,
                            mixins.RetrieveModelMixin,
                            mixins.DestroyModelMixin,
@@ -149,7 +369,7 @@ class ApoioDenunciaViewSet(mixins.CreateModelMixin,
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        return ApoioDenuncia.objects.filter(apoiador=self.request.user)
+        return ApoioDenuncia.objects.filter(apoiador_id=self.request.user.pk)
 
     def perform_create(self, serializer):
         serializer.save(apoiador=self.request.user)
@@ -157,6 +377,7 @@ class ApoioDenunciaViewSet(mixins.CreateModelMixin,
 
 class ComentarioViewSet(viewsets.ModelViewSet):
     serializer_class = ComentarioSerializer
+    pagination_class = KeysetPaginationCrescente
     
     def get_permissions(self):
         if self.action == 'destroy':
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class GestaoPublicaConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'applications.gestao_publica'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,114 @@
+"""
+Escopo de jurisdição do gestor público: as cidades (jurisdição municipal) e
+os estados (jurisdição estadual) de todas as entidades que ele gerencia.
+
+O escopo é resolvido uma vez por requisição (guardado no próprio request) e
+fica no cache compartilhado, no grupo "escopos", que é invalidado quando uma
+entidade muda ou quando os gestores de alguma entidade mudam (ver signals.py).
+"""
+from django.db.models import Q
+
+from applications.core import cache as cache_compartilhado
+from applications.denuncias.models import Denuncia
+from .models import OfficialEntity
+
+GRUPO_CACHE = 'escopos'
+
+
+class EscopoJurisdicao:
+    """
+    Jurisdições cobertas pelas entidades de um gestor. `cidades` e `estados`
+    mapeiam o id da cidade/estado para o id da entidade que responde por ele.
+    """
+
+    def __init__(self, cidades=None, estados=None):
+        self.cidades = dict(cidades or {})
+        self.estados = dict(estados or {})
+
+    @classmethod
+    def das_entidades(cls, entidades):
+        """Monta o escopo a partir de tuplas (id, cidade_id, estado_id) das entidades."""
+        cidades, estados = {}, {}
+        for entidade_id, cidade_id, estado_id in entidades:
+            if cidade_id:
+                cidades.setdefault(cidade_id, entidade_id)
+            elif estado_id:
+                estados.setdefault(estado_id, entidade_id)
+        return cls(cidades, estados)
+
+    def __bool__(self):
+        return bool(self.cidades or self.estados)
+
+    @property
+    def entidades(self):
+        """Ids das entidades com alguma jurisdição, em ordem."""
+        return sorted(set(self.cidades.values()) | set(self.estados.values()))
+
+    def q(self, prefixo=''):
+        """
+        Filtro das denúncias (ou de modelos com cidade_id, estado_id e
+        jurisdicao) sob o escopo. `prefixo` permite filtrar por uma relação,
+        ex.: q('denuncia__').
+        """
+        filtro = Q(pk__in=[])  # Escopo vazio: nenhuma denúncia
+        if self.cidades:
+            filtro |= Q(**{
+                f'{prefixo}cidade_id__in': sorted(self.cidades),
+                f'{prefixo}jurisdicao': Denuncia.Jurisdicao.MUNICIPAL,
+            })
+        if self.estados:
+            filtro |= Q(**{
+                f'{prefixo}estado_id__in': sorted(self.estados),
+                f'{prefixo}jurisdicao': Denuncia.Jurisdicao.ESTADUAL,
+            })
+        return filtro
+
+    def filtrar(self, queryset):
+        if not self:
+            return queryset.none()
+        return queryset.filter(self.q())
+
+    def entidade_da_denuncia(self, denuncia):
+        """Id da entidade responsável pela denúncia, ou None se ela está fora do escopo."""
+        # Lê do __dict__ para não disparar consultas de campos adiados (.only/.defer)
+        valores = denuncia.__dict__
+        jurisdicao = valores.get('jurisdicao')
+        if jurisdicao == Denuncia.Jurisdicao.MUNICIPAL:
+            return self.cidades.get(valores.get('cidade_id'))
+        if jurisdicao == Denuncia.Jurisdicao.ESTADUAL:
+            return self.estados.get(valores.get('estado_id'))
+        return None
+
+    def contem(self, denuncia):
+        """Se a denúncia está sob o escopo, sem consultar o banco."""
+        return self.entidade_da_denuncia(denuncia) is not None
+
+    __contains__ = contem
+
+
+VAZIO = EscopoJurisdicao()
+
+
+def _e_gestor(user):
+    return getattr(user, 'tipo_usuario', None) == 'GESTOR_PUBLICO'
+
+
+def escopo_do_usuario(user):
+    """Escopo das entidades gerenciadas pelo usuário, do cache quando possível."""
+    if not _e_gestor(user) or user.pk is None:
+        return VAZIO
+
+    def calcular():
+        # Pelo id, para funcionar também com o usuário das claims do token (autenticacao/sessoes.py)
+        return EscopoJurisdicao.das_entidades(
+            OfficialEntity.objects.filter(gestores=user.pk).order_by('pk').values_list('pk', 'cidade_id', 'estado_id')
+        )
+    return cache_compartilhado.obter_ou_calcular(GRUPO_CACHE, user.pk, calcular)
+
+
+def escopo_da_requisicao(request):
+    """Escopo do usuário da requisição, resolvido uma única vez por requisição."""
+    escopo = getattr(request, '_escopo_jurisdicao', None)
+    if escopo is None:
+        escopo = request._escopo_jurisdicao = escopo_do_usuario(request.user)
+    return escopo
@@ -0,0 +1,113 @@
+"""
+Estatísticas do dashboard do gestor público.
+
+O resumo sai de uma única consulta agrupada por (status, categoria_id): os
+totais, as contagens por status, por categoria e a matriz status x categoria
+são somados em Python a partir dela.
+
+As matrizes ficam no cache compartilhado, em um grupo por jurisdição (cidade
+ou estado da entidade), e o grupo é invalidado quando uma denúncia dessa
+jurisdição é criada, removida ou muda de status, categoria ou localidade
+(ver signals.py). A matriz de um gestor com várias entidades é a soma das
+matrizes de cada jurisdição, cada uma com o seu cache.
+
+As matrizes guardam o id da categoria, não o nome: os nomes são trocados só
+na leitura, a partir do grupo "categorias", que é invalidado quando uma
+categoria muda. Assim renomear uma categoria não deixa o dashboard com o
+nome antigo.
+"""
+from collections import Counter
+
+from django.db.models import Count
+
+from applications.core import cache as cache_compartilhado
+from applications.denuncias.models import Categoria, Denuncia
+
+
+def grupo_da_jurisdicao(jurisdicao, cidade_id, estado_id):
+    """Grupo do cache com os resumos de uma jurisdição (None se nenhuma entidade a cobre)."""
+    if jurisdicao == Denuncia.Jurisdicao.MUNICIPAL and cidade_id:
+        return f'dashboard:cidade:{cidade_id}'
+    if jurisdicao == Denuncia.Jurisdicao.ESTADUAL and estado_id:
+        return f'dashboard:estado:{estado_id}'
+    return None
+
+
+def nomes_das_categorias():
+    """{id: nome} de todas as categorias, do cache do grupo "categorias"."""
+    return cache_compartilhado.obter_ou_calcular(
+        'categorias', 'nomes', lambda: dict(Categoria.objects.values_list('id', 'nome')),
+    )
+
+
+def _resumo_da_matriz(matriz):
+    """Resumo do dashboard a partir da matriz {status: {categoria_id: total}}."""
+    nomes = nomes_das_categorias()
+    matriz = {
+        status: {nomes.get(categoria_id, str(categoria_id)): total for categoria_id, total in categorias.items()}
+        for status, categorias in matriz.items()
+    }
+    por_status, por_categoria = Counter(), Counter()
+    for status, categorias in matriz.items():
+        for categoria, total in categorias.items():
+            por_status[status] += total
+            por_categoria[categoria] += total
+    return {
+        'total_denuncias': sum(por_status.values()),
+        'status_counts': dict(por_status.most_common()),
+        'categoria_counts': dict(por_categoria.most_common()),
+        'status_categoria_counts': matriz,
+    }
+
+
+def calcular_matriz(queryset):
+    """Matriz {status: {categoria_id: total}} do queryset, em uma consulta."""
+    linhas = queryset.order_by().values('status', 'categoria_id').annotate(total=Count('id'))
+
+    matriz = {}
+    for linha in linhas:
+        matriz.setdefault(linha['status'], {})[linha['categoria_id']] = linha['total']
+    return matriz
+
+
+def somar_matrizes(matrizes):
+    """Soma matrizes de jurisdições diferentes em uma só."""
+    soma = {}
+    for matriz in matrizes:
+        for status, categorias in matriz.items():
+            linha = soma.setdefault(status, {})
+            for categoria_id, total in categorias.items():
+                linha[categoria_id] = linha.get(categoria_id, 0) + total
+    return soma
+
+
+def matriz_da_jurisdicao(jurisdicao, cidade_id, estado_id, inicio=None, fim=None, categoria_id=None):
+    """Matriz das denúncias de uma jurisdição (uma cidade ou um estado), do cache quando possível."""
+    def calcular():
+        if jurisdicao == Denuncia.Jurisdicao.MUNICIPAL:
+            queryset = Denuncia.objects.filter(cidade_id=cidade_id, jurisdicao=jurisdicao)
+        else:
+            queryset = Denuncia.objects.filter(estado_id=estado_id, jurisdicao=jurisdicao)
+        if inicio:
+            queryset = queryset.filter(data_criacao__gte=inicio)
+        if fim:
+            queryset = queryset.filter(data_criacao__lte=fim)
+        if categoria_id:
+            queryset = queryset.filter(categoria_id=categoria_id)
+        return calcular_matriz(queryset)
+
+    grupo = grupo_da_jurisdicao(jurisdicao, cidade_id, estado_id)
+    chave = (inicio.isoformat() if inicio else None, fim.isoformat() if fim else None, categoria_id)
+    return cache_compartilhado.obter_ou_calcular(grupo, chave, calcular)
+
+
+def resumo_do_escopo(escopo, inicio=None, fim=None, categoria_id=None):
+    """Resumo do dashboard de todas as jurisdições do escopo do gestor (ver escopo.py)."""
+    matrizes = [
+        matriz_da_jurisdicao(Denuncia.Jurisdicao.MUNICIPAL, cidade_id, None, inicio, fim, categoria_id)
+        for cidade_id in sorted(escopo.cidades)
+    ] + [
+        matriz_da_jurisdicao(Denuncia.Jurisdicao.ESTADUAL, None, estado_id, inicio, fim, categoria_id)
+        for estado_id in sorted(escopo.estados)
+    ]
+    return _resumo_da_matriz(somar_matrizes(matrizes))
@@ -0,0 +1,112 @@
+"""
+Agregação do mapa de calor do dashboard em células de uma grade Web Mercator.
+
+No zoom z a grade tem CELULAS_POR_TILE * 2^z células por eixo (células de
+8px em tiles de 256px). Cada célula vira um ponto no centro de massa das
+suas denúncias, com o peso somado; o peso de uma denúncia é 1 + total_apoios
+(o contador mantido pelos signals de ApoioDenuncia), sem JOIN com os apoios.
+
+As coordenadas são lidas do banco em lotes. Com NumPy instalado a projeção
+e o agrupamento de cada lote são vetorizados; sem ele, usa-se Python puro.
+"""
+from math import floor
+
+from django.db.models import F, FloatField
+from django.db.models.functions import Cast
+
+from applications.denuncias.distancias import np
+from applications.denuncias.mapa import LATITUDE_MAXIMA, projetar
+
+CELULAS_POR_TILE = 32
+TAMANHO_LOTE = 50_000
+CASAS_DECIMAIS = 5
+
+
+def celulas_por_eixo(zoom):
+    return CELULAS_POR_TILE << zoom
+
+
+def linhas_do_queryset(queryset, caixa=None):
+    """(latitude, longitude, peso) das denúncias, como float, filtradas pela caixa lon_min,lat_min,lon_max,lat_max."""
+    if caixa is not None:
+        lon_min, lat_min, lon_max, lat_max = caixa
+        queryset = queryset.filter(
+            latitude__gte=lat_min, latitude__lte=lat_max,
+            longitude__gte=lon_min, longitude__lte=lon_max,
+        )
+    return (
+        queryset.order_by()
+        .annotate(lat=Cast('latitude', FloatField()), lon=Cast('longitude', FloatField()), peso=F('total_apoios') + 1)
+        .values_list('lat', 'lon', 'peso')
+        .iterator(chunk_size=10_000)
+    )
+
+
+def _lotes(linhas):
+    lote = []
+    for linha in linhas:
+        lote.append(linha)
+        if len(lote) >= TAMANHO_LOTE:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+
+def _agregar_lote_numpy(lote, n, celulas):
+    dados = np.array(lote, dtype=np.float64)
+    lat, lon, peso = dados[:, 0], dados[:, 1], dados[:, 2]
+
+    # Mesma projeção de mapa.projetar, para todos os pontos de uma vez
+    lat_rad = np.radians(np.clip(lat, -LATITUDE_MAXIMA, LATITUDE_MAXIMA))
+    x = np.clip((lon + 180.0) / 360.0, 0.0, 1.0 - 1e-12)
+    y = np.clip((1.0 - np.log(np.tan(lat_rad) + 1.0 / np.cos(lat_rad)) / np.pi) / 2.0, 0.0, 1.0 - 1e-12)
+    chaves = np.floor(x * n).astype(np.int64) * n + np.floor(y * n).astype(np.int64)
+
+    unicas, inverso = np.unique(chaves, return_inverse=True)
+    pesos = np.bincount(inverso, weights=peso)
+    somas_lat = np.bincount(inverso, weights=lat * peso)
+    somas_lon = np.bincount(inverso, weights=lon * peso)
+    for chave, soma_peso, soma_lat, soma_lon in zip(unicas.tolist(), pesos.tolist(), somas_lat.tolist(), somas_lon.tolist()):
+        celula = celulas.get(chave)
+        if celula is None:
+            celulas[chave] = [soma_peso, soma_lat, soma_lon]
+        else:
+            celula[0] += soma_peso
+            celula[1] += soma_lat
+            celula[2] += soma_lon
+
+
+def _agregar_lote_python(lote, n, celulas):
+    for lat, lon, peso in lote:
+        x, y = projetar(lat, lon)
+        chave = floor(x * n) * n + floor(y * n)
+        celula = celulas.get(chave)
+        if celula is None:
+            celulas[chave] = [peso, lat * peso, lon * peso]
+        else:
+            celula[0] += peso
+            celula[1] += lat * peso
+            celula[2] += lon * peso
+
+
+def agregar(linhas, zoom):
+    """Retorna [[latitude, longitude, peso]] de cada célula com denúncias no zoom informado."""
+    n = celulas_por_eixo(zoom)
+    agregar_lote = _agregar_lote_numpy if np is not None else _agregar_lote_python
+    celulas = {}
+    for lote in _lotes(linhas):
+        agregar_lote(lote, n, celulas)
+    return [
+        [round(soma_lat / peso, CASAS_DECIMAIS), round(soma_lon / peso, CASAS_DECIMAIS), int(peso)]
+        for peso, soma_lat, soma_lon in celulas.values()
+    ]
+
+
+def json_em_partes(zoom, celulas, por_parte=2000):
+    """Serializa {"zoom": z, "celulas": [[lat, lon, peso], ...]} aos pedaços, para uma resposta em streaming."""
+    yield f'{{"zoom":{zoom},"celulas":['
+    for inicio in range(0, len(celulas), por_parte):
+        parte = ','.join(f'[{lat},{lon},{peso}]' for lat, lon, peso in celulas[inicio:inicio + por_parte])
+        yield (',' if inicio else '') + parte
+    yield ']}'
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from applications.gestao_publica.resumos import reconstruir
+
+class Command(BaseCommand):
+    help = 'Recalcula os resumos diários de denúncias usados nos gráficos por período do dashboard.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Apenas informa quantos resumos estão divergentes.',
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        self.stdout.write(self.style.SUCCESS('Calculando os resumos diários a partir das denúncias...'))
+
+        calculados, divergentes = reconstruir(dry_run=dry_run)
+
+        if not divergentes:
+            self.stdout.write(self.style.SUCCESS(f'Todos os {calculados} resumo(s) estão corretos.'))
+        elif dry_run:
+            self.stdout.write(self.style.WARNING(f'{divergentes} resumo(s) divergente(s) ou faltando.'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'{divergentes} resumo(s) corrigido(s); {calculados} no total.'))
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:07
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+
+
+def preencher_resumos(apps, schema_editor):
+    """
+    Calcula os resumos diários das denúncias já existentes.
+    """
+    Denuncia = apps.get_model('denuncias', 'Denuncia')
+    ResumoDiario = apps.get_model('gestao_publica', 'ResumoDiario')
+    campos = ('cidade_id', 'estado_id', 'jurisdicao', 'categoria_id', 'status')
+    linhas = (
+        Denuncia.objects.order_by()
+        .annotate(dia=TruncDate('data_criacao'))
+        .values(*campos, 'dia')
+        .annotate(total=Count('id'))
+    )
+    ResumoDiario.objects.bulk_create(
+        (ResumoDiario(total=linha.pop('total'), **linha) for linha in linhas.iterator()),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('denuncias', '0014_uploadparcial'),
+        ('gestao_publica', '0001_initial'),
+        ('localidades', '0003_cidade_centroide'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumoDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('jurisdicao', models.CharField(choices=[('MUNICIPAL', 'Municipal'), ('ESTADUAL', 'Estadual'), ('FEDERAL', 'Federal'), ('PRIVADO', 'Privado')], max_length=20)),
+                ('status', models.CharField(choices=[('ABERTA', 'Aberta'), ('EM_ANALISE', 'Em Análise'), ('RESOLVIDA', 'Resolvida')], max_length=20)),
+                ('dia', models.DateField()),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('categoria', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='denuncias.categoria')),
+                ('cidade', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='localidades.cidade')),
+                ('estado', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='localidades.estado')),
+            ],
+            options={
+                'verbose_name': 'Resumo Diário',
+                'verbose_name_plural': 'Resumos Diários',
+                'indexes': [models.Index(fields=['cidade', 'jurisdicao', 'dia'], name='resumo_cidade_dia_idx'), models.Index(fields=['estado', 'jurisdicao', 'dia'], name='resumo_estado_dia_idx')],
+                'constraints': [models.UniqueConstraint(fields=('cidade', 'estado', 'jurisdicao', 'categoria', 'status', 'dia'), name='resumo_diario_unico')],
+            },
+        ),
+        migrations.RunPython(preencher_resumos, reverse_code=migrations.RunPython.noop),
+    ]
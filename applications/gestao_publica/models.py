@@ -53,4 +53,35 @@ class OfficialResponse(models.Model):
         ordering = ['-data_resposta']
 
     def __str__(self):
-        return f'Resposta para "{self.denuncia.titulo}"'
\ No newline at end of file
+        return f'Resposta para "{self.denuncia.titulo}"'
+
+class ResumoDiario(models.Model):
+    """
+    Quantas denúncias foram criadas em um dia, por localidade, jurisdição,
+    categoria e status atual. Mantido pelos signals de Denuncia (ver resumos.py).
+    """
+    cidade = models.ForeignKey(Cidade, on_delete=models.CASCADE, related_name='+')
+    estado = models.ForeignKey(Estado, on_delete=models.CASCADE, related_name='+')
+    jurisdicao = models.CharField(max_length=20, choices=Denuncia.Jurisdicao.choices)
+    categoria = models.ForeignKey('denuncias.Categoria', on_delete=models.CASCADE, related_name='+')
+    status = models.CharField(max_length=20, choices=Denuncia.Status.choices)
+    dia = models.DateField()
+    total = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = _('Resumo Diário')
+        verbose_name_plural = _('Resumos Diários')
+        constraints = [
+            models.UniqueConstraint(
+                fields=['cidade', 'estado', 'jurisdicao', 'categoria', 'status', 'dia'],
+                name='resumo_diario_unico',
+            )
+        ]
+        indexes = [
+            # Consultas do dashboard: uma jurisdição em um intervalo de dias
+            models.Index(fields=['cidade', 'jurisdicao', 'dia'], name='resumo_cidade_dia_idx'),
+            models.Index(fields=['estado', 'jurisdicao', 'dia'], name='resumo_estado_dia_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.dia}: {self.total}'
@@ -1,5 +1,6 @@
 from rest_framework import permissions
 from applications.denuncias.models import Denuncia
+from .escopo import escopo_da_requisicao
 
 class IsGestorWithJurisdiction(permissions.BasePermission):
     """
@@ -19,16 +20,5 @@ class IsGestorWithJurisdiction(permissions.BasePermission):
         if not hasattr(user, 'tipo_usuario') or user.tipo_usuario != 'GESTOR_PUBLICO':
             return False
 
-        # Obtém a primeira entidade gerenciada pelo gestor
-        entidade_gerenciada = user.entidades_gerenciadas.first()
-        if not entidade_gerenciada:
-            return False
-
-        # Compara a jurisdição da denúncia com a da entidade do gestor
-        if entidade_gerenciada.cidade:
-            return obj.cidade == entidade_gerenciada.cidade and obj.jurisdicao == Denuncia.Jurisdicao.MUNICIPAL
-        
-        if entidade_gerenciada.estado:
-            return obj.estado == entidade_gerenciada.estado and obj.jurisdicao == Denuncia.Jurisdicao.ESTADUAL
-
-        return False
+        # Compara a jurisdição da denúncia com as das entidades do gestor, sem consultar o banco
+        return obj in escopo_da_requisicao(request)
@@ -0,0 +1,156 @@
+"""
+Séries de denúncias por período a partir dos resumos diários.
+
+ResumoDiario guarda, por (cidade, estado, jurisdição, categoria, status, dia),
+quantas denúncias foram criadas naquele dia. Os signals de Denuncia mantêm a
+tabela na mesma transação da escrita: +1 na criação, -1 na remoção e -1/+1
+quando algum campo da chave muda (ex.: o status). Escritas que não disparam
+signals (update(), bulk_create()) exigem o comando reconstruir_resumos.
+
+Semana, mês, trimestre e ano são somados em Python a partir dos dias, e os
+períodos sem denúncias entram na série com total 0. Como nenhuma denúncia é
+criada no futuro, o fim do intervalo é limitado a hoje, e séries com mais de
+MAXIMO_PERIODOS períodos são recusadas com IntervaloMuitoLongo.
+"""
+from datetime import date, timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from applications.denuncias.models import Denuncia
+from .models import ResumoDiario
+
+CAMPOS_CHAVE = ('cidade_id', 'estado_id', 'jurisdicao', 'categoria_id', 'status')
+PERIODOS = ('dia', 'semana', 'mes', 'trimestre', 'ano')
+# Cerca de 10 anos de série diária
+MAXIMO_PERIODOS = 3660
+
+
+class IntervaloMuitoLongo(ValueError):
+    """O intervalo pedido tem mais períodos do que MAXIMO_PERIODOS."""
+
+
+def _inicio_do_periodo(dia, periodo):
+    if periodo == 'semana':
+        return dia - timedelta(days=dia.weekday())
+    if periodo == 'mes':
+        return dia.replace(day=1)
+    if periodo == 'trimestre':
+        return dia.replace(month=(dia.month - 1) // 3 * 3 + 1, day=1)
+    if periodo == 'ano':
+        return dia.replace(month=1, day=1)
+    return dia
+
+
+def _proximo_periodo(inicio, periodo):
+    if periodo == 'dia':
+        return inicio + timedelta(days=1)
+    if periodo == 'semana':
+        return inicio + timedelta(days=7)
+    meses = {'mes': 1, 'trimestre': 3, 'ano': 12}[periodo]
+    mes = inicio.month - 1 + meses
+    return date(inicio.year + mes // 12, mes % 12 + 1, 1)
+
+
+def contar_periodos(inicio, fim, periodo):
+    """Quantos períodos há entre os inícios de período `inicio` e `fim`, inclusive."""
+    if fim < inicio:
+        return 0
+    if periodo == 'dia':
+        return (fim - inicio).days + 1
+    if periodo == 'semana':
+        return (fim - inicio).days // 7 + 1
+    meses = (fim.year - inicio.year) * 12 + fim.month - inicio.month
+    return meses // {'mes': 1, 'trimestre': 3, 'ano': 12}[periodo] + 1
+
+
+def chave_da_denuncia(denuncia):
+    """Chave do resumo diário da denúncia, ou None se ela ainda não foi gravada."""
+    # Lê do __dict__ para não disparar consultas de campos adiados (.only/.defer)
+    valores = denuncia.__dict__
+    if valores.get('data_criacao') is None or any(valores.get(campo) is None for campo in CAMPOS_CHAVE):
+        return None
+    return (*(valores[campo] for campo in CAMPOS_CHAVE), timezone.localdate(valores['data_criacao']))
+
+
+def registrar(chave, quantidade):
+    """Soma `quantidade` (positiva ou negativa) ao resumo da chave."""
+    if chave is None or not quantidade:
+        return
+    filtro = dict(zip(CAMPOS_CHAVE + ('dia',), chave))
+    resumos = ResumoDiario.objects.filter(**filtro)
+    if quantidade < 0:
+        resumos.filter(total__gte=-quantidade).update(total=F('total') + quantidade)
+        resumos.filter(total=0).delete()
+        return
+    if resumos.update(total=F('total') + quantidade):
+        return
+    try:
+        with transaction.atomic():
+            ResumoDiario.objects.create(total=quantidade, **filtro)
+    except IntegrityError:
+        resumos.update(total=F('total') + quantidade)
+
+
+def reconstruir(dry_run=False):
+    """
+    Recalcula todos os resumos diários a partir das denúncias.
+    Retorna (resumos calculados, resumos que estavam diferentes ou faltando).
+    """
+    linhas = (
+        Denuncia.objects.order_by()
+        .annotate(dia=TruncDate('data_criacao'))
+        .values(*CAMPOS_CHAVE, 'dia')
+        .annotate(total=Count('id'))
+    )
+    calculados = {tuple(linha[campo] for campo in CAMPOS_CHAVE + ('dia',)): linha['total'] for linha in linhas}
+    atuais = {
+        tuple(linha[:-1]): linha[-1]
+        for linha in ResumoDiario.objects.values_list(*CAMPOS_CHAVE, 'dia', 'total').iterator()
+    }
+    divergentes = sum(1 for chave in calculados.keys() | atuais.keys() if calculados.get(chave) != atuais.get(chave))
+
+    if not dry_run and divergentes:
+        with transaction.atomic():
+            ResumoDiario.objects.all().delete()
+            ResumoDiario.objects.bulk_create(
+                (ResumoDiario(total=total, **dict(zip(CAMPOS_CHAVE + ('dia',), chave))) for chave, total in calculados.items()),
+                batch_size=1000,
+            )
+    return len(calculados), divergentes
+
+
+def serie_por_periodo(resumos, periodo, inicio=None, fim=None):
+    """
+    Soma os resumos diários (um queryset de ResumoDiario já filtrado pela
+    jurisdição) por período, entre as datas `inicio` e `fim` inclusive.
+    Retorna [(início do período, total)], com os períodos vazios preenchidos.
+    Levanta IntervaloMuitoLongo se a série passaria de MAXIMO_PERIODOS períodos.
+    """
+    hoje = timezone.localdate()
+    if fim and fim > hoje:
+        fim = hoje
+    if inicio:
+        resumos = resumos.filter(dia__gte=inicio)
+    if fim:
+        resumos = resumos.filter(dia__lte=fim)
+    por_dia = resumos.order_by('dia').values_list('dia').annotate(total=Sum('total'))
+
+    totais = {}
+    for dia, total in por_dia:
+        chave = _inicio_do_periodo(dia, periodo)
+        totais[chave] = totais.get(chave, 0) + total
+    if not totais and not (inicio and fim):
+        return []
+
+    atual = _inicio_do_periodo(inicio or min(totais), periodo)
+    ultimo = _inicio_do_periodo(fim or max(totais), periodo)
+    if contar_periodos(atual, ultimo, periodo) > MAXIMO_PERIODOS:
+        raise IntervaloMuitoLongo(f'O intervalo tem mais de {MAXIMO_PERIODOS} períodos.')
+    serie = []
+    while atual <= ultimo:
+        serie.append((atual, totais.get(atual, 0)))
+        atual = _proximo_periodo(atual, periodo)
+    return serie
@@ -0,0 +1,70 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_init, post_save, post_delete
+from django.dispatch import receiver
+
+from applications.core import cache as cache_compartilhado
+from applications.denuncias.models import Denuncia
+from . import resumos
+from .escopo import GRUPO_CACHE as GRUPO_ESCOPOS
+from .estatisticas import grupo_da_jurisdicao
+from .models import OfficialEntity
+
+# Campos que mudam os números do dashboard
+CAMPOS_DASHBOARD = ('jurisdicao', 'cidade_id', 'estado_id', 'status', 'categoria_id')
+
+
+def _estado_dashboard(denuncia):
+    # Lê do __dict__ para não disparar consultas de campos adiados (.only/.defer)
+    return tuple(denuncia.__dict__.get(campo) for campo in CAMPOS_DASHBOARD)
+
+
+def _invalidar_dashboards(*estados):
+    grupos = {grupo_da_jurisdicao(*estado[:3]) for estado in estados} - {None}
+
+    def invalidar():
+        for grupo in grupos:
+            cache_compartilhado.invalidar(grupo)
+    if grupos:
+        transaction.on_commit(invalidar)
+
+
+@receiver(post_init, sender=Denuncia)
+def guardar_estado_dashboard(sender, instance, **kwargs):
+    instance._estado_dashboard = _estado_dashboard(instance)
+    instance._chave_resumo = resumos.chave_da_denuncia(instance)
+
+
+@receiver(post_save, sender=Denuncia)
+def atualizar_dashboard_denuncia_salva(sender, instance, created, **kwargs):
+    """
+    Atualiza os resumos diários e descarta os resumos em cache da jurisdição
+    quando uma denúncia é criada ou muda de status, categoria ou local.
+    """
+    anterior, atual = instance._estado_dashboard, _estado_dashboard(instance)
+    if created or anterior != atual:
+        _invalidar_dashboards(anterior, atual)
+    instance._estado_dashboard = atual
+
+    chave_anterior, chave_atual = instance._chave_resumo, resumos.chave_da_denuncia(instance)
+    if created:
+        resumos.registrar(chave_atual, 1)
+    elif chave_anterior != chave_atual and chave_anterior is not None:
+        resumos.registrar(chave_anterior, -1)
+        resumos.registrar(chave_atual, 1)
+    instance._chave_resumo = chave_atual
+
+
+@receiver(post_delete, sender=Denuncia)
+def atualizar_dashboard_denuncia_removida(sender, instance, **kwargs):
+    _invalidar_dashboards(_estado_dashboard(instance))
+    resumos.registrar(resumos.chave_da_denuncia(instance), -1)
+
+
+# Escopos dos gestores (ver escopo.py): mudam com a cidade/estado das entidades e com os seus gestores
+cache_compartilhado.invalidar_ao_alterar(GRUPO_ESCOPOS, OfficialEntity)
+
+
+@receiver(m2m_changed, sender=OfficialEntity.gestores.through)
+def invalidar_escopos(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        transaction.on_commit(lambda: cache_compartilhado.invalidar(GRUPO_ESCOPOS))
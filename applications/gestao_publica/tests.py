@@ -1,3 +1,274 @@
-from django.test import TestCase
+from datetime import date, timedelta
+import json
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from applications.core.models import User
+from applications.denuncias.models import Denuncia, Categoria
+from applications.localidades.models import Estado, Cidade
+from . import heatmap
+from .escopo import escopo_do_usuario
+from .models import OfficialEntity, OfficialResponse, ResumoDiario
+from .resumos import serie_por_periodo
+
+
+class GestorTestCase(APITestCase):
+    """
+    Gestor de uma prefeitura autenticado e denúncias dentro e fora da jurisdição dele.
+    """
+    def setUp(self):
+        cache.clear()
+        self.estado = Estado.objects.get(uf='SC')
+        self.cidade = Cidade.objects.create(nome='Cidade Dashboard', estado=self.estado)
+        outra_cidade = Cidade.objects.create(nome='Outra Cidade', estado=self.estado)
+        self.buraco = Categoria.objects.create(nome='Buraco')
+        self.lixo = Categoria.objects.create(nome='Lixo')
+
+        self.gestor = User.objects.create_user(
+            username='gestor', email='gestor@example.com', password='password123',
+            first_name='Gestor', tipo_usuario=User.TipoUsuario.GESTOR_PUBLICO,
+        )
+        self.entidade = OfficialEntity.objects.create(nome='Prefeitura', cidade=self.cidade)
+        self.entidade.gestores.add(self.gestor)
+        self.client.force_authenticate(self.gestor)
+
+        self.criar(self.buraco)
+        self.criar(self.buraco, status=Denuncia.Status.RESOLVIDA)
+        self.criar(self.lixo)
+        # Fora da jurisdição da prefeitura
+        self.criar(self.lixo, cidade=outra_cidade)
+        self.criar(self.lixo, jurisdicao='ESTADUAL')
+
+    def criar(self, categoria, cidade=None, jurisdicao='MUNICIPAL', status=Denuncia.Status.ABERTA):
+        return Denuncia.objects.create(
+            titulo='Denúncia', descricao='Dashboard', autor_convidado='Teste',
+            categoria=categoria, cidade=cidade or self.cidade, estado=self.estado,
+            latitude=-26.3045, longitude=-48.8487, jurisdicao=jurisdicao, status=status,
+            foto='denuncias_fotos/test.png',
+        )
+
+
+
+class DashboardTests(GestorTestCase):
+    """
+    Testes do resumo do dashboard do gestor público.
+    """
+    def setUp(self):
+        super().setUp()
+        self.url = reverse('gestao_publica:dashboard')
+
+    def test_resumo_em_uma_consulta(self):
+        # Entidade do gestor + a agregação + os nomes das categorias
+        with self.assertNumQueries(3):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['total_denuncias'], 3)
+        self.assertEqual(response.data['status_counts'], {'ABERTA': 2, 'RESOLVIDA': 1})
+        self.assertEqual(response.data['categoria_counts'], {'Buraco': 2, 'Lixo': 1})
+        self.assertEqual(response.data['status_categoria_counts'], {
+            'ABERTA': {'Buraco': 1, 'Lixo': 1},
+            'RESOLVIDA': {'Buraco': 1},
+        })
+
+    def test_filtros(self):
+        response = self.client.get(self.url, {'categoria': self.lixo.pk})
+        self.assertEqual(response.data['total_denuncias'], 1)
+        response = self.client.get(self.url, {'start_date': '2999-01-01'})
+        self.assertEqual(response.data['total_denuncias'], 0)
+        self.assertEqual(self.client.get(self.url, {'start_date': 'ontem'}).status_code, 400)
+
+    def test_cache_invalidado_por_nova_denuncia_e_mudanca_de_status(self):
+        self.client.get(self.url)
+        # Escopo do gestor e resumo vêm do cache
+        with self.assertNumQueries(0):
+            self.client.get(self.url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            denuncia = self.criar(self.lixo)
+        self.assertEqual(self.client.get(self.url).data['total_denuncias'], 4)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            denuncia.status = Denuncia.Status.EM_ANALISE
+            denuncia.save()
+        self.assertEqual(self.client.get(self.url).data['status_counts']['EM_ANALISE'], 1)
+
+    def test_renomear_categoria_atualiza_o_dashboard(self):
+        self.client.get(self.url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.lixo.nome = 'Entulho'
+            self.lixo.save()
+        # A matriz da jurisdição continua em cache: só os nomes são lidos de novo
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+        self.assertEqual(response.data['categoria_counts'], {'Buraco': 2, 'Entulho': 1})
+        self.assertEqual(response.data['status_categoria_counts']['ABERTA'], {'Buraco': 1, 'Entulho': 1})
+
+    def test_apenas_gestores(self):
+        cidadao = User.objects.create_user(username='cidadao', email='c@example.com', password='password123', first_name='C')
+        self.client.force_authenticate(cidadao)
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+
+class DenunciasPorPeriodoTests(GestorTestCase):
+    """
+    Testes da série por período lida dos resumos diários.
+    """
+    def setUp(self):
+        super().setUp()
+        self.url = reverse('gestao_publica:dashboard-denuncias-por-periodo')
+        self.hoje = timezone.localdate()
+
+    def test_resumos_mantidos_pelos_signals(self):
+        resumos = ResumoDiario.objects.filter(cidade=self.cidade, jurisdicao='MUNICIPAL')
+        self.assertEqual(sum(resumos.values_list('total', flat=True)), 3)
+
+        denuncia = self.criar(self.lixo)
+        denuncia.status = Denuncia.Status.RESOLVIDA
+        denuncia.save()
+        self.assertEqual(resumos.get(categoria=self.lixo, status='RESOLVIDA').total, 1)
+        self.assertEqual(resumos.get(categoria=self.lixo, status='ABERTA').total, 1)
+
+        denuncia.delete()
+        self.assertFalse(resumos.filter(categoria=self.lixo, status='RESOLVIDA').exists())
+
+    def test_serie_com_periodos_vazios(self):
+        inicio = self.hoje - timedelta(days=3)
+        response = self.client.get(self.url, {'start_date': inicio.isoformat(), 'end_date': self.hoje.isoformat()})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, [
+            {'data': (inicio + timedelta(days=i)).isoformat(), 'total': 0} for i in range(3)
+        ] + [{'data': self.hoje.isoformat(), 'total': 3}])
+
+    def test_agrupamentos_a_partir_dos_dias(self):
+        resumos = ResumoDiario.objects.all()
+        ResumoDiario.objects.create(
+            cidade=self.cidade, estado=self.estado, jurisdicao='MUNICIPAL', categoria=self.buraco,
+            status='ABERTA', dia=date(2025, 2, 10), total=5,
+        )
+        self.assertEqual(
+            serie_por_periodo(resumos, 'mes', date(2025, 1, 1), date(2025, 3, 31)),
+            [(date(2025, 1, 1), 0), (date(2025, 2, 1), 5), (date(2025, 3, 1), 0)],
+        )
+        self.assertEqual(
+            serie_por_periodo(resumos, 'semana', date(2025, 2, 9), date(2025, 2, 16)),
+            [(date(2025, 2, 3), 0), (date(2025, 2, 10), 5)],
+        )
+        self.assertEqual(serie_por_periodo(resumos, 'trimestre', date(2025, 1, 1), date(2025, 6, 30)),
+                         [(date(2025, 1, 1), 5), (date(2025, 4, 1), 0)])
+
+    def test_intervalos_extremos(self):
+        # O fim é limitado a hoje: não estoura no ano 9999 nem preenche períodos futuros
+        for periodo in ('dia', 'mes', 'trimestre', 'ano'):
+            response = self.client.get(self.url, {'periodo': periodo, 'start_date': self.hoje.isoformat(), 'end_date': '9999-12-31'})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.data[-1]['total'], 3)
+        self.assertEqual(
+            self.client.get(self.url, {'start_date': '0001-01-01T00:00:00+03:00'}).status_code, 400
+        )
+
+    def test_intervalo_muito_longo(self):
+        response = self.client.get(self.url, {'periodo': 'dia', 'start_date': '0001-01-01', 'end_date': '9000-01-01'})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(self.url, {'periodo': 'ano', 'start_date': '0001-01-01', 'end_date': '9000-01-01'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), self.hoje.year)
+
+    def test_reconstruir_resumos(self):
+        Denuncia.objects.filter(cidade=self.cidade).update(status=Denuncia.Status.EM_ANALISE)
+        call_command('reconstruir_resumos', stdout=StringIO())
+        resumos = ResumoDiario.objects.filter(cidade=self.cidade, jurisdicao='MUNICIPAL')
+        self.assertEqual(set(resumos.values_list('status', flat=True)), {'EM_ANALISE'})
+        self.assertEqual(sum(resumos.values_list('total', flat=True)), 3)
+
+
+class HeatmapTests(GestorTestCase):
+    """
+    Testes do mapa de calor agregado em células.
+    """
+    def setUp(self):
+        super().setUp()
+        self.url = reverse('gestao_publica:dashboard-heatmap')
+        # Longe das outras, na mesma cidade
+        self.distante = self.criar(self.buraco)
+        Denuncia.objects.filter(pk=self.distante.pk).update(latitude=-26.2, longitude=-48.7, total_apoios=4)
+
+    def celulas(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return json.loads(b''.join(response.streaming_content))['celulas']
+
+    def test_agrega_por_celula_com_peso_dos_apoios(self):
+        self.assertEqual(sorted(self.celulas(zoom=12)), [[-26.3045, -48.8487, 3], [-26.2, -48.7, 5]])
+        self.assertEqual(self.celulas(zoom=2), [[-26.23919, -48.75576, 8]])
+
+    def test_bbox(self):
+        self.assertEqual(self.celulas(zoom=12, bbox='-48.75,-26.25,-48.65,-26.15'), [[-26.2, -48.7, 5]])
+        self.assertEqual(self.client.get(self.url, {'bbox': '1,2'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'bbox': 'nan,-27,-46,-23'}).status_code, 400)
+
+    def test_sem_numpy(self):
+        linhas = list(heatmap.linhas_do_queryset(Denuncia.objects.all()))
+        with mock.patch.object(heatmap, 'np', None):
+            sem_numpy = heatmap.agregar(linhas, 12)
+        self.assertEqual(sorted(sem_numpy), sorted(heatmap.agregar(linhas, 12)))
+
+
+class EscopoJurisdicaoTests(GestorTestCase):
+    """
+    Testes do escopo de jurisdição de gestores com uma ou mais entidades.
+    """
+    def setUp(self):
+        super().setUp()
+        # O gestor também responde pelo governo do estado
+        with self.captureOnCommitCallbacks(execute=True):
+            self.governo = OfficialEntity.objects.create(nome='Governo', estado=self.estado)
+            self.governo.gestores.add(self.gestor)
+
+    def test_varias_entidades(self):
+        escopo = escopo_do_usuario(self.gestor)
+        self.assertEqual(escopo.entidades, [self.entidade.pk, self.governo.pk])
+        self.assertEqual(Denuncia.objects.filter(escopo.q()).count(), 4)
+
+        estadual = Denuncia.objects.get(jurisdicao='ESTADUAL')
+        self.assertIn(estadual, escopo)
+        self.assertEqual(escopo.entidade_da_denuncia(estadual), self.governo.pk)
+        self.assertNotIn(Denuncia.objects.exclude(cidade=self.cidade).get(), escopo)
+
+        response = self.client.get(reverse('gestao_publica:dashboard'))
+        self.assertEqual(response.data['total_denuncias'], 4)
+        self.assertEqual(response.data['categoria_counts'], {'Lixo': 2, 'Buraco': 2})
+
+    def test_escopo_em_cache_invalidado_ao_mudar_gestores(self):
+        escopo_do_usuario(self.gestor)
+        with self.assertNumQueries(0):
+            escopo_do_usuario(self.gestor)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.governo.gestores.remove(self.gestor)
+        self.assertEqual(escopo_do_usuario(self.gestor).entidades, [self.entidade.pk])
+
+    def test_resposta_em_nome_da_entidade_da_jurisdicao(self):
+        estadual = Denuncia.objects.get(jurisdicao='ESTADUAL')
+        response = self.client.post(reverse('gestao_publica:respostas-list'), {'denuncia': estadual.pk, 'texto': 'Em análise.'})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(OfficialResponse.objects.get(denuncia=estadual).entidade, self.governo)
+
+        fora = Denuncia.objects.exclude(cidade=self.cidade).get()
+        response = self.client.post(reverse('gestao_publica:respostas-list'), {'denuncia': fora.pk, 'texto': 'Em análise.'})
+        self.assertEqual(response.status_code, 403)
+
+    def test_mudar_status_apenas_na_jurisdicao(self):
+        estadual = Denuncia.objects.get(jurisdicao='ESTADUAL')
+        url = reverse('denuncia-change-status', args=[estadual.pk])
+        self.assertEqual(self.client.post(url, {'status': 'EM_ANALISE'}).status_code, 200)
+
+        fora = Denuncia.objects.exclude(cidade=self.cidade).get()
+        url = reverse('denuncia-change-status', args=[fora.pk])
+        self.assertEqual(self.client.post(url, {'status': 'EM_ANALISE'}).status_code, 403)
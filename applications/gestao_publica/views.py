@@ -1,46 +1,50 @@
 from rest_framework import viewsets, permissions, mixins, serializers, status
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from django.db.models import Q, Count, F
-from django.db.models.functions import TruncDay, TruncWeek, TruncMonth, TruncQuarter, TruncYear
+from django.http import StreamingHttpResponse
 from datetime import datetime
+from math import isfinite
+from django.utils import timezone
 
+from applications.core.pagination import KeysetPagination
 from applications.denuncias.models import Denuncia
 from applications.denuncias.serializers import DenunciaSerializer
+from .escopo import escopo_da_requisicao
+from .estatisticas import resumo_do_escopo
 from .serializers import OfficialResponseSerializer
-from .models import OfficialResponse
+from .models import OfficialResponse, ResumoDiario
+from .resumos import MAXIMO_PERIODOS, PERIODOS, IntervaloMuitoLongo, serie_por_periodo
+from . import heatmap
+
+ZOOM_PADRAO_HEATMAP = 10
+
+
+def _ler_data(valor):
+    """Converte um parâmetro ISO 8601 em datetime; levanta ValueError se for inválido."""
+    if not valor:
+        return None
+    data = datetime.fromisoformat(valor)
+    data = timezone.make_aware(data) if timezone.is_naive(data) else data
+    try:
+        # Datas nos extremos (ex.: 0001-01-01 com fuso +03:00) não existem no fuso local
+        timezone.localtime(data)
+    except OverflowError:
+        raise ValueError(f'Data fora do intervalo suportado: {valor}')
+    return data
 
 
 class MinhasDenunciasViewSet(viewsets.ReadOnlyModelViewSet):
     """
     Endpoint da API que retorna as denúncias relevantes para o gestor público logado.
-    Filtra as denúncias com base na entidade governamental associada ao gestor.
+    Filtra as denúncias com base nas entidades governamentais associadas ao gestor.
     """
     serializer_class = DenunciaSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
-        user = self.request.user
-
-        if not hasattr(user, 'tipo_usuario') or user.tipo_usuario != 'GESTOR_PUBLICO':
-            return Denuncia.objects.none()
-
-        entidade_gerenciada = user.entidades_gerenciadas.first()
-        if not entidade_gerenciada:
-            return Denuncia.objects.none()
-
-        if entidade_gerenciada.cidade:
-            return Denuncia.objects.filter(
-                cidade=entidade_gerenciada.cidade,
-                jurisdicao=Denuncia.Jurisdicao.MUNICIPAL
-            )
-        elif entidade_gerenciada.estado:
-            return Denuncia.objects.filter(
-                estado=entidade_gerenciada.estado,
-                jurisdicao=Denuncia.Jurisdicao.ESTADUAL
-            )
-        
-        return Denuncia.objects.none()
+        escopo = escopo_da_requisicao(self.request)
+        return escopo.filtrar(DenunciaSerializer.preparar_queryset(Denuncia.objects.all()))
 
 
 class CanRespondToDenuncia(permissions.BasePermission):
@@ -64,48 +68,39 @@ class CanRespondToDenuncia(permissions.BasePermission):
         if not hasattr(user, 'tipo_usuario') or user.tipo_usuario != 'GESTOR_PUBLICO':
             return False
 
-        entidade_gerenciada = user.entidades_gerenciadas.first()
-        if not entidade_gerenciada:
+        escopo = escopo_da_requisicao(request)
+        if not escopo:
             return False
 
-        denuncias_permitidas = Denuncia.objects.none()
-        if entidade_gerenciada.cidade:
-            denuncias_permitidas = Denuncia.objects.filter(
-                cidade=entidade_gerenciada.cidade,
-                jurisdicao=Denuncia.Jurisdicao.MUNICIPAL
-            )
-        elif entidade_gerenciada.estado:
-            denuncias_permitidas = Denuncia.objects.filter(
-                estado=entidade_gerenciada.estado,
-                jurisdicao=Denuncia.Jurisdicao.ESTADUAL
-            )
-
-        return denuncias_permitidas.filter(pk=denuncia_id).exists()
+        # Guarda a denúncia para perform_create saber qual entidade responde por ela
+        denuncia = Denuncia.objects.only('cidade_id', 'estado_id', 'jurisdicao').filter(pk=denuncia_id).first()
+        if denuncia is None or denuncia not in escopo:
+            return False
+        view.denuncia_respondida = denuncia
+        return True
 
 
 class OfficialResponseViewSet(viewsets.GenericViewSet, mixins.CreateModelMixin, mixins.ListModelMixin, mixins.RetrieveModelMixin):
     """
     ViewSet para criar, listar e ver OfficialResponse.
     - A criação de uma resposta é restrita a gestores da jurisdição correta.
-    - A listagem retorna apenas as respostas da entidade do gestor logado.
+    - A listagem retorna apenas as respostas das entidades do gestor logado.
     """
     serializer_class = OfficialResponseSerializer
     permission_classes = [permissions.IsAuthenticated, CanRespondToDenuncia]
 
     def get_queryset(self):
-        user = self.request.user
-        if hasattr(user, 'tipo_usuario') and user.tipo_usuario == 'GESTOR_PUBLICO':
-            entidade = user.entidades_gerenciadas.first()
-            if entidade:
-                return OfficialResponse.objects.filter(entidade=entidade)
-        return OfficialResponse.objects.none()
+        escopo = escopo_da_requisicao(self.request)
+        return OfficialResponse.objects.filter(entidade_id__in=escopo.entidades)
 
     def perform_create(self, serializer):
-        entidade = self.request.user.entidades_gerenciadas.first()
-        
+        # A resposta sai em nome da entidade com jurisdição sobre a denúncia (ver CanRespondToDenuncia)
+        escopo = escopo_da_requisicao(self.request)
+        entidade = escopo.entidade_da_denuncia(self.denuncia_respondida)
+
         # O modelo já garante que a denúncia só pode ter uma resposta (OneToOneField),
         # então o banco de dados vai gerar um erro de integridade se tentarem criar uma segunda.
-        serializer.save(entidade=entidade)
+        serializer.save(entidade_id=entidade)
 
 
 class DashboardView(APIView):
@@ -123,39 +118,33 @@ class DashboardView(APIView):
                 status=status.HTTP_403_FORBIDDEN
             )
 
-        # Reutiliza a lógica de filtragem do MinhasDenunciasViewSet
-        denuncias_queryset = MinhasDenunciasViewSet().get_queryset(self.request)
-
-        if not denuncias_queryset.exists():
-            return Response({
-                'total_denuncias': 0,
-                'status_counts': {},
-                'categoria_counts': {},
-            })
-
-        # Calcula o total de denúncias
-        total_denuncias = denuncias_queryset.count()
-
-        # Calcula a contagem por status
-        status_counts_query = denuncias_queryset.values('status').annotate(count=Count('status')).order_by('-count')
-        status_counts = {item['status']: item['count'] for item in status_counts_query}
-
-        # Calcula a contagem por categoria
-        categoria_counts_query = denuncias_queryset.values('categoria__nome').annotate(count=Count('categoria__nome')).order_by('-count')
-        categoria_counts = {item['categoria__nome']: item['count'] for item in categoria_counts_query}
-
-        data = {
-            'total_denuncias': total_denuncias,
-            'status_counts': status_counts,
-            'categoria_counts': categoria_counts,
-        }
+        try:
+            inicio = _ler_data(request.query_params.get('start_date'))
+            fim = _ler_data(request.query_params.get('end_date'))
+        except ValueError:
+            return Response(
+                {'error': 'Datas inválidas. Use o formato ISO 8601 (ex: 2025-01-31).'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        categoria = request.query_params.get('categoria')
+        if categoria is not None and not categoria.isdigit():
+            return Response(
+                {'error': 'O parâmetro "categoria" deve ser o id de uma categoria.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
 
+        # Totais, status, categorias e a matriz status x categoria saem de uma única consulta (ver estatisticas.py)
+        data = resumo_do_escopo(
+            escopo_da_requisicao(request), inicio, fim, int(categoria) if categoria is not None else None
+        )
         return Response(data)
 
 
 class DenunciasPorPeriodoView(APIView):
     """
     Endpoint que retorna a contagem de denúncias agrupadas por um período de tempo.
+    Os totais vêm dos resumos diários (ver resumos.py); os períodos sem
+    denúncias aparecem com total 0.
     """
     permission_classes = [permissions.IsAuthenticated]
 
@@ -168,52 +157,43 @@ class DenunciasPorPeriodoView(APIView):
                 status=status.HTTP_403_FORBIDDEN
             )
 
-        # Define os possíveis agrupamentos e suas funções Trunc correspondentes
-        periodo_mapping = {
-            'dia': TruncDay,
-            'semana': TruncWeek,
-            'mes': TruncMonth,
-            'trimestre': TruncQuarter,
-            'ano': TruncYear,
-        }
-
         periodo = request.query_params.get('periodo', 'dia').lower()
-        if periodo not in periodo_mapping:
+        if periodo not in PERIODOS:
             return Response(
-                {'error': f'Valor inválido para "periodo". Opções: {list(periodo_mapping.keys())}'},
+                {'error': f'Valor inválido para "periodo". Opções: {list(PERIODOS)}'},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        # Reutiliza a lógica de filtragem do MinhasDenunciasViewSet
-        base_queryset = MinhasDenunciasViewSet().get_queryset(self.request)
-
-        # Filtra por data, se fornecido
-        start_date_str = request.query_params.get('start_date')
-        end_date_str = request.query_params.get('end_date')
-        if start_date_str:
-            base_queryset = base_queryset.filter(data_criacao__gte=datetime.fromisoformat(start_date_str))
-        if end_date_str:
-            base_queryset = base_queryset.filter(data_criacao__lte=datetime.fromisoformat(end_date_str))
-
-        # Aplica a função de truncagem dinamicamente
-        trunc_function = periodo_mapping[periodo]('data_criacao')
-
-        # Realiza a agregação
-        queryset = (
-            base_queryset
-            .annotate(periodo_agrupado=trunc_function)
-            .values('periodo_agrupado')
-            .annotate(total=Count('id'))
-            .order_by('periodo_agrupado')
-        )
+        try:
+            inicio = _ler_data(request.query_params.get('start_date'))
+            fim = _ler_data(request.query_params.get('end_date'))
+        except ValueError:
+            return Response(
+                {'error': 'Datas inválidas. Use o formato ISO 8601 (ex: 2025-01-31).'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        # Lê os resumos diários (no máximo um por dia e combinação de categoria/status), não as denúncias
+        resumos = escopo_da_requisicao(request).filtrar(ResumoDiario.objects.all())
+        try:
+            serie = serie_por_periodo(
+                resumos, periodo,
+                timezone.localdate(inicio) if inicio else None,
+                timezone.localdate(fim) if fim else None,
+            )
+        except IntervaloMuitoLongo:
+            return Response(
+                {'error': f'Intervalo muito longo: no máximo {MAXIMO_PERIODOS} períodos. Reduza o intervalo ou use um período maior.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
 
         # Formata a saída
         data = [
             {
-                "data": item['periodo_agrupado'].strftime('%Y-%m-%d'), 
-                "total": item['total']
-            } 
-            for item in queryset
+                "data": inicio_periodo.strftime('%Y-%m-%d'),
+                "total": total
+            }
+            for inicio_periodo, total in serie
         ]
         return Response(data)
 
@@ -221,6 +201,10 @@ class DenunciasPorPeriodoView(APIView):
 class HeatmapView(APIView):
     """
     Endpoint que retorna dados para a geração de um mapa de calor.
+
+    As denúncias são agregadas em células da grade do zoom pedido (ver
+    heatmap.py) e a resposta é {"zoom": z, "celulas": [[lat, lon, peso], ...]}.
+    Parâmetros: zoom (0 a 22, padrão 10) e, opcionalmente, bbox=lon_min,lat_min,lon_max,lat_max.
     """
     permission_classes = [permissions.IsAuthenticated]
 
@@ -233,15 +217,31 @@ class HeatmapView(APIView):
                 status=status.HTTP_403_FORBIDDEN
             )
 
-        # Reutiliza a lógica de filtragem do MinhasDenunciasViewSet
-        base_queryset = MinhasDenunciasViewSet().get_queryset(self.request)
-
-        # Anota o peso como 1 (denúncia original) + número de apoios
-        heatmap_data = (
-            base_queryset
-            .annotate(apoios_count=Count('apoios'))
-            .annotate(weight=F('apoios_count') + 1)
-            .values('latitude', 'longitude', 'weight')
-        )
+        try:
+            zoom = int(request.query_params.get('zoom', ZOOM_PADRAO_HEATMAP))
+            if not 0 <= zoom <= 22:
+                raise ValueError
+        except ValueError:
+            return Response(
+                {'error': 'O parâmetro "zoom" deve ser um inteiro entre 0 e 22.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
 
-        return Response(list(heatmap_data))
\ No newline at end of file
+        caixa = None
+        if 'bbox' in request.query_params:
+            try:
+                caixa = [float(valor) for valor in request.query_params['bbox'].split(',')]
+                # float() aceita 'nan' e 'inf'
+                if len(caixa) != 4 or not all(map(isfinite, caixa)) or caixa[0] > caixa[2] or caixa[1] > caixa[3]:
+                    raise ValueError
+            except ValueError:
+                return Response(
+                    {'error': 'O parâmetro "bbox" deve ser lon_min,lat_min,lon_max,lat_max.'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+        base_queryset = escopo_da_requisicao(request).filtrar(Denuncia.objects.all())
+
+        # O peso de cada denúncia é 1 (a denúncia original) + total_apoios
+        celulas = heatmap.agregar(heatmap.linhas_do_queryset(base_queryset, caixa), zoom)
+        return StreamingHttpResponse(heatmap.json_em_partes(zoom, celulas), content_type='application/json')
@@ -0,0 +1,111 @@
+"""
+Índice em memória para o autocompletar de cidades (?q=sao jo&uf=SC).
+
+Os nomes são normalizados (sem acentos, minúsculos, pontuação trocada por
+espaço) e guardados em listas ordenadas; uma busca por prefixo é uma busca
+binária seguida de uma fatia, então o custo não depende de quantas cidades
+começam com o prefixo.
+
+Cada cidade entra em duas listas: a dos nomes completos e a dos nomes a
+partir da segunda palavra em diante ("jose dos pinhais", "dos pinhais",
+"pinhais"). Os resultados do nome completo vêm primeiro, seguidos dos que
+casam no meio do nome, ambos em ordem alfabética. Há um par de listas para
+todas as cidades e outro para cada UF.
+
+O índice é reconstruído na primeira busca depois que a versão do grupo
+"localidades" do cache compartilhado muda (ver signals.py), o que também
+alcança os outros processos do servidor.
+"""
+import re
+import threading
+import unicodedata
+from bisect import bisect_left
+
+from applications.core import cache as cache_compartilhado
+from .models import Cidade
+
+LIMITE_PADRAO = 10
+LIMITE_MAXIMO = 50
+_SEPARADORES = re.compile(r'[^0-9a-z]+')
+
+
+def normalizar(texto):
+    """'São José-d'Oeste' -> 'sao jose d oeste'."""
+    decomposto = unicodedata.normalize('NFKD', texto)
+    sem_acentos = ''.join(c for c in decomposto if not unicodedata.combining(c))
+    return _SEPARADORES.sub(' ', sem_acentos.casefold()).strip()
+
+
+class _Lista:
+    """Chaves normalizadas ordenadas e, na mesma posição, o id da cidade."""
+
+    def __init__(self, entradas):
+        entradas.sort()
+        self.chaves = [chave for chave, _ in entradas]
+        self.ids = [cidade_id for _, cidade_id in entradas]
+
+    def prefixo(self, termo):
+        """Ids das cidades cuja chave começa com o termo, em ordem alfabética."""
+        inicio = bisect_left(self.chaves, termo)
+        for posicao in range(inicio, len(self.chaves)):
+            if not self.chaves[posicao].startswith(termo):
+                return
+            yield self.ids[posicao]
+
+
+class IndiceCidades:
+
+    def __init__(self, cidades):
+        """`cidades`: iterável de (id, nome, estado_id, uf)."""
+        self.cidades = {}
+        nomes, palavras = {None: []}, {None: []}
+        for cidade_id, nome, estado_id, uf in cidades:
+            self.cidades[cidade_id] = {'id': cidade_id, 'nome': nome, 'estado': estado_id}
+            chave = normalizar(nome)
+            uf = uf.upper()
+            for grupo in (None, uf):
+                nomes.setdefault(grupo, []).append((chave, cidade_id))
+                lista = palavras.setdefault(grupo, [])
+                posicao = chave.find(' ')
+                while posicao != -1:
+                    lista.append((chave[posicao + 1:], cidade_id))
+                    posicao = chave.find(' ', posicao + 1)
+
+        self.listas = {grupo: (_Lista(nomes[grupo]), _Lista(palavras[grupo])) for grupo in nomes}
+
+    def buscar(self, termo, uf=None, limite=LIMITE_PADRAO):
+        """Retorna até `limite` cidades cujo nome (ou uma palavra dele) começa com o termo."""
+        termo = normalizar(termo)
+        listas = self.listas.get(uf.upper() if uf else None)
+        if not termo or listas is None:
+            return []
+
+        resultado = []
+        vistos = set()
+        for lista in listas:
+            for cidade_id in lista.prefixo(termo):
+                if cidade_id in vistos:
+                    continue
+                vistos.add(cidade_id)
+                resultado.append(self.cidades[cidade_id])
+                if len(resultado) >= limite:
+                    return resultado
+        return resultado
+
+
+_trava = threading.Lock()
+_indice = None
+_versao = None
+
+
+def obter_indice():
+    """Retorna o índice das cidades, reconstruindo-o se alguma cidade ou estado mudou."""
+    global _indice, _versao
+    versao = cache_compartilhado.versao('localidades')
+    if _indice is not None and _versao == versao:
+        return _indice
+    with _trava:
+        if _indice is None or _versao != versao:
+            _indice = IndiceCidades(Cidade.objects.values_list('id', 'nome', 'estado_id', 'estado__uf').iterator())
+            _versao = versao
+        return _indice
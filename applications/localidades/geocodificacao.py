@@ -0,0 +1,107 @@
+"""
+Geocodificação reversa offline: coordenada -> cidade e estado.
+
+Usa o centroide de cada município (Cidade.latitude/longitude, carregados com
+o comando carregar_centroides) e responde com o município de centroide mais
+próximo. Os centroides ficam em memória em uma grade de células de 1 grau; a
+busca começa na célula do ponto e expande em anéis só enquanto um anel ainda
+puder conter um centroide mais próximo que o melhor encontrado.
+
+O centroide mais próximo é uma aproximação: perto da divisa entre municípios
+de tamanhos muito diferentes a resposta pode ser o vizinho.
+
+O índice é reconstruído sob demanda quando a versão do grupo "localidades"
+do cache compartilhado muda.
+"""
+import threading
+from math import cos, radians, floor, sqrt
+
+from applications.core import cache as cache_compartilhado
+from applications.denuncias.distancias import haversine_distance
+from .models import Cidade
+
+TAMANHO_CELULA_GRAUS = 1.0
+# Acima desta distância do centroide mais próximo o ponto é considerado fora do país
+DISTANCIA_MAXIMA_KM = 200
+KM_POR_GRAU = 111.195
+
+
+class IndiceCentroides:
+
+    def __init__(self, cidades):
+        """`cidades`: iterável de (id, nome, latitude, longitude, estado_id, estado_nome, uf)."""
+        self.celulas = {}
+        self.total = 0
+        for cidade_id, nome, latitude, longitude, estado_id, estado_nome, uf in cidades:
+            latitude, longitude = float(latitude), float(longitude)
+            cidade = {
+                'id': cidade_id, 'nome': nome,
+                'estado_id': estado_id, 'estado': estado_nome, 'uf': uf,
+            }
+            self.celulas.setdefault(self._celula(latitude, longitude), []).append((latitude, longitude, cidade))
+            self.total += 1
+
+    @staticmethod
+    def _celula(latitude, longitude):
+        return floor(latitude / TAMANHO_CELULA_GRAUS), floor(longitude / TAMANHO_CELULA_GRAUS)
+
+    def mais_proxima(self, latitude, longitude, distancia_maxima_km=DISTANCIA_MAXIMA_KM):
+        """
+        Retorna (cidade, distancia_km) do centroide mais próximo, ou None se não
+        houver nenhum a até `distancia_maxima_km`.
+        """
+        latitude, longitude = float(latitude), float(longitude)
+        ci, cj = self._celula(latitude, longitude)
+        # Distância equirretangular em graus de latitude, suficiente para comparar candidatos
+        escala = cos(radians(latitude))
+        limite = distancia_maxima_km / KM_POR_GRAU
+        # Nenhum ponto de um anel r está a menos de (r - 1) células, contando o eixo mais curto
+        lado_minimo = TAMANHO_CELULA_GRAUS * min(1.0, escala)
+
+        melhor, melhor_distancia = None, limite
+        anel = 0
+        while (anel - 1) * lado_minimo <= melhor_distancia:
+            for i, j in self._anel(ci, cj, anel):
+                for lat, lon, cidade in self.celulas.get((i, j), ()):
+                    distancia = sqrt((lat - latitude) ** 2 + ((lon - longitude) * escala) ** 2)
+                    if distancia <= melhor_distancia:
+                        melhor, melhor_distancia = (lat, lon, cidade), distancia
+            anel += 1
+
+        if melhor is None:
+            return None
+        lat, lon, cidade = melhor
+        return cidade, haversine_distance(latitude, longitude, lat, lon) / 1000
+
+    @staticmethod
+    def _anel(ci, cj, anel):
+        if anel == 0:
+            yield ci, cj
+            return
+        for dj in range(-anel, anel + 1):
+            yield ci - anel, cj + dj
+            yield ci + anel, cj + dj
+        for di in range(-anel + 1, anel):
+            yield ci + di, cj - anel
+            yield ci + di, cj + anel
+
+
+_trava = threading.Lock()
+_indice = None
+_versao = None
+
+
+def obter_indice():
+    """Retorna o índice dos centroides, reconstruindo-o se alguma cidade ou estado mudou."""
+    global _indice, _versao
+    versao = cache_compartilhado.versao('localidades')
+    if _indice is not None and _versao == versao:
+        return _indice
+    with _trava:
+        if _indice is None or _versao != versao:
+            cidades = Cidade.objects.filter(latitude__isnull=False, longitude__isnull=False).values_list(
+                'id', 'nome', 'latitude', 'longitude', 'estado_id', 'estado__nome', 'estado__uf'
+            )
+            _indice = IndiceCentroides(cidades.iterator())
+            _versao = versao
+        return _indice
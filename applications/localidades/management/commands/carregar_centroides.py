@@ -0,0 +1,84 @@
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from applications.core import cache as cache_compartilhado
+from applications.localidades.busca import normalizar
+from applications.localidades.models import Estado, Cidade
+
+# Os dois primeiros dígitos do código IBGE de um município são o código da UF
+UF_POR_CODIGO_IBGE = {
+    11: 'RO', 12: 'AC', 13: 'AM', 14: 'RR', 15: 'PA', 16: 'AP', 17: 'TO',
+    21: 'MA', 22: 'PI', 23: 'CE', 24: 'RN', 25: 'PB', 26: 'PE', 27: 'AL', 28: 'SE', 29: 'BA',
+    31: 'MG', 32: 'ES', 33: 'RJ', 35: 'SP',
+    41: 'PR', 42: 'SC', 43: 'RS',
+    50: 'MS', 51: 'MT', 52: 'GO', 53: 'DF',
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Carrega os centroides dos municípios a partir de um CSV com as colunas '
+        'codigo_ibge, nome, latitude e longitude (e opcionalmente uf), como o '
+        'municipios.csv do projeto kelvins/Municipios-Brasileiros.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('arquivo', help='Caminho do arquivo CSV.')
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Apenas informa quantas cidades seriam atualizadas e criadas.',
+        )
+
+    def handle(self, *args, **options):
+        estados = {estado.uf: estado for estado in Estado.objects.all()}
+        cidades = {}
+        for cidade in Cidade.objects.select_related('estado'):
+            cidades[(normalizar(cidade.nome), cidade.estado.uf)] = cidade
+
+        atualizadas, novas, ignoradas = [], [], 0
+        try:
+            with open(options['arquivo'], newline='', encoding='utf-8-sig') as arquivo:
+                for linha in csv.DictReader(arquivo):
+                    try:
+                        codigo = int(linha['codigo_ibge'])
+                        uf = (linha.get('uf') or UF_POR_CODIGO_IBGE.get(codigo // 100000, '')).upper()
+                        latitude, longitude = float(linha['latitude']), float(linha['longitude'])
+                    except (KeyError, TypeError, ValueError):
+                        ignoradas += 1
+                        continue
+                    if uf not in estados:
+                        ignoradas += 1
+                        continue
+
+                    cidade = cidades.get((normalizar(linha['nome']), uf))
+                    if cidade is None:
+                        cidade = Cidade(nome=linha['nome'].strip(), estado=estados[uf])
+                        novas.append(cidade)
+                    else:
+                        atualizadas.append(cidade)
+                    cidade.codigo_ibge = codigo
+                    cidade.latitude = round(latitude, 8)
+                    cidade.longitude = round(longitude, 8)
+        except OSError as erro:
+            raise CommandError(f'Não foi possível ler o arquivo: {erro}')
+
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING(
+                f'{len(atualizadas)} cidade(s) seriam atualizadas e {len(novas)} criadas; {ignoradas} linha(s) ignorada(s).'
+            ))
+            return
+
+        with transaction.atomic():
+            # Um código IBGE que mudou de cidade não pode colidir com o valor antigo
+            Cidade.objects.filter(codigo_ibge__in=[cidade.codigo_ibge for cidade in atualizadas + novas]).update(codigo_ibge=None)
+            Cidade.objects.bulk_update(atualizadas, ['codigo_ibge', 'latitude', 'longitude'], batch_size=1000)
+            Cidade.objects.bulk_create(novas, batch_size=1000)
+        # bulk_update e bulk_create não disparam os signals dos modelos
+        cache_compartilhado.invalidar('localidades')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(atualizadas)} cidade(s) atualizada(s) e {len(novas)} criada(s); {ignoradas} linha(s) ignorada(s).'
+        ))
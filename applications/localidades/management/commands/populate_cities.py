@@ -1,35 +1,110 @@
+import json
+
 import requests
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from applications.core import cache as cache_compartilhado
+from applications.core.http import cliente
 from applications.localidades.models import Estado, Cidade
 
+# Todos os municípios em uma única resposta, com a UF no mesmo nível do nome
+URL_MUNICIPIOS = 'https://servicodados.ibge.gov.br/api/v1/localidades/municipios?view=nivelado'
+TAMANHO_LOTE = 1000
+
+
+def _ler_municipio(item):
+    """Retorna (codigo_ibge, nome, uf) de um item da API do IBGE, no formato nivelado ou no padrão."""
+    if 'municipio-id' in item:
+        return int(item['municipio-id']), item['municipio-nome'], item['UF-sigla']
+    # Formato padrão: alguns municípios vêm sem microrregião, mas sempre com a região imediata
+    regiao = item.get('microrregiao') or {}
+    uf = (regiao.get('mesorregiao') or {}).get('UF') or item['regiao-imediata']['regiao-intermediaria']['UF']
+    return int(item['id']), item['nome'], uf['sigla']
+
+
 class Command(BaseCommand):
-    help = 'Popula o banco de dados com as cidades do Brasil a partir da API do IBGE.'
+    help = 'Popula o banco de dados com as cidades do Brasil a partir da API do IBGE ou de um arquivo JSON.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--from-file',
+            dest='arquivo',
+            help='Lê os municípios de um JSON salvo da API do IBGE em vez de acessar a rede.',
+        )
+        parser.add_argument(
+            '--salvar',
+            help='Salva a resposta da API neste arquivo, para uso posterior com --from-file.',
+        )
 
     def handle(self, *args, **options):
         self.stdout.write(self.style.SUCCESS('Iniciando a população de cidades...'))
 
-        estados = Estado.objects.all()
-        if not estados.exists():
+        estados = {estado.uf: estado for estado in Estado.objects.all()}
+        if not estados:
             self.stdout.write(self.style.ERROR('Nenhum estado encontrado no banco de dados. Execute a migração para popular os estados primeiro.'))
             return
 
-        for estado in estados:
-            self.stdout.write(f'Buscando cidades para o estado de {estado.nome}...')
+        municipios = self._carregar(options['arquivo'], options['salvar'])
+
+        # Um código já usado por outra cidade (ex.: nome grafado de outro jeito) não é reatribuído
+        codigos_usados = {
+            codigo: (nome, estado_id)
+            for codigo, nome, estado_id in Cidade.objects.filter(codigo_ibge__isnull=False).values_list('codigo_ibge', 'nome', 'estado_id')
+        }
+        cidades = {}
+        ignorados = 0
+        for item in municipios:
             try:
-                response = requests.get(f'https://servicodados.ibge.gov.br/api/v1/localidades/estados/{estado.uf}/municipios')
-                response.raise_for_status()  # Lança uma exceção para respostas de erro (4xx ou 5xx)
-                cidades_data = response.json()
-
-                for cidade_data in cidades_data:
-                    nome_cidade = cidade_data['nome']
-                    # Verifica se a cidade já existe para evitar duplicatas
-                    if not Cidade.objects.filter(nome=nome_cidade, estado=estado).exists():
-                        Cidade.objects.create(nome=nome_cidade, estado=estado)
-                        self.stdout.write(self.style.SUCCESS(f'  - Cidade "{nome_cidade}" adicionada.'))
-                    else:
-                        self.stdout.write(self.style.WARNING(f'  - Cidade "{nome_cidade}" já existe.'))
-
-            except requests.exceptions.RequestException as e:
-                self.stdout.write(self.style.ERROR(f'Erro ao buscar cidades para {estado.nome}: {e}'))
-
-        self.stdout.write(self.style.SUCCESS('População de cidades concluída!'))
+                codigo, nome, uf = _ler_municipio(item)
+            except (KeyError, TypeError, ValueError):
+                ignorados += 1
+                continue
+            if uf not in estados:
+                ignorados += 1
+                continue
+            chave = (nome, estados[uf].pk)
+            if codigos_usados.get(codigo, chave) != chave:
+                codigo = None
+            cidades[chave] = Cidade(nome=nome, estado=estados[uf], codigo_ibge=codigo)
+
+        antes = Cidade.objects.count()
+        with transaction.atomic():
+            # Cidades já existentes (mesmo nome e estado) só recebem o código do IBGE
+            Cidade.objects.bulk_create(
+                list(cidades.values()),
+                batch_size=TAMANHO_LOTE,
+                update_conflicts=True,
+                unique_fields=['nome', 'estado'],
+                update_fields=['codigo_ibge'],
+            )
+        # bulk_create não dispara os signals dos modelos
+        cache_compartilhado.invalidar('localidades')
+
+        novas = Cidade.objects.count() - antes
+        self.stdout.write(self.style.SUCCESS(
+            f'População de cidades concluída! {novas} cidade(s) adicionada(s), '
+            f'{len(cidades) - novas} atualizada(s), {ignorados} registro(s) ignorado(s).'
+        ))
+
+    def _carregar(self, arquivo, salvar):
+        if arquivo:
+            try:
+                with open(arquivo, encoding='utf-8') as entrada:
+                    return json.load(entrada)
+            except (OSError, ValueError) as e:
+                raise CommandError(f'Não foi possível ler {arquivo}: {e}')
+
+        self.stdout.write('Buscando os municípios no IBGE...')
+        try:
+            response = cliente('ibge').get(URL_MUNICIPIOS)
+            response.raise_for_status()  # Lança uma exceção para respostas de erro (4xx ou 5xx)
+        except requests.exceptions.RequestException as e:
+            raise CommandError(f'Erro ao buscar as cidades no IBGE: {e}')
+        municipios = response.json()
+
+        if salvar:
+            with open(salvar, 'w', encoding='utf-8') as saida:
+                json.dump(municipios, saida, ensure_ascii=False)
+            self.stdout.write(f'Resposta salva em {salvar}.')
+        return municipios
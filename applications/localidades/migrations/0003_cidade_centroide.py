@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('localidades', '0002_popular_estados'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cidade',
+            name='codigo_ibge',
+            field=models.PositiveIntegerField(blank=True, null=True, unique=True),
+        ),
+        migrations.AddField(
+            model_name='cidade',
+            name='latitude',
+            field=models.DecimalField(blank=True, decimal_places=8, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='cidade',
+            name='longitude',
+            field=models.DecimalField(blank=True, decimal_places=8, max_digits=11, null=True),
+        ),
+    ]
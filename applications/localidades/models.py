@@ -16,6 +16,10 @@ class Cidade(models.Model):
     """Modelo que representa uma Cidade e sua relação com um Estado."""
     nome = models.CharField(max_length=100)
     estado = models.ForeignKey(Estado, on_delete=models.PROTECT, related_name='cidades')
+    codigo_ibge = models.PositiveIntegerField(unique=True, null=True, blank=True)
+    # Centroide do município, usado na geocodificação reversa offline (ver geocodificacao.py)
+    latitude = models.DecimalField(max_digits=10, decimal_places=8, null=True, blank=True)
+    longitude = models.DecimalField(max_digits=11, decimal_places=8, null=True, blank=True)
 
     class Meta:
         verbose_name = 'Cidade'
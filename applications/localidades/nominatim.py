@@ -0,0 +1,183 @@
+"""
+Geocodificação reversa remota (Nominatim), usada só quando o índice local não
+resolve a coordenada (ver AnalisarLocalizacaoView).
+
+As respostas ficam em um cache em memória, por processo, cuja chave é a
+coordenada arredondada para settings.GEOCODIFICACAO_CACHE_CASAS casas decimais
+(3 casas são ~110 m). O cache tem validade (TTL) e descarta as entradas menos
+usadas recentemente quando passa de GEOCODIFICACAO_CACHE_MAX_ENTRADAS. "Nenhum
+endereço encontrado" também é guardado, com uma validade menor; falhas de
+comunicação não são guardadas.
+
+Pedidos simultâneos da mesma chave esperam uma única chamada ao Nominatim.
+"""
+import threading
+import time
+from collections import Counter, OrderedDict
+
+import requests
+from django.conf import settings
+
+from applications.core.http import cliente
+
+ACERTO = 'HIT'
+FALTA = 'MISS'
+# Esperou a chamada que outra requisição já estava fazendo
+COALESCIDO = 'COALESCED'
+
+
+def _configuracao(nome, padrao):
+    return getattr(settings, nome, padrao)
+
+
+class CacheLRU:
+    """Dicionário com validade por entrada e limite de tamanho (LRU)."""
+
+    def __init__(self, max_entradas):
+        self.max_entradas = max_entradas
+        self._entradas = OrderedDict()
+        self._trava = threading.Lock()
+
+    def obter(self, chave):
+        with self._trava:
+            entrada = self._entradas.get(chave)
+            if entrada is None:
+                return None
+            expira_em, valor = entrada
+            if expira_em <= time.monotonic():
+                del self._entradas[chave]
+                return None
+            self._entradas.move_to_end(chave)
+            return valor
+
+    def guardar(self, chave, valor, ttl):
+        with self._trava:
+            self._entradas[chave] = (time.monotonic() + ttl, valor)
+            self._entradas.move_to_end(chave)
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+
+    def limpar(self):
+        with self._trava:
+            self._entradas.clear()
+
+    def __len__(self):
+        return len(self._entradas)
+
+
+class _Chamada:
+    def __init__(self):
+        self.concluida = threading.Event()
+        self.resultado = None
+
+
+_cache = CacheLRU(_configuracao('GEOCODIFICACAO_CACHE_MAX_ENTRADAS', 10000))
+_em_andamento = {}
+_em_andamento_trava = threading.Lock()
+_contadores = Counter()
+_contadores_trava = threading.Lock()
+
+
+def _contar(tipo):
+    with _contadores_trava:
+        _contadores[tipo] += 1
+
+
+def chave_para(latitude, longitude):
+    casas = _configuracao('GEOCODIFICACAO_CACHE_CASAS', 3)
+    # O "+ 0.0" troca -0.0 por 0.0, que senão seria outra chave
+    return round(float(latitude), casas) + 0.0, round(float(longitude), casas) + 0.0
+
+
+def consultar(latitude, longitude):
+    """
+    Retorna (status_code, dados, origem): a resposta para a coordenada e se
+    ela veio do cache (HIT), de uma chamada ao Nominatim (MISS) ou de uma
+    chamada feita por outra requisição simultânea (COALESCED).
+    """
+    chave = chave_para(latitude, longitude)
+    resultado = _cache.obter(chave)
+    if resultado is not None:
+        _contar(ACERTO)
+        return (*resultado, ACERTO)
+
+    with _em_andamento_trava:
+        chamada = _em_andamento.get(chave)
+        lider = chamada is None
+        if lider:
+            chamada = _em_andamento[chave] = _Chamada()
+
+    if not lider:
+        chamada.concluida.wait()
+        _contar(COALESCIDO)
+        return (*chamada.resultado, COALESCIDO)
+
+    try:
+        chamada.resultado = resultado = _chamar_nominatim(*chave)
+        status_code = resultado[0]
+        if status_code == 200:
+            _cache.guardar(chave, resultado, _configuracao('GEOCODIFICACAO_CACHE_TTL', 60 * 60 * 24))
+        elif status_code == 404:
+            _cache.guardar(chave, resultado, _configuracao('GEOCODIFICACAO_CACHE_TTL_NEGATIVO', 60 * 5))
+    finally:
+        if chamada.resultado is None:
+            chamada.resultado = (503, {'error': 'Erro ao contatar o serviço de geolocalização.'})
+        with _em_andamento_trava:
+            del _em_andamento[chave]
+        chamada.concluida.set()
+    _contar(FALTA)
+    return (*resultado, FALTA)
+
+
+def _chamar_nominatim(latitude, longitude):
+    _contar('chamadas_remotas')
+    params = {
+        'format': 'json',
+        'lat': latitude,
+        'lon': longitude,
+        'zoom': 10,  # Nível de zoom para cidade
+        'addressdetails': 1
+    }
+
+    try:
+        # O User-Agent exigido pelo OSM vai nos cabeçalhos do cliente (settings.HTTP_CLIENTES)
+        response = cliente('nominatim').get(settings.NOMINATIM_API_ENDPOINT, params=params)
+        response.raise_for_status()  # Lança exceção para respostas de erro (4xx ou 5xx)
+    except requests.exceptions.RequestException as e:
+        return 503, {'error': f'Erro ao contatar o serviço de geolocalização: {e}'}
+
+    data = response.json()
+    address = data.get('address')
+
+    if not address:
+        return 404, {'error': 'Não foi possível encontrar um endereço para as coordenadas fornecidas.'}
+
+    # Nominatim pode retornar 'city', 'town', ou 'village'
+    cidade = address.get('city', address.get('town', address.get('village')))
+    estado = address.get('state')
+
+    # Lógica simples para sugerir jurisdição
+    categoria_osm = data.get('category')
+    if categoria_osm == 'highway':
+        jurisdicao_sugerida = 'FEDERAL' # Ou ESTADUAL, dependendo da via
+    else:
+        jurisdicao_sugerida = 'MUNICIPAL'
+
+    return 200, {
+        'cidade': cidade,
+        'estado': estado,
+        'jurisdicao_sugerida': jurisdicao_sugerida,
+        'dados_completos_osm': address # Opcional: para debug
+    }
+
+
+def estatisticas():
+    """Contagem de HIT, MISS, COALESCED e chamadas_remotas deste processo, e o tamanho do cache."""
+    with _contadores_trava:
+        return {**_contadores, 'entradas': len(_cache)}
+
+
+def limpar():
+    _cache.limpar()
+    with _contadores_trava:
+        _contadores.clear()
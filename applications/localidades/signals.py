@@ -0,0 +1,4 @@
+from applications.core.cache import invalidar_ao_alterar
+from .models import Estado, Cidade
+
+invalidar_ao_alterar('localidades', Estado, Cidade)
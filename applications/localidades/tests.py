@@ -1,3 +1,296 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+import threading
+import time
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from applications.core import cache as cache_compartilhado
+from applications.gestao_publica.models import OfficialEntity
+from . import nominatim
+from .geocodificacao import IndiceCentroides
+from .models import Estado, Cidade
+
+
+class CacheLocalidadesTests(TestCase):
+    """
+    Testes do cache das listagens de estados e cidades.
+    """
+    def setUp(self):
+        cache.clear()
+        cache_compartilhado.zerar_estatisticas()
+        self.estado = Estado.objects.create(nome='Estado Cache', uf='XC')
+        Cidade.objects.create(nome='Cidade Cache', estado=self.estado)
+        self.url = reverse('cidade-list')
+
+    def test_segunda_listagem_vem_do_cache(self):
+        primeira = self.client.get(self.url)
+        with self.assertNumQueries(0):
+            segunda = self.client.get(self.url)
+        self.assertEqual(segunda.status_code, 200)
+        self.assertEqual(segunda.json(), primeira.json())
+        self.assertEqual(cache_compartilhado.estatisticas()['localidades'], {'acertos': 1, 'faltas': 1})
+
+    def test_alteracao_invalida_o_cache(self):
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            Cidade.objects.create(nome='Cidade Nova', estado=self.estado)
+        nomes = [cidade['nome'] for cidade in self.client.get(self.url).json()]
+        self.assertIn('Cidade Nova', nomes)
+
+    def test_query_string_faz_parte_da_chave(self):
+        self.client.get(self.url)
+        self.client.get(self.url + '?format=json')
+        self.assertEqual(cache_compartilhado.estatisticas()['localidades']['faltas'], 2)
+
+
+class AutocompletarCidadesTests(TestCase):
+    """
+    Testes do autocompletar de cidades (?q=).
+    """
+    def setUp(self):
+        cache.clear()
+        sc = Estado.objects.create(nome='Estado SC', uf='XS')
+        pr = Estado.objects.create(nome='Estado PR', uf='XP')
+        Cidade.objects.create(nome='São José', estado=sc)
+        Cidade.objects.create(nome='São João Batista', estado=sc)
+        Cidade.objects.create(nome='São José dos Pinhais', estado=pr)
+        Cidade.objects.create(nome='Passos Maia', estado=sc)
+        self.url = reverse('cidade-list')
+
+    def buscar(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return [cidade['nome'] for cidade in response.json()]
+
+    def test_ignora_acentos_e_maiusculas(self):
+        self.assertEqual(self.buscar(q='SAO JO'), ['São João Batista', 'São José', 'São José dos Pinhais'])
+
+    def test_filtra_por_uf(self):
+        self.assertEqual(self.buscar(q='sao jose', uf='xp'), ['São José dos Pinhais'])
+
+    def test_palavra_no_meio_do_nome_vem_depois(self):
+        self.assertEqual(self.buscar(q='p'), ['Passos Maia', 'São José dos Pinhais'])
+
+    def test_limite(self):
+        self.assertEqual(len(self.buscar(q='sao', limite=2)), 2)
+
+    def test_indice_reconstruido_apos_alteracao(self):
+        self.buscar(q='sao')
+        with self.captureOnCommitCallbacks(execute=True):
+            Cidade.objects.create(nome='Santo Amaro', estado=Estado.objects.get(uf='XS'))
+        self.assertEqual(self.buscar(q='santo'), ['Santo Amaro'])
+
+
+class GeocodificacaoReversaTests(TestCase):
+    """
+    Testes da geocodificação reversa offline (centroides dos municípios).
+    """
+    def setUp(self):
+        cache.clear()
+        nominatim.limpar()
+        self.estado = Estado.objects.get(uf='SC')
+        Cidade.objects.create(nome='Joinville Teste', estado=self.estado, latitude=-26.3045, longitude=-48.8487)
+        Cidade.objects.create(nome='Florianópolis Teste', estado=self.estado, latitude=-27.5954, longitude=-48.5480)
+        self.url = reverse('analisar-localizacao')
+
+    def test_indice_retorna_centroide_mais_proximo(self):
+        indice = IndiceCentroides([
+            (1, 'A', -26.30, -48.84, 1, 'Estado', 'SC'),
+            (2, 'B', -26.90, -49.06, 1, 'Estado', 'SC'),
+            (3, 'C', -25.43, -49.27, 2, 'Outro', 'PR'),
+        ])
+        cidade, distancia_km = indice.mais_proxima(-26.85, -49.0)
+        self.assertEqual(cidade['nome'], 'B')
+        self.assertLess(distancia_km, 10)
+        self.assertIsNone(indice.mais_proxima(-20.0, -30.0))
+
+    def test_analisar_sem_rede(self):
+        with mock.patch.object(nominatim.cliente('nominatim'), 'get') as remoto:
+            response = self.client.get(self.url, {'latitude': '-26.29', 'longitude': '-48.85'})
+        remoto.assert_not_called()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['cidade'], 'Joinville Teste')
+        self.assertEqual(response.json()['uf'], 'SC')
+        self.assertEqual(response.json()['jurisdicao_sugerida'], 'MUNICIPAL')
+
+    def test_fora_do_indice_sem_servico_remoto(self):
+        with mock.patch.object(nominatim.cliente('nominatim'), 'get') as remoto:
+            response = self.client.get(self.url, {'latitude': '10', 'longitude': '10'})
+        remoto.assert_not_called()
+        self.assertEqual(response.status_code, 404)
+
+    @override_settings(GEOCODIFICACAO_REMOTA=True)
+    def test_fora_do_indice_com_servico_remoto(self):
+        with mock.patch.object(nominatim.cliente('nominatim'), 'get') as remoto:
+            remoto.return_value.json.return_value = {'address': {'city': 'Longe', 'state': 'Exterior'}}
+            response = self.client.get(self.url, {'latitude': '10', 'longitude': '10'})
+        remoto.assert_called_once()
+        self.assertEqual(response.json()['cidade'], 'Longe')
+
+    def test_indice_vazio_sem_servico_remoto(self):
+        Cidade.objects.update(latitude=None, longitude=None)
+        cache_compartilhado.invalidar('localidades')
+        with mock.patch.object(nominatim.cliente('nominatim'), 'get') as remoto:
+            response = self.client.get(self.url, {'latitude': '-26.29', 'longitude': '-48.85'})
+        remoto.assert_not_called()
+        self.assertEqual(response.status_code, 503)
+        self.assertIn('carregar_centroides', response.json()['error'])
+
+    @override_settings(GEOCODIFICACAO_REMOTA=True)
+    def test_indice_vazio_com_servico_remoto(self):
+        Cidade.objects.update(latitude=None, longitude=None)
+        cache_compartilhado.invalidar('localidades')
+        with mock.patch.object(nominatim.cliente('nominatim'), 'get') as remoto:
+            remoto.return_value.json.return_value = {'address': {'city': 'Joinville Teste', 'state': self.estado.nome}}
+            response = self.client.get(self.url, {'latitude': '-26.29', 'longitude': '-48.85'})
+        remoto.assert_called_once()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['cidade_id'], Cidade.objects.get(nome='Joinville Teste').id)
+        self.assertEqual(response.json()['uf'], 'SC')
+
+    @override_settings(GEOCODIFICACAO_REMOTA=True)
+    def test_mesmas_chaves_nas_duas_origens(self):
+        local = self.client.get(self.url, {'latitude': '-26.29', 'longitude': '-48.85'}).json()
+        with mock.patch.object(nominatim.cliente('nominatim'), 'get') as remoto:
+            remoto.return_value.json.return_value = {'address': {'city': 'Longe', 'state': 'Exterior'}}
+            externo = self.client.get(self.url, {'latitude': '10', 'longitude': '10'}).json()
+        self.assertEqual(set(local), set(externo))
+        self.assertIsNone(externo['cidade_id'])
+
+    def test_jurisdicao_sugerida_pelas_entidades(self):
+        joinville = {'latitude': '-26.29', 'longitude': '-48.85'}
+        self.assertEqual(self.client.get(self.url, joinville).json()['jurisdicao_sugerida'], 'MUNICIPAL')
+
+        # Só o estado tem entidade cadastrada
+        OfficialEntity.objects.create(nome='Governo', estado=self.estado)
+        self.assertEqual(self.client.get(self.url, joinville).json()['jurisdicao_sugerida'], 'ESTADUAL')
+
+        OfficialEntity.objects.create(nome='Prefeitura', cidade=Cidade.objects.get(nome='Joinville Teste'))
+        self.assertEqual(self.client.get(self.url, joinville).json()['jurisdicao_sugerida'], 'MUNICIPAL')
+
+    def test_carregar_centroides(self):
+        descritor, caminho = tempfile.mkstemp(suffix='.csv')
+        self.addCleanup(os.remove, caminho)
+        with os.fdopen(descritor, 'w', encoding='utf-8') as arquivo:
+            arquivo.write('codigo_ibge,nome,latitude,longitude\n')
+            arquivo.write('4209102,JOINVILLE TESTE,-26.3051,-48.8461\n')
+            arquivo.write('4202404,Blumenau Teste,-26.9155,-49.0709\n')
+            arquivo.write('sem codigo,Inválida,0,0\n')
+
+        call_command('carregar_centroides', caminho, stdout=StringIO())
+
+        joinville = Cidade.objects.get(nome='Joinville Teste')
+        self.assertEqual(joinville.codigo_ibge, 4209102)
+        self.assertAlmostEqual(float(joinville.latitude), -26.3051)
+        self.assertEqual(Cidade.objects.get(codigo_ibge=4202404).estado, self.estado)
+        response = self.client.get(self.url, {'latitude': '-26.92', 'longitude': '-49.07'})
+        self.assertEqual(response.json()['cidade'], 'Blumenau Teste')
+
+
+@override_settings(GEOCODIFICACAO_REMOTA=True, GEOCODIFICACAO_CACHE_CASAS=3)
+class CacheNominatimTests(TestCase):
+    """
+    Testes do cache das consultas ao Nominatim.
+    """
+    def setUp(self):
+        cache.clear()
+        nominatim.limpar()
+        self.url = reverse('analisar-localizacao')
+        patcher = mock.patch.object(nominatim.cliente('nominatim'), 'get')
+        self.remoto = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.remoto.return_value.json.return_value = {'address': {'city': 'Longe', 'state': 'Exterior'}}
+
+    def analisar(self, latitude, longitude):
+        return self.client.get(self.url, {'latitude': latitude, 'longitude': longitude})
+
+    def test_coordenadas_proximas_compartilham_a_resposta(self):
+        self.assertEqual(self.analisar('10.00012', '10.00004')['X-Cache'], 'MISS')
+        response = self.analisar('10.00021', '9.99992')
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertEqual(response.json()['cidade'], 'Longe')
+        self.assertEqual(self.remoto.call_count, 1)
+        self.assertEqual(self.analisar('10.002', '10')['X-Cache'], 'MISS')
+
+    def test_resultado_negativo_tambem_fica_em_cache(self):
+        self.remoto.return_value.json.return_value = {}
+        self.assertEqual(self.analisar('10', '10').status_code, 404)
+        response = self.analisar('10', '10')
+        self.assertEqual((response.status_code, response['X-Cache']), (404, 'HIT'))
+        self.assertEqual(self.remoto.call_count, 1)
+
+    def test_falha_de_comunicacao_nao_fica_em_cache(self):
+        self.remoto.side_effect = nominatim.requests.exceptions.ConnectionError('fora do ar')
+        self.assertEqual(self.analisar('10', '10').status_code, 503)
+        self.assertEqual(self.analisar('10', '10')['X-Cache'], 'MISS')
+        self.assertEqual(self.remoto.call_count, 2)
+
+    def test_consultas_simultaneas_fazem_uma_chamada(self):
+        resposta = self.remoto.return_value
+
+        def chamada_lenta(*args, **kwargs):
+            time.sleep(0.2)
+            return resposta
+        self.remoto.side_effect = chamada_lenta
+
+        origens = []
+        threads = [
+            threading.Thread(target=lambda: origens.append(nominatim.consultar(10, 10)[2]))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(self.remoto.call_count, 1)
+        self.assertEqual(sorted(origens), ['COALESCED'] * 4 + ['MISS'])
+
+    def test_lru_descarta_a_menos_usada(self):
+        lru = nominatim.CacheLRU(2)
+        lru.guardar('a', 1, 60)
+        lru.guardar('b', 2, 60)
+        lru.obter('a')
+        lru.guardar('c', 3, 60)
+        self.assertIsNone(lru.obter('b'))
+        self.assertEqual(lru.obter('a'), 1)
+        lru.guardar('d', 4, 0)
+        self.assertIsNone(lru.obter('d'))
+
+
+class PopulateCitiesTests(TestCase):
+    """
+    Testes da carga de cidades a partir de um JSON do IBGE.
+    """
+    def setUp(self):
+        cache.clear()
+        self.sc = Estado.objects.get(uf='SC')
+        Cidade.objects.create(nome='Joinville', estado=self.sc)
+        descritor, self.caminho = tempfile.mkstemp(suffix='.json')
+        self.addCleanup(os.remove, self.caminho)
+        with os.fdopen(descritor, 'w', encoding='utf-8') as arquivo:
+            json.dump([
+                {'municipio-id': 4209102, 'municipio-nome': 'Joinville', 'UF-sigla': 'SC'},
+                {'municipio-id': 4202404, 'municipio-nome': 'Blumenau', 'UF-sigla': 'SC'},
+                {
+                    'id': 4106902, 'nome': 'Curitiba', 'microrregiao': None,
+                    'regiao-imediata': {'regiao-intermediaria': {'UF': {'sigla': 'PR'}}},
+                },
+                {'municipio-id': 1, 'municipio-nome': 'Sem Estado', 'UF-sigla': 'XX'},
+            ], arquivo)
+
+    def test_carga_offline_e_idempotente(self):
+        call_command('populate_cities', from_file=self.caminho, stdout=StringIO())
+        call_command('populate_cities', from_file=self.caminho, stdout=StringIO())
+
+        self.assertEqual(Cidade.objects.filter(nome='Joinville').count(), 1)
+        self.assertEqual(Cidade.objects.get(nome='Joinville').codigo_ibge, 4209102)
+        self.assertEqual(Cidade.objects.get(codigo_ibge=4106902).estado.uf, 'PR')
+        self.assertFalse(Cidade.objects.filter(nome='Sem Estado').exists())
@@ -2,33 +2,70 @@ from rest_framework.viewsets import ReadOnlyModelViewSet
 from rest_framework.permissions import AllowAny
 from .models import Estado, Cidade
 from .serializers import EstadoSerializer, CidadeSerializer
+from .busca import LIMITE_MAXIMO, LIMITE_PADRAO, obter_indice
+from . import nominatim
+from .geocodificacao import obter_indice as obter_indice_centroides
+from applications.core.cache import CacheLeituraMixin
 
-import requests
+from django.apps import apps
 from django.conf import settings
+from django.db.models import Q
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 
-class EstadoViewSet(ReadOnlyModelViewSet):
+class EstadoViewSet(CacheLeituraMixin, ReadOnlyModelViewSet):
     """
     ViewSet para listar e recuperar Estados.
     """
+    grupo_cache = 'localidades'
     queryset = Estado.objects.all()
     serializer_class = EstadoSerializer
     permission_classes = [AllowAny]
 
-class CidadeViewSet(ReadOnlyModelViewSet):
+class CidadeViewSet(CacheLeituraMixin, ReadOnlyModelViewSet):
     """
     ViewSet para listar e recuperar Cidades.
+
+    Com ?q= a listagem vira um autocompletar (ver busca.py): ?q=sao jo&uf=SC&limite=10.
+    Só com ?uf= retorna todas as cidades do estado.
     """
+    grupo_cache = 'localidades'
     queryset = Cidade.objects.all()
     serializer_class = CidadeSerializer
     permission_classes = [AllowAny]
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        estado = self.request.query_params.get('estado')
+        uf = self.request.query_params.get('uf')
+        if estado and estado.isdigit():
+            queryset = queryset.filter(estado_id=estado)
+        if uf:
+            queryset = queryset.filter(estado__uf=uf.upper())
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        termo = request.query_params.get('q')
+        if termo is None:
+            return super().list(request, *args, **kwargs)
+        try:
+            limite = min(int(request.query_params.get('limite', LIMITE_PADRAO)), LIMITE_MAXIMO)
+        except ValueError:
+            return Response({'error': 'O parâmetro "limite" deve ser um número inteiro.'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(obter_indice().buscar(termo, request.query_params.get('uf'), max(limite, 1)))
+
 class AnalisarLocalizacaoView(APIView):
     """
     Endpoint que recebe coordenadas (latitude e longitude) e retorna
-    a cidade, estado e uma sugestão de jurisdição usando o Nominatim.
+    a cidade, estado e uma sugestão de jurisdição.
+
+    A consulta é feita no índice local de centroides (ver geocodificacao.py).
+    Só quando settings.GEOCODIFICACAO_REMOTA está ligado e o índice não
+    encontra a cidade é que o Nominatim é consultado. Sem centroides
+    carregados e sem o serviço remoto, responde 503.
+
+    As duas origens respondem com as mesmas chaves (ver resposta_localizacao).
     """
     permission_classes = [AllowAny]
 
@@ -41,50 +78,98 @@ class AnalisarLocalizacaoView(APIView):
                 {'error': 'Os parâmetros "latitude" e "longitude" são obrigatórios.'},
                 status=status.HTTP_400_BAD_REQUEST
             )
-
-        headers = {
-            'User-Agent': settings.NOMINATIM_USER_AGENT
-        }
-        params = {
-            'format': 'json',
-            'lat': latitude,
-            'lon': longitude,
-            'zoom': 10,  # Nível de zoom para cidade
-            'addressdetails': 1
-        }
-
         try:
-            response = requests.get(settings.NOMINATIM_API_ENDPOINT, params=params, headers=headers, timeout=10)
-            response.raise_for_status()  # Lança exceção para respostas de erro (4xx ou 5xx)
-        except requests.exceptions.RequestException as e:
+            latitude, longitude = float(latitude), float(longitude)
+        except ValueError:
+            return Response(
+                {'error': 'Os parâmetros "latitude" e "longitude" devem ser números.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        indice = obter_indice_centroides()
+        remota = getattr(settings, 'GEOCODIFICACAO_REMOTA', False)
+        if not indice.total and not remota:
+            # Sem centroides, o índice não distingue um ponto fora do país de um ponto qualquer
             return Response(
-                {'error': f'Erro ao contatar o serviço de geolocalização: {e}'},
+                {'error': 'Geocodificação indisponível: nenhum centroide de município foi carregado '
+                          '(execute "python manage.py carregar_centroides") e GEOCODIFICACAO_REMOTA está desligado.'},
                 status=status.HTTP_503_SERVICE_UNAVAILABLE
             )
 
-        data = response.json()
-        address = data.get('address')
+        encontrada = indice.mais_proxima(latitude, longitude)
+        if encontrada is not None:
+            cidade, distancia_km = encontrada
+            return Response(resposta_localizacao(
+                cidade['nome'], cidade['estado'], cidade['uf'], cidade['id'], cidade['estado_id'],
+                distancia_centroide_km=round(distancia_km, 1),
+            ))
 
-        if not address:
-            return Response(
-                {'error': 'Não foi possível encontrar um endereço para as coordenadas fornecidas.'},
-                status=status.HTTP_404_NOT_FOUND
+        if remota:
+            return self.consultar_nominatim(latitude, longitude)
+        return Response(
+            {'error': 'Não foi possível encontrar um endereço para as coordenadas fornecidas.'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+
+    def consultar_nominatim(self, latitude, longitude):
+        status_code, dados, origem = nominatim.consultar(latitude, longitude)
+        if status_code == status.HTTP_200_OK:
+            dados = self.localizar_resposta_remota(dados)
+        response = Response(dados, status=status_code)
+        # Permite medir quantas consultas o cache poupou do Nominatim
+        response['X-Cache'] = origem
+        return response
+
+    def localizar_resposta_remota(self, dados):
+        """Associa a cidade e o estado devolvidos pelo Nominatim aos cadastrados, quando existirem."""
+        cidade = None
+        if dados['cidade'] and dados['estado']:
+            cidade = (
+                Cidade.objects.select_related('estado')
+                .filter(nome__iexact=dados['cidade'], estado__nome__iexact=dados['estado'])
+                .first()
             )
+        if cidade is None:
+            return resposta_localizacao(dados['cidade'], dados['estado'], None, None, None, dados['jurisdicao_sugerida'])
+        return resposta_localizacao(
+            cidade.nome, cidade.estado.nome, cidade.estado.uf, cidade.id, cidade.estado_id,
+            # Vias (categoria "highway" no OSM) continuam sugerindo a esfera federal
+            dados['jurisdicao_sugerida'] if dados['jurisdicao_sugerida'] == 'FEDERAL' else None,
+        )
+
 
-        # Nominatim pode retornar 'city', 'town', ou 'village'
-        cidade = address.get('city', address.get('town', address.get('village')))
-        estado = address.get('state')
-        
-        # Lógica simples para sugerir jurisdição
-        categoria_osm = data.get('category')
-        if categoria_osm == 'highway':
-            jurisdicao_sugerida = 'FEDERAL' # Ou ESTADUAL, dependendo da via
-        else:
-            jurisdicao_sugerida = 'MUNICIPAL'
-
-        return Response({
-            'cidade': cidade,
-            'estado': estado,
-            'jurisdicao_sugerida': jurisdicao_sugerida,
-            'dados_completos_osm': address # Opcional: para debug
-        })
+def sugerir_jurisdicao(cidade_id, estado_id):
+    """
+    Esfera que pode receber a denúncia: MUNICIPAL se a cidade tem entidade
+    oficial cadastrada, ESTADUAL se só o estado tem, e MUNICIPAL se nenhum dos dois.
+    """
+    if cidade_id is None:
+        return 'MUNICIPAL'
+    # Importado sob demanda: gestao_publica depende de localidades
+    OfficialEntity = apps.get_model('gestao_publica', 'OfficialEntity')
+    esferas = set(
+        OfficialEntity.objects.filter(Q(cidade_id=cidade_id) | Q(cidade__isnull=True, estado_id=estado_id))
+        .values_list('cidade_id', flat=True)
+    )
+    if esferas and cidade_id not in esferas:
+        return 'ESTADUAL'
+    return 'MUNICIPAL'
+
+
+def resposta_localizacao(cidade, estado, uf, cidade_id, estado_id, jurisdicao_sugerida=None, distancia_centroide_km=None):
+    """
+    Corpo da resposta de AnalisarLocalizacaoView, igual para o índice local e
+    para o Nominatim. Os ids ficam nulos quando a cidade não está cadastrada, e
+    a distância só existe na resposta do índice de centroides.
+    """
+    if jurisdicao_sugerida is None:
+        jurisdicao_sugerida = sugerir_jurisdicao(cidade_id, estado_id)
+    return {
+        'cidade': cidade,
+        'estado': estado,
+        'uf': uf,
+        'cidade_id': cidade_id,
+        'estado_id': estado_id,
+        'jurisdicao_sugerida': jurisdicao_sugerida,
+        'distancia_centroide_km': distancia_centroide_km,
+    }
@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+"""
+Teste de estresse do agrupamento de denúncias com submissões simultâneas
+
+Várias threads enviam denúncias da mesma categoria em alguns poucos locais,
+todas ao mesmo tempo. Ao final verifica:
+1. Que existe exatamente uma denúncia por local (sem duplicatas)
+2. Que todas as outras submissões viraram apoios
+3. A vazão alcançada (submissões por segundo)
+
+Executar: python benchmark_agrupamento_concorrente.py [threads] [locais]
+"""
+
+import os
+import sys
+import threading
+import time
+import django
+from decimal import Decimal
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'voz_do_povo.settings')
+django.setup()
+
+from django.db import connection
+from applications.denuncias.models import Denuncia, ApoioDenuncia, Categoria
+from applications.denuncias.services import criar_ou_apoiar_denuncia
+from applications.localidades.models import Estado, Cidade
+from applications.core.models import User
+
+THREADS = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+LOCAIS = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+print("=" * 80)
+print("🧪 ESTRESSE DO AGRUPAMENTO CONCORRENTE")
+print("=" * 80)
+print(f"   Banco: {connection.vendor}")
+print(f"   Threads: {THREADS}")
+print(f"   Locais distintos: {LOCAIS}")
+print()
+
+estado = Estado.objects.first()
+cidade = Cidade.objects.first()
+
+if not all([estado, cidade]):
+    print("❌ ERRO: Estados ou cidades não encontrados!")
+    print("   Execute as migrações e popule o banco de dados.")
+    exit(1)
+
+
+def limpar():
+    Denuncia.objects.filter(categoria__nome="TESTE ESTRESSE").delete()
+    Categoria.objects.filter(nome="TESTE ESTRESSE").delete()
+    User.objects.filter(username__startswith="teste_estresse_").delete()
+
+
+# Limpar dados de testes anteriores
+limpar()
+
+# Categoria própria, para não agrupar com denúncias reais
+categoria = Categoria.objects.create(nome="TESTE ESTRESSE")
+
+usuarios = [
+    User.objects.create(username=f"teste_estresse_{i}", email=f"estresse{i}@teste.com", first_name="Teste")
+    for i in range(THREADS)
+]
+
+# Locais a ~1km uns dos outros (Joinville, SC)
+LAT_BASE = Decimal('-26.3045')
+LON_BASE = Decimal('-48.8487')
+locais = [(LAT_BASE - Decimal(k) / 100, LON_BASE) for k in range(LOCAIS)]
+
+barreira = threading.Barrier(THREADS)
+erros = []
+
+
+def submeter(indice, usuario):
+    try:
+        barreira.wait()
+        for k, (latitude, longitude) in enumerate(locais):
+            # Cada usuário envia de um ponto alguns metros diferente
+            criar_ou_apoiar_denuncia({
+                'titulo': f"TESTE ESTRESSE {k}",
+                'descricao': "Buraco de teste",
+                'categoria': categoria,
+                'cidade': cidade,
+                'estado': estado,
+                'latitude': latitude + Decimal(indice) / 100000,
+                'longitude': longitude,
+                'jurisdicao': Denuncia.Jurisdicao.MUNICIPAL,
+                'foto': "test.jpg",
+            }, user=usuario)
+    except Exception as e:
+        erros.append(e)
+    finally:
+        connection.close()
+
+
+threads = [threading.Thread(target=submeter, args=(i, usuario)) for i, usuario in enumerate(usuarios)]
+inicio = time.perf_counter()
+for thread in threads:
+    thread.start()
+for thread in threads:
+    thread.join()
+duracao = time.perf_counter() - inicio
+
+total_submissoes = THREADS * LOCAIS
+total_denuncias = Denuncia.objects.filter(categoria=categoria).count()
+total_apoios = ApoioDenuncia.objects.filter(denuncia__categoria=categoria).count()
+
+print(f"📊 Resultado:")
+print(f"   Submissões: {total_submissoes}")
+print(f"   Erros: {len(erros)}")
+for erro in erros[:5]:
+    print(f"      {erro!r}")
+print(f"   Denúncias criadas: {total_denuncias} (esperado: {LOCAIS})")
+print(f"   Apoios registrados: {total_apoios} (esperado: {total_submissoes - LOCAIS})")
+print(f"   Tempo total: {duracao:.2f}s")
+print(f"   Vazão: {total_submissoes / duracao:.1f} submissões/s")
+print()
+
+if total_denuncias == LOCAIS and not erros:
+    print("✅ PASSOU: Nenhuma denúncia duplicada")
+else:
+    print("❌ FALHOU: Denúncias duplicadas ou erros durante as submissões")
+
+# Limpar os dados do teste
+limpar()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+"""
+Benchmark da autenticação JWT em leituras
+
+Compara a vazão de GET /api/denuncias/apoios/ (endpoint autenticado) com a
+autenticação anterior (SessionAuthentication + JWTAuthentication, que busca
+o usuário no banco a cada requisição) e com AutenticacaoJWT, que usa o
+usuário das claims do token (applications/autenticacao/sessoes.py).
+
+Usa o banco de testes (criado e destruído pelo próprio script), então não
+altera os dados de desenvolvimento.
+
+Executar: python benchmark_autenticacao.py [requisicoes]
+"""
+
+import os
+import sys
+import time
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'voz_do_povo.settings')
+django.setup()
+
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authentication import SessionAuthentication
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from applications.core.test_runner import TestRunner
+
+REQUISICOES = int(sys.argv[1]) if len(sys.argv) > 1 else 2_000
+
+# Banco de testes e caches em memória: o cache em disco é o do servidor de desenvolvimento
+runner = TestRunner(verbosity=0)
+runner.setup_test_environment()
+bancos = runner.setup_databases()
+
+try:
+    from applications.autenticacao.authentication import AutenticacaoJWT
+    from applications.core.models import User
+    from applications.denuncias.views import ApoioDenunciaViewSet
+
+    print("=" * 80)
+    print("⏱️  BENCHMARK DA AUTENTICAÇÃO JWT EM LEITURAS")
+    print("=" * 80)
+    print(f"   Requisições por cenário: {REQUISICOES:,}")
+    print()
+
+    cache.clear()
+    User.objects.create_user(
+        username='benchmark', email='benchmark@example.com', password='password123',
+        first_name='Benchmark', is_email_verified=True,
+    )
+    cliente = APIClient()
+    tokens = cliente.post('/api/auth/login/', {'username': 'benchmark', 'password': 'password123'}).data
+    cliente.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens['access']}")
+    url = '/api/denuncias/apoios/'
+
+    def medir(autenticacao):
+        with mock.patch.object(ApoioDenunciaViewSet, 'authentication_classes', autenticacao):
+            # Aquecimento: a primeira requisição com o token consulta a lista de revogados
+            cliente.get(url)
+            with CaptureQueriesContext(connection) as consultas:
+                assert cliente.get(url).status_code == 200
+            total_consultas = len(consultas)
+            inicio = time.perf_counter()
+            for _ in range(REQUISICOES):
+                cliente.get(url)
+            duracao = time.perf_counter() - inicio
+        return REQUISICOES / duracao, total_consultas
+
+    cenarios = [
+        ("Antes (usuário do banco)", [SessionAuthentication, JWTAuthentication]),
+        ("Depois (claims do token)", [AutenticacaoJWT, SessionAuthentication]),
+    ]
+    resultados = [(nome, *medir(autenticacao)) for nome, autenticacao in cenarios]
+
+    print("📊 Resultados:")
+    print(f"   {'Cenário':<28}{'req/s':>10}{'consultas/req':>16}")
+    for nome, vazao, consultas in resultados:
+        print(f"   {nome:<28}{vazao:>10.0f}{consultas:>16}")
+    print(f"   Ganho: {resultados[1][1] / resultados[0][1]:.2f}x")
+    print()
+finally:
+    runner.teardown_databases(bancos)
+    runner.teardown_test_environment()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+"""
+Benchmark do cache das listagens de catálogo (cidades)
+
+Compara a latência de GET /api/localidades/cidades/ com e sem o cache
+compartilhado (applications/core/cache.py) e mostra a taxa de acertos.
+
+Usa o banco de testes (criado e destruído pelo próprio script), então não
+altera os dados de desenvolvimento.
+
+Executar: python benchmark_cache.py [total_de_cidades]
+"""
+
+import os
+import sys
+import time
+import statistics
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'voz_do_povo.settings')
+django.setup()
+
+from django.core.cache import cache
+from rest_framework.test import APIClient
+
+from applications.core.test_runner import TestRunner
+
+TOTAL = int(sys.argv[1]) if len(sys.argv) > 1 else 5_570
+REPETICOES = 50
+
+# Banco de testes e caches em memória: o cache em disco é o do servidor de desenvolvimento
+runner = TestRunner(verbosity=0)
+runner.setup_test_environment()
+bancos = runner.setup_databases()
+
+try:
+    from applications.core import cache as cache_compartilhado
+    from applications.localidades.models import Estado, Cidade
+
+    print("=" * 80)
+    print("⏱️  BENCHMARK DO CACHE DE CATÁLOGOS")
+    print("=" * 80)
+    print(f"   Cidades: {TOTAL:,}")
+    print()
+
+    print("🧱 Criando cidades...")
+    estado = Estado.objects.create(nome='Estado Benchmark', uf='ZB')
+    Cidade.objects.bulk_create(
+        (Cidade(nome=f'Cidade {i}', estado=estado) for i in range(TOTAL)),
+        batch_size=5000,
+    )
+    print()
+
+    cliente = APIClient()
+    url = '/api/localidades/cidades/'
+
+    def medir(antes=None):
+        tempos = []
+        for _ in range(REPETICOES):
+            if antes:
+                antes()
+            inicio = time.perf_counter()
+            response = cliente.get(url)
+            tempos.append((time.perf_counter() - inicio) * 1000)
+            assert response.status_code == 200
+        return statistics.median(tempos)
+
+    cache.clear()
+    cache_compartilhado.zerar_estatisticas()
+    sem_cache = medir(antes=lambda: cache_compartilhado.invalidar('localidades'))
+    com_cache = medir()
+
+    print(f"📊 Mediana de {REPETICOES} requisições (ms):")
+    print(f"   Sem cache: {sem_cache:>10.2f}")
+    print(f"   Com cache: {com_cache:>10.2f}")
+    print(f"   Ganho:     {sem_cache / com_cache:>10.1f}x")
+    print()
+
+    estatisticas = cache_compartilhado.estatisticas().get('localidades', {'acertos': 0, 'faltas': 0})
+    total = estatisticas['acertos'] + estatisticas['faltas']
+    print("🎯 Acertos do cache:")
+    print(f"   {estatisticas['acertos']} de {total} ({estatisticas['acertos'] / total:.0%})")
+    print()
+finally:
+    runner.teardown_databases(bancos)
+    runner.teardown_test_environment()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+"""
+Benchmark do processamento de fotos das denúncias
+
+Gera uma foto sintética de celular (JPEG 4000x3000) e mede quantas fotos
+por segundo processar_imagem consegue gerar (principal + média + miniatura):
+1. Em um único núcleo
+2. Com um processo por núcleo
+
+Também mostra o tamanho do original e de cada variante.
+
+Executar: python benchmark_fotos.py [fotos]
+"""
+
+import os
+import sys
+import time
+import django
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'voz_do_povo.settings')
+django.setup()
+
+from PIL import Image, ImageDraw, ImageFilter
+from applications.denuncias.fotos import processar_imagem, LADO_MAXIMO
+
+TOTAL = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+NUCLEOS = os.cpu_count() or 1
+
+
+def foto_sintetica():
+    # Gradiente com ruído e formas: comprime como uma foto real, não como uma cor sólida
+    imagem = Image.linear_gradient('L').resize((4000, 3000)).convert('RGB')
+    ruido = Image.effect_noise((4000, 3000), 40).convert('RGB')
+    imagem = Image.blend(imagem, ruido, 0.3)
+    desenho = ImageDraw.Draw(imagem)
+    for i in range(0, 4000, 250):
+        desenho.ellipse((i, i * 3 // 4 - 200, i + 400, i * 3 // 4 + 200), fill=(i % 255, 120, 200))
+    imagem = imagem.filter(ImageFilter.GaussianBlur(1))
+    exif = Image.Exif()
+    exif[0x0112] = 6
+    arquivo = BytesIO()
+    imagem.save(arquivo, 'JPEG', quality=92, exif=exif)
+    return arquivo.getvalue()
+
+
+def processar(conteudo):
+    variantes, _ = processar_imagem(BytesIO(conteudo))
+    return {nome: len(dados) for nome, dados in variantes.items()}
+
+
+def main():
+    conteudo = foto_sintetica()
+
+    print("=" * 80)
+    print("⏱️  BENCHMARK DE PROCESSAMENTO DE FOTOS")
+    print("=" * 80)
+    print(f"   Fotos por medição: {TOTAL}")
+    print(f"   Núcleos: {NUCLEOS}")
+    print()
+
+    tamanhos = processar(conteudo)
+
+    print("📦 Tamanhos:")
+    print(f"   {'original (4000x3000)':<24}{len(conteudo) / 1024:>10.1f} KB")
+    for nome, tamanho in tamanhos.items():
+        print(f"   {f'{nome} ({LADO_MAXIMO[nome]}px)':<24}{tamanho / 1024:>10.1f} KB")
+    print()
+
+    inicio = time.perf_counter()
+    for _ in range(TOTAL):
+        processar(conteudo)
+    um_nucleo = TOTAL / (time.perf_counter() - inicio)
+
+    with ProcessPoolExecutor(max_workers=NUCLEOS) as executor:
+        list(executor.map(processar, [conteudo] * NUCLEOS))  # Aquecimento
+        inicio = time.perf_counter()
+        list(executor.map(processar, [conteudo] * TOTAL))
+        todos = TOTAL / (time.perf_counter() - inicio)
+
+    print("📊 Vazão:")
+    print(f"   1 núcleo: {um_nucleo:.1f} fotos/s")
+    print(f"   {NUCLEOS} núcleos: {todos:.1f} fotos/s ({todos / NUCLEOS:.1f} fotos/s por núcleo)")
+    print()
+
+
+# O pool de processos importa este módulo nos filhos
+if __name__ == '__main__':
+    main()
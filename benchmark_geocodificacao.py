@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+"""
+Benchmark do cache da geocodificação reversa remota (Nominatim)
+
+Simula cidadãos próximos uns dos outros consultando coordenadas quase iguais,
+com várias threads ao mesmo tempo, e compara o número de chamadas ao serviço
+remoto e a latência p95 com e sem o cache de localidades/nominatim.py. O
+Nominatim é simulado com uma latência fixa, então nenhuma chamada sai da máquina.
+
+Executar: python benchmark_geocodificacao.py [consultas] [latencia_ms]
+"""
+
+import os
+import sys
+import time
+import random
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'voz_do_povo.settings')
+django.setup()
+
+from applications.localidades import nominatim
+
+CONSULTAS = int(sys.argv[1]) if len(sys.argv) > 1 else 2_000
+LATENCIA_MS = float(sys.argv[2]) if len(sys.argv) > 2 else 150
+THREADS = 16
+PONTOS_QUENTES = 40
+# ~50 m de dispersão em torno de cada ponto
+DISPERSAO_GRAUS = 0.0005
+
+random.seed(42)
+centros = [(random.uniform(-27.7, -27.5), random.uniform(-48.6, -48.4)) for _ in range(PONTOS_QUENTES)]
+coordenadas = []
+for _ in range(CONSULTAS):
+    latitude, longitude = random.choice(centros)
+    coordenadas.append((latitude + random.uniform(-DISPERSAO_GRAUS, DISPERSAO_GRAUS),
+                        longitude + random.uniform(-DISPERSAO_GRAUS, DISPERSAO_GRAUS)))
+
+
+def nominatim_simulado(*args, **kwargs):
+    time.sleep(LATENCIA_MS / 1000)
+    resposta = mock.Mock()
+    resposta.json.return_value = {'address': {'city': 'Florianópolis', 'state': 'Santa Catarina'}}
+    return resposta
+
+
+def executar(consultar):
+    def medir(coordenada):
+        inicio = time.perf_counter()
+        consultar(*coordenada)
+        return (time.perf_counter() - inicio) * 1000
+
+    with ThreadPoolExecutor(THREADS) as executor:
+        tempos = list(executor.map(medir, coordenadas))
+    return statistics.quantiles(tempos, n=100)[94], statistics.median(tempos)
+
+
+print("=" * 80)
+print("⏱️  BENCHMARK DO CACHE DE GEOCODIFICAÇÃO REVERSA")
+print("=" * 80)
+print(f"   Consultas: {CONSULTAS:,} ({THREADS} threads, {PONTOS_QUENTES} pontos quentes)")
+print(f"   Latência simulada do Nominatim: {LATENCIA_MS:.0f} ms")
+print()
+
+with mock.patch.object(nominatim.cliente('nominatim'), 'get', side_effect=nominatim_simulado) as remoto:
+    nominatim.limpar()
+    p95_sem, mediana_sem = executar(nominatim._chamar_nominatim)
+    chamadas_sem = remoto.call_count
+
+    remoto.reset_mock()
+    nominatim.limpar()
+    p95_com, mediana_com = executar(nominatim.consultar)
+    chamadas_com = remoto.call_count
+    estatisticas = nominatim.estatisticas()
+
+print(f"📊 {'':<12}{'chamadas remotas':>18}{'mediana (ms)':>16}{'p95 (ms)':>12}")
+print(f"   {'Sem cache':<12}{chamadas_sem:>18,}{mediana_sem:>16.2f}{p95_sem:>12.2f}")
+print(f"   {'Com cache':<12}{chamadas_com:>18,}{mediana_com:>16.2f}{p95_com:>12.2f}")
+print()
+print("🎯 Origem das respostas com cache:")
+for origem in (nominatim.ACERTO, nominatim.COALESCIDO, nominatim.FALTA):
+    print(f"   {origem:<10}{estatisticas.get(origem, 0):>8,}")
+print()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+"""
+Benchmark da paginação da listagem de denúncias
+
+Compara a latência de uma página na posição 0 e na posição 100 mil:
+1. Paginação por cursor (KeysetPagination, usada pela API)
+2. Paginação por OFFSET (LimitOffsetPagination do DRF)
+
+Usa o banco de testes (criado e destruído pelo próprio script), então não
+altera os dados de desenvolvimento.
+
+Executar: python benchmark_paginacao.py [total_de_denuncias]
+"""
+
+import os
+import sys
+import time
+import statistics
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'voz_do_povo.settings')
+django.setup()
+
+from django.test.utils import setup_test_environment
+from django.test.runner import DiscoverRunner
+from rest_framework.pagination import LimitOffsetPagination
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+TOTAL = int(sys.argv[1]) if len(sys.argv) > 1 else 110_000
+POSICAO_PROFUNDA = 100_000
+TAMANHO_PAGINA = 20
+REPETICOES = 20
+
+setup_test_environment()
+runner = DiscoverRunner(verbosity=0)
+bancos = runner.setup_databases()
+
+try:
+    from applications.core.pagination import KeysetPagination
+    from applications.denuncias.models import Denuncia, Categoria
+    from applications.denuncias.serializers import DenunciaSerializer
+    from applications.localidades.models import Estado, Cidade
+
+    print("=" * 80)
+    print("⏱️  BENCHMARK DE PAGINAÇÃO")
+    print("=" * 80)
+    print(f"   Denúncias: {TOTAL:,}")
+    print(f"   Tamanho da página: {TAMANHO_PAGINA}")
+    print()
+
+    estado = Estado.objects.first()
+    cidade = Cidade.objects.create(nome='Cidade Benchmark', estado=estado)
+    categoria = Categoria.objects.first()
+
+    print("🧱 Criando denúncias...")
+    Denuncia.objects.bulk_create(
+        (
+            Denuncia(
+                titulo=f'Denúncia {i}', descricao='Benchmark', autor_convidado='Benchmark',
+                categoria=categoria, cidade=cidade, estado=estado,
+                latitude=-26.3045, longitude=-48.8487, jurisdicao='MUNICIPAL', foto='denuncias_fotos/test.png',
+            )
+            for i in range(TOTAL)
+        ),
+        batch_size=5000,
+    )
+    print()
+
+    factory = APIRequestFactory()
+    queryset = Denuncia.objects.select_related('autor')
+
+    def pagina_cursor(posicao):
+        paginator = KeysetPagination()
+        url = f'/api/denuncias/denuncias/?page_size={TAMANHO_PAGINA}'
+        if posicao:
+            # Cursor apontando para o item imediatamente anterior à posição pedida
+            anterior = Denuncia.objects.order_by('-data_criacao', 'id')[posicao - 1]
+            paginator.base_url = 'http://testserver' + url
+            paginator.campo, paginator.desempate = 'data_criacao', 'id'
+            url = paginator.encode_cursor(anterior, 'n')
+        request = Request(factory.get(url))
+
+        def executar():
+            pagina = paginator.paginate_queryset(queryset, request)
+            return paginator.get_paginated_response(DenunciaSerializer(pagina, many=True).data)
+        return executar
+
+    def pagina_offset(posicao):
+        paginator = LimitOffsetPagination()
+        request = Request(factory.get(f'/api/denuncias/denuncias/?limit={TAMANHO_PAGINA}&offset={posicao}'))
+
+        def executar():
+            pagina = paginator.paginate_queryset(queryset.order_by('-data_criacao', 'id'), request)
+            return paginator.get_paginated_response(DenunciaSerializer(pagina, many=True).data)
+        return executar
+
+    def medir(executar):
+        executar()  # Aquecimento
+        tempos = []
+        for _ in range(REPETICOES):
+            inicio = time.perf_counter()
+            executar()
+            tempos.append((time.perf_counter() - inicio) * 1000)
+        return statistics.median(tempos)
+
+    print(f"📊 Mediana de {REPETICOES} execuções (ms):")
+    print(f"   {'':<12}{'posição 0':>14}{f'posição {POSICAO_PROFUNDA:,}':>20}")
+    for nome, fabrica in [('Cursor', pagina_cursor), ('OFFSET', pagina_offset)]:
+        inicio = medir(fabrica(0))
+        profunda = medir(fabrica(POSICAO_PROFUNDA))
+        print(f"   {nome:<12}{inicio:>14.2f}{profunda:>20.2f}")
+    print()
+finally:
+    runner.teardown_databases(bancos)
@@ -8,7 +8,7 @@ Testa:
 3. Apoio de convidados
 4. Não agrupar denúncias resolvidas
 
-Executar: python testar_agrupamento.py
+Executar: python script_agrupamento.py
 """
 
 import os
@@ -19,7 +19,8 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'voz_do_povo.settings')
 django.setup()
 
 from applications.denuncias.models import Denuncia, ApoioDenuncia, Categoria
-from applications.denuncias.services import haversine_distance, SEARCH_RADIUS_METERS
+from applications.denuncias.services import SEARCH_RADIUS_METERS
+from applications.denuncias.distancias import distancias_haversine, vetor_coordenadas
 from applications.localidades.models import Estado, Cidade
 from applications.core.models import User
 
@@ -70,8 +71,12 @@ LAT_DISTANTE = Decimal('-26.3063')  # ~200m ao sul
 LON_DISTANTE = Decimal('-48.8487')
 
 # Verificar distâncias
-dist_proxima = haversine_distance(LAT_BASE, LON_BASE, LAT_PROXIMA, LON_PROXIMA)
-dist_distante = haversine_distance(LAT_BASE, LON_BASE, LAT_DISTANTE, LON_DISTANTE)
+distancias_teste = distancias_haversine(
+    LAT_BASE, LON_BASE,
+    vetor_coordenadas([LAT_PROXIMA, LAT_DISTANTE]),
+    vetor_coordenadas([LON_PROXIMA, LON_DISTANTE]),
+)
+dist_proxima, dist_distante = float(distancias_teste[0]), float(distancias_teste[1])
 
 print(f"📍 Coordenadas de teste:")
 print(f"   Base: {LAT_BASE}, {LON_BASE}")
@@ -61,8 +61,10 @@ AUTH_USER_MODEL = 'core.User'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
+        # JWT primeiro: com o cabeçalho Authorization a sessão nem é consultada.
+        # Em leituras o usuário vem das claims do token (ver autenticacao/sessoes.py)
+        'applications.autenticacao.authentication.AutenticacaoJWT',
         'rest_framework.authentication.SessionAuthentication',
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
     )
 }
 
@@ -104,6 +106,9 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'TEST': {
+            'NAME': BASE_DIR / 'test_db.sqlite3',
+        },
     }
 }
 
@@ -144,11 +149,52 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# Arquivos enviados (fotos das denúncias em MEDIA_ROOT / 'denuncias_fotos')
+# Diretório próprio, separado do banco, das configurações e do cache.
+# Servidos por applications.core.views.servir_midia, que só expõe os diretórios abaixo
+MEDIA_ROOT = BASE_DIR / 'media'
+MEDIA_URL = '/media/'
+MEDIA_DIRETORIOS_PUBLICOS = ['denuncias_fotos/']
+
+# Em produção, delega o envio dos bytes ao servidor da frente:
+# 'nginx' (X-Accel-Redirect para MEDIA_SENDFILE_PREFIXO + caminho) ou 'apache' (X-Sendfile)
+MEDIA_SENDFILE = None
+MEDIA_SENDFILE_PREFIXO = '/midia-protegida/'
+# Location "internal" do nginx apontando para VARIANTES_CACHE_DIR (variantes das fotos)
+VARIANTES_SENDFILE_PREFIXO = '/variantes-protegidas/'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Cache compartilhado entre processos (ver applications/core/cache.py).
+# Em produção, troque o BACKEND por Redis ou Memcached sem mudar o código.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache' / 'django',
+        'TIMEOUT': 60 * 60 * 24,
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    }
+}
+
+# Os testes usam caches em memória no lugar do cache em disco acima (ver core/test_runner.py)
+TEST_RUNNER = 'applications.core.test_runner.TestRunner'
+
+# Cache em disco dos tiles binários do mapa (ver applications/denuncias/tiles.py)
+TILES_CACHE_DIR = BASE_DIR / 'cache' / 'tiles'
+
+# Cache em disco das variantes de fotos geradas sob demanda (ver applications/denuncias/variantes.py)
+VARIANTES_CACHE_DIR = BASE_DIR / 'cache' / 'variantes'
+VARIANTES_CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+# Uploads de fotos em pedaços (ver applications/denuncias/uploads.py)
+UPLOADS_PARCIAIS_DIR = BASE_DIR / 'uploads_parciais'
+UPLOAD_FOTO_MAX_BYTES = 20 * 1024 * 1024
+
 # --- Configurações de CORS ---
 # Permite requisições de qualquer origem em desenvolvimento
 CORS_ALLOW_ALL_ORIGINS = True
@@ -209,6 +255,33 @@ NOMINATIM_API_ENDPOINT = 'https://nominatim.openstreetmap.org/reverse'
 # Altere para o e-mail do administrador do projeto.
 NOMINATIM_USER_AGENT = 'VozDoPovo Backend (seu.email@dominio.com)'
 
+# A análise de localização usa os centroides dos municípios carregados com
+# "python manage.py carregar_centroides". Com True, as coordenadas que o índice
+# local não resolve são enviadas ao Nominatim. Com False e nenhum centroide
+# carregado, a análise responde 503.
+GEOCODIFICACAO_REMOTA = False
+
+# Cache das respostas do Nominatim, por processo (ver localidades/nominatim.py).
+# A chave é a coordenada arredondada para GEOCODIFICACAO_CACHE_CASAS casas (3 = ~110 m).
+GEOCODIFICACAO_CACHE_CASAS = 3
+GEOCODIFICACAO_CACHE_TTL = 60 * 60 * 24
+# "Nenhum endereço encontrado" é guardado por menos tempo
+GEOCODIFICACAO_CACHE_TTL_NEGATIVO = 60 * 5
+GEOCODIFICACAO_CACHE_MAX_ENTRADAS = 10000
+
+# Clientes HTTP dos serviços externos (ver core/http.py): pool de conexões,
+# novas tentativas e disjuntor. Cada chave aceita os argumentos de ClienteHTTP.
+HTTP_CLIENTES = {
+    'nominatim': {
+        'headers': {'User-Agent': NOMINATIM_USER_AGENT},
+        # A política de uso do Nominatim público não permite rajadas
+        'max_conexoes': 2,
+    },
+    'ibge': {
+        'timeout': (3.05, 30),
+    },
+}
+
 # --- Configurações de E-mail (Mailtrap para desenvolvimento) ---
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 EMAIL_HOST = 'sandbox.smtp.mailtrap.io'
@@ -15,12 +15,16 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.contrib import admin
+from django.conf import settings
 from django.urls import path, include
 
+from applications.core.views import servir_midia
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/auth/', include('applications.autenticacao.urls')),
     path('api/denuncias/', include('applications.denuncias.urls')),
     path('api/localidades/', include('applications.localidades.urls')),
     path('api/gestao/', include('applications.gestao_publica.urls')),
+    path(settings.MEDIA_URL.lstrip('/') + '<path:caminho>', servir_midia, name='midia'),
 ]